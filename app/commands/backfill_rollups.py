@@ -0,0 +1,51 @@
+"""
+Rebuild of the daily and monthly inflow rollups from the incoming fund history.
+
+Accounts are split into ID ranges of --chunk-size accounts, and up to
+--concurrency ranges are rebuilt in parallel, each in its own transaction.
+
+Usage:
+    python -m app.commands.backfill_rollups --chunk-size 1000 --concurrency 4
+"""
+import argparse
+import asyncio
+import logging as log
+
+from sqlalchemy import select, func
+
+from app.common.database import async_session_maker
+from app.models.account import Account
+from app.services.rollup import RollupService
+
+
+async def rebuild_range(semaphore: asyncio.Semaphore, account_id_from: int, account_id_to: int) -> int:
+    async with semaphore:
+        async with async_session_maker() as session:
+            written = await RollupService.rebuild(session, account_id_from, account_id_to)
+        log.info(f"Accounts {account_id_from}-{account_id_to}: {written} rollup rows")
+        return written
+
+
+async def main(args):
+    async with async_session_maker() as session:
+        result = await session.execute(select(func.min(Account.account_id), func.max(Account.account_id)))
+        first, last = result.one()
+
+    if first is None:
+        log.info("No accounts to rebuild")
+        return
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    written = await asyncio.gather(*(
+        rebuild_range(semaphore, start, min(start + args.chunk_size - 1, last))
+        for start in range(first, last + 1, args.chunk_size)
+    ))
+    log.info(f"Rebuilt {sum(written)} rollup rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild inflow rollups from the incoming fund history")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="accounts per transaction")
+    parser.add_argument("--concurrency", type=int, default=4, help="ranges rebuilt in parallel")
+    log.basicConfig(level=log.INFO)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,137 @@
+"""
+Benchmark of authenticated request checks in the strict and the stateless mode.
+
+A throwaway user logs in once, the revoked token filter and the revocation denylist are
+loaded and reloaded in the background as in the application, and then `--concurrency`
+tasks check the same access token for `--seconds` seconds per mode,
+each check with its own session, as a request dependency gets it:
+- `strict`: `require_user`, which looks the user and its revocation up in the database;
+- `stateless`: `require_claims`, which trusts the signed claims and checks the
+  in-memory denylist;
+- `denylist`: only the in-memory revocation lookup of the stateless mode.
+The result is the number of checks per second and the p50/p99 latency of one check.
+The user is deleted at the end.
+
+Needs the migrated database of the DB_* settings.
+
+Usage:
+    python -m app.commands.benchmark_auth
+    python -m app.commands.benchmark_auth --concurrency 1 50 --seconds 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from http.cookies import SimpleCookie
+
+from fastapi import Request, Response
+from sqlalchemy import delete, select
+
+from app.common.database import async_session_maker, engine
+from app.common.hashing import hash_password
+from app.common.oauth2 import AuthJWT, require_claims, require_user
+from app.models.role import Role
+from app.models.user import RevokedToken, User, UserTokenRevocation
+from app.schemas.user import UserLoginSchema
+from app.services.auth import AuthService
+from app.services.token_denylist import token_denylist
+from app.services.token_revocation import token_revocation
+from config import Config
+
+PASSWORD = "benchmark-password"
+
+
+async def create_user() -> User:
+    async with async_session_maker() as session:
+        async with session.begin():
+            role_id = await session.scalar(select(Role.id).where(Role.slug == "user_role"))
+            user = User(name="Auth Benchmark", email=f"benchmark-{uuid.uuid4().hex}@example.com", password=hash_password(PASSWORD), role_id=role_id)
+            session.add(user)
+    return user
+
+
+async def delete_user(user_id: int):
+    async with async_session_maker() as session:
+        async with session.begin():
+            await session.execute(delete(User).where(User.id == user_id))
+            # Триггер удаления пользователя записывает отзыв его токенов
+            await session.execute(delete(UserTokenRevocation).where(UserTokenRevocation.user_id == user_id))
+            await session.execute(delete(RevokedToken).where(RevokedToken.user_id == user_id))
+
+
+async def access_token(user: User) -> str:
+    response = Response()
+    async with async_session_maker() as session:
+        await AuthService.login(session, UserLoginSchema(email=user.email, password=PASSWORD), response, AuthJWT())
+
+    cookies = SimpleCookie()
+    for header in response.headers.getlist("set-cookie"):
+        cookies.load(header)
+    return cookies["access_token"].value
+
+
+def authorize(token: str) -> AuthJWT:
+    return AuthJWT(req=Request({"type": "http", "method": "GET", "path": "/", "headers": [(b"cookie", f"access_token={token}".encode())]}))
+
+
+async def measure(args, check, concurrency: int) -> tuple:
+    deadline = time.perf_counter() + args.seconds
+    latencies = []
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await check()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return len(latencies) / elapsed, statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99) - 1] * 1000
+
+
+async def main(args):
+    user = await create_user()
+    try:
+        token = await access_token(user)
+        claims = await AuthJWT().get_raw_jwt(token)
+        # Списки отзывов загружаются и обновляются в фоне, как при старте приложения,
+        # иначе проверки обеих моделей пошли бы в базу
+        if Config.TOKEN_REVOCATION_ENABLED:
+            await token_revocation.start()
+        token_denylist.start()
+        while not token_denylist.is_fresh():
+            await asyncio.sleep(0.01)
+
+        async def strict():
+            async with async_session_maker() as session:
+                await require_user(session, authorize(token))
+
+        async def stateless():
+            async with async_session_maker() as session:
+                await require_claims(session, authorize(token))
+
+        async def denylist():
+            token_denylist.is_revoked(user.id, claims)
+
+        print(f"{'concurrency':>12}{'mode':>11}{'checks/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for concurrency in args.concurrency:
+            for mode, check in (("strict", strict), ("stateless", stateless), ("denylist", denylist)):
+                rate, p50, p99 = await measure(args, check, concurrency)
+                print(f"{concurrency:>12}{mode:>11}{rate:>10.0f}{p50:>10.3f}{p99:>10.3f}")
+    finally:
+        await token_denylist.stop()
+        await token_revocation.stop()
+        await delete_user(user.id)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the strict and stateless authentication checks")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 20], help="concurrent checking tasks")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of each measurement")
+
+    asyncio.run(main(parser.parse_args()))
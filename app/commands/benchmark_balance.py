@@ -0,0 +1,109 @@
+"""
+Benchmark of current balance reads for accounts with growing fund histories.
+
+For each fund count a fresh account gets that many incoming funds, inserted by one
+`INSERT ... SELECT generate_series` with `Account.balance` set to their total, as the
+write paths keep it. Then `get_account_balance` is called `--reads` times with the
+balance cache cleared before each call, so every read goes to the database. For
+comparison the same account is read `--reads` times with the aggregate over its funds
+(`SELECT sum(amount)`), the best case of the former full-history read. The result is
+the p50/p99 latency of both per fund count. The account and its funds are deleted
+after each run.
+
+Needs the migrated database of the DB_* settings.
+
+Usage:
+    python -m app.commands.benchmark_balance
+    python -m app.commands.benchmark_balance --funds 10 1000 100000 --reads 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import delete, func, select, text, update
+
+from app.common.cache import balance_cache
+from app.common.database import async_session_maker
+from app.models.account import Account, IncomingFunds
+from app.services.account import AccountService
+
+
+async def seed(funds: int) -> int:
+    async with async_session_maker() as session:
+        account = await AccountService.create_account(session, None)
+
+    async with async_session_maker() as session:
+        async with session.begin():
+            # Даты в пределах последних суток попадают в существующие секции
+            await session.execute(
+                text(
+                    "INSERT INTO incoming_fund (account_id, amount, settlement_date) "
+                    "SELECT :account_id, 100, (now() AT TIME ZONE 'utc') - (i % 1440) * interval '1 minute' "
+                    "FROM generate_series(1, :funds) AS i"
+                ),
+                {"account_id": account.account_id, "funds": funds},
+            )
+            await session.execute(update(Account).where(Account.account_id == account.account_id).values(balance=funds * 100))
+        await session.execute(text("ANALYZE incoming_fund"))
+        await session.commit()
+
+    return account.account_id
+
+
+async def delete_account(account_id: int):
+    async with async_session_maker() as session:
+        async with session.begin():
+            await session.execute(delete(IncomingFunds).where(IncomingFunds.account_id == account_id))
+            await session.execute(delete(Account).where(Account.account_id == account_id))
+
+
+def percentiles(latencies: list) -> tuple:
+    latencies = sorted(latencies)
+    return statistics.median(latencies) * 1000, latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000
+
+
+async def read_balance(account_id: int) -> float:
+    await balance_cache.invalidate(account_id)
+    started = time.perf_counter()
+    async with async_session_maker() as session:
+        await AccountService.get_account_balance(session, account_id)
+    return time.perf_counter() - started
+
+
+async def sum_funds(account_id: int) -> float:
+    started = time.perf_counter()
+    async with async_session_maker() as session:
+        async with session.begin():
+            await session.scalar(select(func.sum(IncomingFunds.amount)).where(IncomingFunds.account_id == account_id))
+    return time.perf_counter() - started
+
+
+async def measure(args, funds: int) -> tuple:
+    account_id = await seed(funds)
+    try:
+        # Прогрев пула соединений и кэша страниц
+        await read_balance(account_id)
+        await sum_funds(account_id)
+
+        balance = [await read_balance(account_id) for _ in range(args.reads)]
+        summed = [await sum_funds(account_id) for _ in range(args.reads)]
+    finally:
+        await delete_account(account_id)
+
+    return percentiles(balance) + percentiles(summed)
+
+
+async def main(args):
+    print(f"{'funds':>10}{'balance p50 ms':>16}{'balance p99 ms':>16}{'sum p50 ms':>12}{'sum p99 ms':>12}")
+    for funds in args.funds:
+        balance_p50, balance_p99, sum_p50, sum_p99 = await measure(args, funds)
+        print(f"{funds:>10}{balance_p50:>16.2f}{balance_p99:>16.2f}{sum_p50:>12.2f}{sum_p99:>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure balance read latency for growing numbers of funds per account")
+    parser.add_argument("--funds", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000, 1000000], help="fund counts per account to measure")
+    parser.add_argument("--reads", type=int, default=200, help="reads per fund count and read path")
+
+    asyncio.run(main(parser.parse_args()))
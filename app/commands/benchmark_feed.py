@@ -0,0 +1,72 @@
+"""
+Micro-benchmark of the in-process balance feed fan-out.
+
+For each subscriber count a fresh `BalanceFeed` gets that many subscribers, each of
+`--accounts-per-subscriber` random accounts out of `--accounts`, plus `--unfiltered`
+subscribers of all accounts. Then `--events` events of random accounts are published
+while one consumer task per subscriber drains its queue. The result is the number of
+published and delivered events per second and the subscribers dropped for falling behind.
+No database is used: this measures the fan-out only, not LISTEN/NOTIFY.
+
+Usage:
+    python -m app.commands.benchmark_feed --subscribers 1000 10000 20000
+    python -m app.commands.benchmark_feed --subscribers 5000 --unfiltered 10 --events 50000
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import timedelta
+
+from app.services.feed import BalanceFeed
+
+
+async def drain(subscription):
+    while True:
+        event = await subscription.queue.get()
+        if event is None:
+            return
+
+
+async def measure(args, subscribers: int) -> tuple:
+    feed = BalanceFeed(queue_size=args.queue_size, max_subscribers=subscribers + args.unfiltered, heartbeat=15, retention=timedelta(hours=1))
+    subscriptions = [
+        feed.subscribe(random.sample(range(args.accounts), args.accounts_per_subscriber))
+        for _ in range(subscribers)
+    ]
+    subscriptions += [feed.subscribe() for _ in range(args.unfiltered)]
+    consumers = [asyncio.create_task(drain(subscription)) for subscription in subscriptions]
+
+    started = time.perf_counter()
+    for event_id in range(1, args.events + 1):
+        feed.publish({"event_id": event_id, "account_id": random.randrange(args.accounts), "kind": "deposit", "fund_id": event_id, "amount": 100})
+        # Отдаем управление подписчикам, как цикл событий между уведомлениями
+        if event_id % args.yield_every == 0:
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+
+    for consumer in consumers:
+        consumer.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
+
+    return args.events / elapsed, feed.delivered_total / elapsed, feed.dropped_total
+
+
+async def main(args):
+    print(f"{'subscribers':>12}{'published/s':>14}{'delivered/s':>14}{'dropped':>10}")
+    for subscribers in args.subscribers:
+        published, delivered, dropped = await measure(args, subscribers)
+        print(f"{subscribers:>12}{published:>14.0f}{delivered:>14.0f}{dropped:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure balance feed fan-out for growing numbers of subscribers")
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1000, 10000, 20000], help="subscriber counts to measure")
+    parser.add_argument("--unfiltered", type=int, default=0, help="additional subscribers of all accounts")
+    parser.add_argument("--accounts", type=int, default=100000, help="number of distinct accounts")
+    parser.add_argument("--accounts-per-subscriber", type=int, default=1, help="accounts each subscriber follows")
+    parser.add_argument("--events", type=int, default=10000, help="events to publish")
+    parser.add_argument("--queue-size", type=int, default=100, help="queue size of each subscriber")
+    parser.add_argument("--yield-every", type=int, default=1, help="events published between yields to the consumers")
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,121 @@
+"""
+Benchmark of the group-commit write path against the per-request one.
+
+`--accounts` fresh accounts are created. For each client count, `--clients` tasks each
+send one deposit at a time to a random account until `--deposits` deposits are
+committed: first through `AccountService.add_incoming_fund` with one pooled connection
+per client, as without `GROUP_COMMIT_ENABLED`, then through a `GroupCommitter` for every
+combination of `--max-batch` and `--max-delay-ms`. The result is the number of committed
+deposits per second, the p50/p99 latency of one deposit and the average batch size.
+The accounts and their rows are deleted at the end.
+
+Needs the migrated database of the DB_* settings.
+
+Usage:
+    python -m app.commands.benchmark_group_commit
+    python -m app.commands.benchmark_group_commit --clients 10 100 --max-batch 50 500 --max-delay-ms 1 5 20
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import statistics
+import time
+from datetime import datetime
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.common.database import DATA_BASE_URL, async_session_maker
+from app.models.account import Account, AccountBalanceShard, AccountBalanceSnapshot, AccountInflowRollup, BalanceEvent, IncomingFunds
+from app.schemas.account import IncomingFundCreate
+from app.services.account import AccountService
+from app.services.group_commit import GroupCommitter
+
+
+async def run_clients(args, clients: int, account_ids: list, write) -> tuple:
+    remaining = iter(range(args.deposits))
+    latencies = []
+
+    async def client():
+        for _ in remaining:
+            fund_data = IncomingFundCreate(account_id=random.choice(account_ids), amount="1.00", settlement_date=datetime.utcnow())
+            started = time.perf_counter()
+            await write(fund_data)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return args.deposits / elapsed, statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99) - 1] * 1000
+
+
+async def per_request(args, clients: int, account_ids: list) -> tuple:
+    engine = create_async_engine(DATA_BASE_URL, pool_size=clients, max_overflow=0, pool_timeout=None)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def write(fund_data):
+        async with session_maker() as session:
+            await AccountService.add_incoming_fund(session, fund_data)
+
+    try:
+        return await run_clients(args, clients, account_ids, write)
+    finally:
+        await engine.dispose()
+
+
+async def group_commit(args, clients: int, account_ids: list, max_batch: int, max_delay_ms: float) -> tuple:
+    committer = GroupCommitter(max_batch=max_batch, max_delay=max_delay_ms / 1000, queue_size=clients)
+    committer.start()
+    try:
+        result = await run_clients(args, clients, account_ids, committer.submit)
+    finally:
+        await committer.stop()
+    return result + (committer.stats()["average_batch"],)
+
+
+async def create_accounts(count: int) -> list:
+    account_ids = []
+    for _ in range(count):
+        async with async_session_maker() as session:
+            account = await AccountService.create_account(session, None)
+        account_ids.append(account.account_id)
+    return account_ids
+
+
+async def delete_accounts(account_ids: list):
+    async with async_session_maker() as session:
+        async with session.begin():
+            for model in (IncomingFunds, AccountBalanceShard, AccountBalanceSnapshot, AccountInflowRollup, BalanceEvent):
+                await session.execute(delete(model).where(model.account_id.in_(account_ids)))
+            await session.execute(delete(Account).where(Account.account_id.in_(account_ids)))
+
+
+async def main(args):
+    account_ids = await create_accounts(args.accounts)
+
+    print(f"{'clients':>8}{'mode':>14}{'max batch':>11}{'delay ms':>10}{'deposits/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'avg batch':>11}")
+    try:
+        for clients in args.clients:
+            throughput, p50, p99 = await per_request(args, clients, account_ids)
+            print(f"{clients:>8}{'per-request':>14}{'-':>11}{'-':>10}{throughput:>12.0f}{p50:>10.1f}{p99:>10.1f}{'-':>11}")
+
+            for max_batch, max_delay_ms in itertools.product(args.max_batch, args.max_delay_ms):
+                throughput, p50, p99, batch = await group_commit(args, clients, account_ids, max_batch, max_delay_ms)
+                print(f"{clients:>8}{'group-commit':>14}{max_batch:>11}{max_delay_ms:>10g}{throughput:>12.0f}{p50:>10.1f}{p99:>10.1f}{batch:>11.1f}")
+    finally:
+        await delete_accounts(account_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the group-commit and per-request deposit paths")
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 50], help="concurrent clients, each sending one deposit at a time")
+    parser.add_argument("--deposits", type=int, default=2000, help="deposits per measurement")
+    parser.add_argument("--accounts", type=int, default=100, help="accounts the deposits are spread over")
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[10, 100, 500], help="GROUP_COMMIT_MAX_BATCH values to sweep")
+    parser.add_argument("--max-delay-ms", type=float, nargs="+", default=[1, 5, 20], help="GROUP_COMMIT_MAX_DELAY_MS values to sweep")
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,108 @@
+"""
+Benchmark of money aggregates as DECIMAL(18,2) and Decimal against BIGINT minor units and int.
+
+For each row count a temporary table gets that many amounts in both representations:
+a `DECIMAL(18,2)` column, as the amounts were stored before, and a `BIGINT` column of
+minor units, as they are stored now. `SELECT sum(...)` over each column is timed
+`--repeat` times. The same amounts are then totalled in Python as the service code
+did it (`Decimal(str(amount))` per fund added to a `defaultdict(Decimal)`) and as it
+does it now (plain `int` addition). The result is the median time of every variant.
+Nothing is written outside the temporary table.
+
+Needs the migrated database of the DB_* settings.
+
+Usage:
+    python -m app.commands.benchmark_money
+    python -m app.commands.benchmark_money --rows 100000 1000000 10000000 --repeat 5
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import text
+
+from app.common.database import engine
+
+
+async def time_sql(connection, column: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await connection.execute(text(f"SELECT sum({column}) FROM money_benchmark"))
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def time_python(total, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        total()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def decimal_total(amounts: list, account_ids: list):
+    # Как считали раньше: каждое значение проходило через Decimal(str(...))
+    deltas = defaultdict(Decimal)
+    for account_id, amount in zip(account_ids, amounts):
+        deltas[account_id] += Decimal(str(amount))
+    return deltas
+
+
+def integer_total(amounts: list, account_ids: list):
+    deltas = defaultdict(int)
+    for account_id, amount in zip(account_ids, amounts):
+        deltas[account_id] += amount
+    return deltas
+
+
+async def measure(args, rows: int) -> tuple:
+    async with engine.connect() as connection:
+        await connection.execute(text(
+            "CREATE TEMPORARY TABLE money_benchmark (amount_decimal DECIMAL(18, 2) NOT NULL, amount_minor BIGINT NOT NULL)"
+        ))
+        await connection.execute(
+            text(
+                "INSERT INTO money_benchmark "
+                "SELECT amount / 100.0, amount FROM (SELECT (random() * 10000000)::bigint AS amount FROM generate_series(1, :rows)) AS generated"
+            ),
+            {"rows": rows},
+        )
+        await connection.execute(text("ANALYZE money_benchmark"))
+
+        sql_decimal = await time_sql(connection, "amount_decimal", args.repeat)
+        sql_minor = await time_sql(connection, "amount_minor", args.repeat)
+        await connection.rollback()
+
+    minor = [random.randrange(10000000) for _ in range(rows)]
+    decimal = [Decimal(amount).scaleb(-2) for amount in minor]
+    account_ids = [random.randrange(args.accounts) for _ in range(rows)]
+
+    python_decimal = time_python(lambda: decimal_total(decimal, account_ids), args.repeat)
+    python_minor = time_python(lambda: integer_total(minor, account_ids), args.repeat)
+
+    return sql_decimal, sql_minor, python_decimal, python_minor
+
+
+async def main(args):
+    print(f"{'rows':>10}{'SQL decimal ms':>16}{'SQL bigint ms':>15}{'Python Decimal ms':>19}{'Python int ms':>15}")
+    try:
+        for rows in args.rows:
+            sql_decimal, sql_minor, python_decimal, python_minor = await measure(args, rows)
+            print(f"{rows:>10}{sql_decimal * 1000:>16.1f}{sql_minor * 1000:>15.1f}{python_decimal * 1000:>19.1f}{python_minor * 1000:>15.1f}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare money aggregates in DECIMAL/Decimal and BIGINT/int")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000], help="row counts to measure")
+    parser.add_argument("--accounts", type=int, default=1000, help="distinct accounts the Python totals are grouped by")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per variant; the median is reported")
+
+    asyncio.run(main(parser.parse_args()))
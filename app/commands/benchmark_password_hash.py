@@ -0,0 +1,93 @@
+"""
+Benchmark of event loop latency while password checks run.
+
+A probe stands in for the non-auth endpoints: every `--interval-ms` it starts a request
+that only needs the event loop and records how late it completes, so the delay is
+the time the request waits for the loop. Meanwhile `--logins` tasks verify a bcrypt
+password in a loop for `--seconds` seconds, each check preceded by a 1 ms pause standing
+in for the user lookup, in three modes:
+- `idle`: no login traffic, the baseline;
+- `inline`: `verify_password` called on the event loop, as before the hashing pool;
+- `pool`: `verify_password` run through `hashing_executor`, as login does now.
+The result is the number of probe requests served and their p50/p99/max delay and the password checks per second. Pool
+refusals (503) are counted and retried after a short pause, as clients would retry.
+
+Usage:
+    python -m app.commands.benchmark_password_hash
+    python -m app.commands.benchmark_password_hash --logins 16 --seconds 10 --rounds 12
+"""
+import argparse
+import asyncio
+import math
+import statistics
+import time
+
+from app.common.hashing import PasswordHashingBusy, build_password_context, hashing_executor
+import app.common.hashing as hashing
+
+
+async def probe(interval: float, deadline: float, delays: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        delays.append(time.perf_counter() - started - interval)
+
+
+async def login(mode: str, hashed_password: str, deadline: float, counters: dict):
+    while time.perf_counter() < deadline:
+        # Чтение пользователя из базы перед проверкой пароля
+        await asyncio.sleep(0.001)
+        if mode == "inline":
+            hashing.verify_password("benchmark-password", hashed_password)
+        else:
+            try:
+                await hashing_executor.run(hashing.verify_password, "benchmark-password", hashed_password)
+            except PasswordHashingBusy:
+                counters["rejected"] += 1
+                await asyncio.sleep(0.05)
+                continue
+        counters["checks"] += 1
+
+
+async def measure(args, mode: str, hashed_password: str) -> tuple:
+    deadline = time.perf_counter() + args.seconds
+    delays = []
+    counters = {"checks": 0, "rejected": 0}
+
+    logins = [] if mode == "idle" else [login(mode, hashed_password, deadline, counters) for _ in range(args.logins)]
+    await asyncio.gather(probe(args.interval_ms / 1000, deadline, delays), *logins)
+
+    delays.sort()
+    return (
+        statistics.median(delays) * 1000,
+        delays[math.ceil(len(delays) * 0.99) - 1] * 1000,
+        delays[-1] * 1000,
+        counters["checks"] / args.seconds,
+        counters["rejected"],
+        len(delays),
+    )
+
+
+async def main(args):
+    # Рабочий фактор задается явно, чтобы результат не зависел от настроек окружения
+    hashing.pwd_context = build_password_context(args.rounds)
+    hashed_password = hashing.hash_password("benchmark-password")
+
+    print(f"hashing pool: {hashing_executor.kind}, {hashing_executor.workers} workers, max pending {hashing_executor.max_pending}")
+    print(f"{'mode':>8}{'probes':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'checks/s':>10}{'rejected':>10}")
+    try:
+        for mode in ("idle", "inline", "pool"):
+            p50, p99, worst, rate, rejected, probes = await measure(args, mode, hashed_password)
+            print(f"{mode:>8}{probes:>8}{p50:>10.1f}{p99:>10.1f}{worst:>10.1f}{rate:>10.1f}{rejected:>10}")
+    finally:
+        hashing_executor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure event loop latency under concurrent password checks")
+    parser.add_argument("--logins", type=int, default=8, help="concurrent login tasks")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of each mode")
+    parser.add_argument("--interval-ms", type=float, default=5, help="pause between probe requests")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt work factor of the checked hash")
+
+    asyncio.run(main(parser.parse_args()))
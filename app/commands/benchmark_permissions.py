@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of the `has_permission` decorator overhead per call.
+
+The role/permission map is loaded into `permission_resolver` first, as the background
+refresh keeps it. Then a trivial handler is called `--calls` times undecorated and
+decorated with `has_permission([--permission])`, for each way the decorator finds the
+role's permissions:
+- `token mask`: the route's claims carry the current permission mask (`pm`, `pv`);
+- `role map`: the claims carry only `role_id`, the mask comes from the resolver cache;
+- `user lookup`: no claims, the role is read from the database by `user_id` (`--db-calls`
+  calls), then the mask comes from the resolver cache.
+The result is the time per call and the overhead over the undecorated handler.
+
+Needs the migrated database of the DB_* settings with a user of the `--role` role.
+
+Usage:
+    python -m app.commands.benchmark_permissions
+    python -m app.commands.benchmark_permissions --calls 1000000 --role admin_role --permission user_read
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from app.common.database import async_session_maker, engine
+from app.helpers.has_permissions import has_permission
+from app.models.user import User
+from app.services.permission import permission_resolver
+
+
+async def handler(**kwargs):
+    return None
+
+
+async def time_calls(func, calls: int, **kwargs) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        await func(**kwargs)
+    return (time.perf_counter() - started) / calls
+
+
+async def main(args):
+    try:
+        async with async_session_maker() as session:
+            await permission_resolver.refresh(session)
+
+        role_id = await permission_resolver.get_role_id(args.role)
+        if role_id is None:
+            raise SystemExit(f"Роль {args.role} не найдена")
+        async with async_session_maker() as session:
+            user_id = await session.scalar(select(User.id).where(User.role_id == role_id).limit(1))
+        if user_id is None:
+            raise SystemExit(f"Нет пользователя с ролью {args.role}")
+
+        mask, version = await permission_resolver.get_mask(role_id)
+        decorated = has_permission([args.permission])(handler)
+
+        baseline = await time_calls(handler, args.calls, claims={"role_id": role_id})
+        cases = [
+            ("undecorated", baseline),
+            ("token mask", await time_calls(decorated, args.calls, claims={"role_id": role_id, "pm": mask, "pv": version})),
+            ("role map", await time_calls(decorated, args.calls, claims={"role_id": role_id})),
+            ("user lookup", await time_calls(decorated, args.db_calls, user_id=user_id)),
+        ]
+
+        print(f"{'path':>12}{'us/call':>10}{'overhead us':>13}")
+        for path, per_call in cases:
+            print(f"{path:>12}{per_call * 1e6:>10.2f}{(per_call - baseline) * 1e6:>13.2f}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the per-call overhead of the permission decorator")
+    parser.add_argument("--calls", type=int, default=200000, help="calls per in-memory path")
+    parser.add_argument("--db-calls", type=int, default=2000, help="calls of the path with a database lookup")
+    parser.add_argument("--role", default="admin_role", help="slug of the role to check")
+    parser.add_argument("--permission", default="user_read", help="permission slug the decorator requires")
+
+    asyncio.run(main(parser.parse_args()))
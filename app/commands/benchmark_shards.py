@@ -0,0 +1,97 @@
+"""
+Benchmark of concurrent deposits to one hot account with and without balance shards.
+
+For each slot count a fresh account is switched to that many balance slots, then
+`--deposits` deposits are sent to it at once through a pool of `--connections`
+connections. The result is the number of committed deposits per second and the p50/p99
+latency of one deposit. With one slot every deposit waits for the account row lock;
+with more slots deposits only contend within their slot. The pending slots are folded
+after each run and the balance is checked against the sum of the deposits, then the
+account and its rows are deleted.
+
+Needs the migrated database of the DB_* settings.
+
+Usage:
+    python -m app.commands.benchmark_shards --shards 1 64
+    python -m app.commands.benchmark_shards --shards 1 8 64 --deposits 5000 --connections 100
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.common.database import DATA_BASE_URL, async_session_maker
+from app.models.account import Account, AccountBalanceShard, AccountBalanceSnapshot, AccountInflowRollup, BalanceEvent, IncomingFunds
+from app.schemas.account import IncomingFundCreate
+from app.services.account import AccountService
+from app.services.balance_shard import BalanceShardService
+
+
+async def deposit(session_maker, account_id: int, latencies: list):
+    started = time.perf_counter()
+    async with session_maker() as session:
+        await AccountService.add_incoming_fund(session, IncomingFundCreate(account_id=account_id, amount="1.00", settlement_date=datetime.utcnow()))
+    latencies.append(time.perf_counter() - started)
+
+
+async def delete_account(account_id: int):
+    async with async_session_maker() as session:
+        async with session.begin():
+            for model in (IncomingFunds, AccountBalanceShard, AccountBalanceSnapshot, AccountInflowRollup, BalanceEvent):
+                await session.execute(delete(model).where(model.account_id == account_id))
+            await session.execute(delete(Account).where(Account.account_id == account_id))
+
+
+async def measure(args, session_maker, shards: int) -> tuple:
+    async with async_session_maker() as session:
+        account = await AccountService.create_account(session, None)
+    account_id = account.account_id
+
+    try:
+        async with async_session_maker() as session:
+            await BalanceShardService.set_shards(session, account_id, shards)
+
+        latencies = []
+        started = time.perf_counter()
+        await asyncio.gather(*(deposit(session_maker, account_id, latencies) for _ in range(args.deposits)))
+        elapsed = time.perf_counter() - started
+
+        async with async_session_maker() as session:
+            await BalanceShardService.set_shards(session, account_id, 1)
+        async with async_session_maker() as session:
+            balance = await session.scalar(select(Account.balance).where(Account.account_id == account_id))
+        if balance != args.deposits * 100:
+            raise RuntimeError(f"Баланс {balance} вместо {args.deposits * 100}")
+    finally:
+        await delete_account(account_id)
+
+    latencies.sort()
+    return args.deposits / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+async def main(args):
+    # Свой пул без ограничения ожидания: все поступления ставятся в очередь сразу
+    engine = create_async_engine(DATA_BASE_URL, pool_size=args.connections, max_overflow=0, pool_timeout=None)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    print(f"{'shards':>8}{'deposits/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    try:
+        for shards in args.shards:
+            throughput, p50, p99 = await measure(args, session_maker, shards)
+            print(f"{shards:>8}{throughput:>12.0f}{p50 * 1000:>10.1f}{p99 * 1000:>10.1f}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure concurrent deposits to one account for several balance shard counts")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 64], help="balance slot counts to measure")
+    parser.add_argument("--deposits", type=int, default=2000, help="concurrent deposits per run")
+    parser.add_argument("--connections", type=int, default=50, help="connections of the benchmark pool")
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""
+Memory benchmark of the streaming statement export.
+
+For each fund count a fresh account gets that many incoming funds, inserted by one
+`INSERT ... SELECT generate_series`, and its whole statement is consumed from
+`AccountService.stream_statement` as the response would send it. The resident set
+size of this process is sampled after every chunk. The result is the export rate and
+the RSS before the export and at its peak: with a server-side cursor the peak does not
+grow with the number of rows. The account and its funds are deleted after each run.
+
+Needs the migrated database of the DB_* settings and Linux (/proc/self/statm).
+
+Usage:
+    python -m app.commands.benchmark_statement
+    python -m app.commands.benchmark_statement --funds 10000000 --format csv --chunk-size 5000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from sqlalchemy import delete, text
+
+from app.common.database import async_session_maker
+from app.models.account import Account, IncomingFunds
+from app.schemas.account import StatementFormatEnum
+from app.services.account import AccountService
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+async def seed(funds: int) -> int:
+    async with async_session_maker() as session:
+        account = await AccountService.create_account(session, None)
+
+    async with async_session_maker() as session:
+        async with session.begin():
+            # Даты в пределах последних суток попадают в существующие секции
+            await session.execute(
+                text(
+                    "INSERT INTO incoming_fund (account_id, amount, settlement_date) "
+                    "SELECT :account_id, 100 + i % 1000, (now() AT TIME ZONE 'utc') - (i % 1440) * interval '1 minute' "
+                    "FROM generate_series(1, :funds) AS i"
+                ),
+                {"account_id": account.account_id, "funds": funds},
+            )
+
+    return account.account_id
+
+
+async def delete_account(account_id: int):
+    async with async_session_maker() as session:
+        async with session.begin():
+            await session.execute(delete(IncomingFunds).where(IncomingFunds.account_id == account_id))
+            await session.execute(delete(Account).where(Account.account_id == account_id))
+
+
+async def measure(args, funds: int) -> tuple:
+    account_id = await seed(funds)
+    try:
+        before = peak = rss_mb()
+        exported = 0
+
+        started = time.perf_counter()
+        async for chunk in AccountService.stream_statement(account_id, None, None, StatementFormatEnum(args.format), args.chunk_size):
+            exported += len(chunk)
+            peak = max(peak, rss_mb())
+        elapsed = time.perf_counter() - started
+    finally:
+        await delete_account(account_id)
+
+    return funds / elapsed, exported / 2 ** 20, before, peak
+
+
+async def main(args):
+    print(f"{'funds':>10}{'rows/s':>10}{'exported MB':>13}{'RSS before MB':>15}{'RSS peak MB':>13}")
+    for funds in args.funds:
+        rate, exported, before, peak = await measure(args, funds)
+        print(f"{funds:>10}{rate:>10.0f}{exported:>13.1f}{before:>15.1f}{peak:>13.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the memory of statement exports for growing numbers of funds")
+    parser.add_argument("--funds", type=int, nargs="+", default=[100000, 1000000, 10000000], help="fund counts to export")
+    parser.add_argument("--format", choices=[item.value for item in StatementFormatEnum], default=StatementFormatEnum.ndjson.value, help="statement format")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="rows fetched and serialized at a time")
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,57 @@
+"""
+Calibration of the bcrypt work factor for this machine.
+
+Each work factor from --min-rounds up is timed by verifying a password --samples times,
+and the highest one whose median verify time stays within --target-ms is printed as
+the PASSWORD_HASH_ROUNDS setting. Every extra round doubles the time, so the run stops
+at the first work factor over the target.
+
+Run it on the production hardware, not on a laptop. Stored hashes with another work
+factor are re-hashed in the background as their users log in.
+
+Usage:
+    python -m app.commands.calibrate_password_hash --target-ms 250
+"""
+import argparse
+import logging as log
+import statistics
+import time
+
+from app.common.hashing import build_password_context
+from config import Config
+
+
+def measure(rounds: int, samples: int) -> float:
+    context = build_password_context(rounds)
+    hashed_password = context.hash("calibration-password")
+
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.verify("calibration-password", hashed_password)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(args):
+    chosen = args.min_rounds
+    for rounds in range(args.min_rounds, args.max_rounds + 1):
+        elapsed = measure(rounds, args.samples)
+        log.info(f"rounds={rounds}: {elapsed:.1f} ms")
+        if elapsed > args.target_ms:
+            break
+        chosen = rounds
+
+    log.info(f"Current PASSWORD_HASH_ROUNDS={Config.PASSWORD_HASH_ROUNDS}")
+    print(f"PASSWORD_HASH_ROUNDS={chosen}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pick the bcrypt work factor for a target verify latency")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="target median verify time, milliseconds")
+    parser.add_argument("--samples", type=int, default=5, help="verifications timed per work factor")
+    parser.add_argument("--min-rounds", type=int, default=10, help="lowest work factor to consider")
+    parser.add_argument("--max-rounds", type=int, default=16, help="highest work factor to consider")
+
+    log.basicConfig(level=log.INFO)
+    main(parser.parse_args())
@@ -0,0 +1,39 @@
+"""
+Bulk import of incoming funds from an NDJSON or CSV file.
+
+Usage:
+    python -m app.commands.import_incoming_funds funds.ndjson
+    python -m app.commands.import_incoming_funds funds.csv --batch-size 10000
+"""
+import argparse
+import asyncio
+import json
+
+from app.common.database import async_session_maker
+from app.helpers.fund_import import iter_csv_rows, iter_ndjson_rows
+from app.services.account import AccountService
+from config import Config
+
+
+async def read_chunks(path: str, chunk_size: int = 1024 * 1024):
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+async def main(args):
+    file_format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    parse = iter_csv_rows if file_format == "csv" else iter_ndjson_rows
+
+    async with async_session_maker() as session:
+        report = await AccountService.import_incoming_funds(session, parse(read_chunks(args.path)), args.batch_size)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import incoming funds from an NDJSON or CSV file")
+    parser.add_argument("path", help="path to the file to import")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="file format, detected by extension by default")
+    parser.add_argument("--batch-size", type=int, default=Config.BULK_IMPORT_BATCH_SIZE, help="rows per COPY batch")
+    asyncio.run(main(parser.parse_args()))
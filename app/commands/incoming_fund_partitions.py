@@ -0,0 +1,49 @@
+"""
+Maintenance of the monthly partitions of incoming_fund.
+
+`ensure` creates the partitions of the current month and --months-ahead months after it.
+`detach` detaches the partitions that end before --before (YYYY-MM), keeping them as
+standalone tables, moving them to --archive-schema, or dropping them with --drop.
+Partitions that still hold unsettled funds are never detached.
+
+Usage:
+    python -m app.commands.incoming_fund_partitions ensure --months-ahead 6
+    python -m app.commands.incoming_fund_partitions detach --before 2025-01 --archive-schema archive
+"""
+import argparse
+import asyncio
+import logging as log
+from datetime import datetime
+
+from app.common.database import async_session_maker
+from app.services.partition import PartitionService
+from config import Config
+
+
+async def main(args):
+    async with async_session_maker() as session:
+        if args.action == "ensure":
+            created = await PartitionService.ensure_partitions(session, args.months_ahead)
+            log.info(f"Created partitions: {', '.join(created) or 'none'}")
+        else:
+            detached = await PartitionService.detach_partitions(
+                session, datetime.strptime(args.before, "%Y-%m"), args.archive_schema, args.drop
+            )
+            log.info(f"Detached partitions: {', '.join(detached) or 'none'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or detach monthly partitions of incoming_fund")
+    actions = parser.add_subparsers(dest="action", required=True)
+
+    ensure = actions.add_parser("ensure", help="create future partitions")
+    ensure.add_argument("--months-ahead", type=int, default=Config.PARTITION_MONTHS_AHEAD, help="months after the current one")
+
+    detach = actions.add_parser("detach", help="detach old partitions")
+    detach.add_argument("--before", required=True, help="detach partitions ending before this month, YYYY-MM")
+    target = detach.add_mutually_exclusive_group()
+    target.add_argument("--archive-schema", help="move detached partitions to this schema")
+    target.add_argument("--drop", action="store_true", help="drop detached partitions")
+
+    log.basicConfig(level=log.INFO)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,43 @@
+"""
+Standalone background settlement worker.
+
+Several instances can run side by side: due funds are claimed with
+FOR UPDATE SKIP LOCKED, so workers never settle the same fund twice.
+
+Usage:
+    python -m app.commands.settlement_worker --concurrency 4
+"""
+import argparse
+import asyncio
+import logging as log
+
+from app.services.settlement import SettlementWorker
+from config import Config
+
+
+async def report(worker: SettlementWorker, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        log.info(f"Settlement worker stats: {worker.stats()}")
+
+
+async def main(args):
+    worker = SettlementWorker(args.batch_size, args.concurrency, args.poll_interval)
+    reporter = asyncio.create_task(report(worker, args.stats_interval))
+    try:
+        await worker.run()
+    finally:
+        reporter.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Settle due incoming funds in batches")
+    parser.add_argument("--batch-size", type=int, default=Config.SETTLEMENT_BATCH_SIZE, help="funds claimed per transaction")
+    parser.add_argument("--concurrency", type=int, default=Config.SETTLEMENT_CONCURRENCY, help="parallel lanes in this process")
+    parser.add_argument("--poll-interval", type=float, default=Config.SETTLEMENT_POLL_INTERVAL, help="seconds to wait when the queue is empty")
+    parser.add_argument("--stats-interval", type=float, default=60, help="seconds between stats log lines")
+    log.basicConfig(level=log.INFO)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,250 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+from config import Config
+import logging as log
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+
+class BalanceCache:
+    """
+    Two-tier cache of current account balances.
+
+    The first tier is a bounded in-process LRU with a short TTL, the second one is Redis,
+    shared by all workers. Writers call `invalidate()` after their transaction commits.
+    Every entry remembers when the database read that produced it started, and an entry
+    read before the last local invalidation of its account is ignored, so this worker
+    never serves a balance older than its own last committed write, even if another
+    worker has just put a stale value into Redis.
+    """
+
+    KEY_PREFIX = "balance:"
+
+    def __init__(self, max_size: int, ttl: float, redis_url: Optional[str] = None, redis_ttl: int = 60, redis_timeout: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.redis_errors = 0
+
+        # account_id -> (balance, read_at, expires_at)
+        self.__entries = OrderedDict()
+        # account_id -> время последней локальной инвалидации; хранится не дольше redis_ttl
+        self.__invalidated = OrderedDict()
+
+        self.__redis = None
+        if redis_url and aioredis is not None:
+            self.__redis = aioredis.from_url(redis_url, socket_timeout=redis_timeout, decode_responses=True)
+
+    def begin_read(self) -> float:
+        """
+        Returns the marker to pass to `set()` for a value about to be read from the database.
+        """
+        return time.time()
+
+    def __is_fresh(self, account_id: int, read_at: float) -> bool:
+        return read_at > self.__invalidated.get(account_id, 0)
+
+    def __redis_expiry_ms(self, read_at: float) -> int:
+        # Срок считается от начала чтения, а не от записи: значение, прочитанное до инвалидации
+        # и записанное с опозданием, истечет раньше, чем будет удалена отметка этой инвалидации
+        return int((read_at + self.redis_ttl - time.time()) * 1000)
+
+    def __get_local(self, account_id: int) -> Optional[int]:
+        entry = self.__entries.get(account_id)
+        if entry is not None:
+            balance, read_at, expires_at = entry
+            if expires_at > time.monotonic() and self.__is_fresh(account_id, read_at):
+                self.__entries.move_to_end(account_id)
+                self.hits_local += 1
+                return balance
+            del self.__entries[account_id]
+        return None
+
+    def __accept_remote(self, account_id: int, value: Optional[str]) -> Optional[int]:
+        if value is None:
+            return None
+
+        balance, read_at = value.split("|")
+        balance, read_at = int(balance), float(read_at)
+        if not self.__is_fresh(account_id, read_at):
+            return None
+
+        self.__store_local(account_id, balance, read_at)
+        self.hits_redis += 1
+        return balance
+
+    async def get(self, account_id: int) -> Optional[int]:
+        """
+        Returns the cached balance of an account in minor units, or None on a miss.
+        """
+        balance = self.__get_local(account_id)
+        if balance is not None:
+            return balance
+
+        if self.__redis is not None:
+            try:
+                value = await self.__redis.get(f"{self.KEY_PREFIX}{account_id}")
+            except Exception as e:
+                self.redis_errors += 1
+                log.error(f"Ошибка чтения баланса из Redis: {e}")
+                value = None
+
+            balance = self.__accept_remote(account_id, value)
+            if balance is not None:
+                return balance
+
+        self.misses += 1
+        return None
+
+    async def get_many(self, account_ids: list) -> dict:
+        """
+        Returns the cached balances of several accounts as `{account_id: balance}`; misses are left out.
+
+        The local misses are read from Redis with a single MGET.
+        """
+        found = {}
+        remote = []
+        for account_id in account_ids:
+            balance = self.__get_local(account_id)
+            if balance is not None:
+                found[account_id] = balance
+            else:
+                remote.append(account_id)
+
+        if remote and self.__redis is not None:
+            try:
+                values = await self.__redis.mget([f"{self.KEY_PREFIX}{account_id}" for account_id in remote])
+            except Exception as e:
+                self.redis_errors += 1
+                log.error(f"Ошибка чтения балансов из Redis: {e}")
+                values = [None] * len(remote)
+
+            for account_id, value in zip(remote, values):
+                balance = self.__accept_remote(account_id, value)
+                if balance is not None:
+                    found[account_id] = balance
+
+        self.misses += len(account_ids) - len(found)
+        return found
+
+    async def set(self, account_id: int, balance, read_at: float):
+        """
+        Caches a balance read from the database, unless the account was invalidated after
+        the read started. In Redis it expires `redis_ttl` seconds after the read started.
+
+        Args:
+            account_id (int): The ID of the account.
+            balance (int): The balance read, in minor units.
+            read_at (float): The marker returned by `begin_read()` before the read.
+        """
+        if not self.__is_fresh(account_id, read_at):
+            return
+
+        balance = int(balance)
+        self.__store_local(account_id, balance, read_at)
+
+        expiry = self.__redis_expiry_ms(read_at)
+        if self.__redis is not None and expiry > 0:
+            try:
+                await self.__redis.set(f"{self.KEY_PREFIX}{account_id}", f"{balance}|{read_at}", px=expiry)
+            except Exception as e:
+                self.redis_errors += 1
+                log.error(f"Ошибка записи баланса в Redis: {e}")
+
+    async def set_many(self, balances: dict, read_at: float):
+        """
+        Caches several balances read by one query, writing them to Redis in one pipeline.
+
+        Args:
+            balances (dict): `{account_id: balance}` in minor units.
+            read_at (float): The marker returned by `begin_read()` before the read.
+        """
+        fresh = {
+            account_id: int(balance)
+            for account_id, balance in balances.items()
+            if self.__is_fresh(account_id, read_at)
+        }
+        for account_id, balance in fresh.items():
+            self.__store_local(account_id, balance, read_at)
+
+        expiry = self.__redis_expiry_ms(read_at)
+        if self.__redis is not None and fresh and expiry > 0:
+            try:
+                async with self.__redis.pipeline(transaction=False) as pipe:
+                    for account_id, balance in fresh.items():
+                        pipe.set(f"{self.KEY_PREFIX}{account_id}", f"{balance}|{read_at}", px=expiry)
+                    await pipe.execute()
+            except Exception as e:
+                self.redis_errors += 1
+                log.error(f"Ошибка записи балансов в Redis: {e}")
+
+    async def invalidate(self, *account_ids: int):
+        """
+        Drops the cached balances of the given accounts. Must be called after the write commits.
+        """
+        now = time.time()
+
+        for account_id in account_ids:
+            self.__entries.pop(account_id, None)
+            self.__invalidated[account_id] = now
+            self.__invalidated.move_to_end(account_id)
+        self.invalidations += len(account_ids)
+
+        # Отметки старше redis_ttl не нужны: записи в Redis живут не дольше redis_ttl от начала своего чтения
+        while self.__invalidated and next(iter(self.__invalidated.values())) < now - self.redis_ttl:
+            self.__invalidated.popitem(last=False)
+
+        if self.__redis is not None and account_ids:
+            keys = [f"{self.KEY_PREFIX}{account_id}" for account_id in account_ids]
+            try:
+                for offset in range(0, len(keys), 1000):
+                    await self.__redis.delete(*keys[offset:offset + 1000])
+            except Exception as e:
+                self.redis_errors += 1
+                log.error(f"Ошибка инвалидации баланса в Redis: {e}")
+
+    def __store_local(self, account_id: int, balance: int, read_at: float):
+        self.__entries[account_id] = (balance, read_at, time.monotonic() + self.ttl)
+        self.__entries.move_to_end(account_id)
+
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """
+        Returns the hit, miss and eviction counters of both tiers.
+        """
+        lookups = self.hits_local + self.hits_redis + self.misses
+        return {
+            "size": len(self.__entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "redis_enabled": self.__redis is not None,
+            "hits_local": self.hits_local,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits_local + self.hits_redis) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "redis_errors": self.redis_errors,
+        }
+
+
+balance_cache = BalanceCache(
+    max_size=Config.BALANCE_CACHE_SIZE,
+    ttl=Config.BALANCE_CACHE_TTL,
+    redis_url=Config.REDIS_URL,
+    redis_ttl=Config.BALANCE_CACHE_REDIS_TTL,
+    redis_timeout=float(Config.REDIS_TIMEOUT) if Config.REDIS_TIMEOUT else None,
+)
@@ -8,6 +8,9 @@ DATA_BASE_URL = f"postgresql+asyncpg://{process.DB_USER}:{process.DB_PASS}@{proc
 
 Base: DeclarativeMeta = declarative_base()
 
+# Максимум строк в одном VALUES-списке: asyncpg допускает не более 32767 параметров на запрос
+VALUES_CHUNK_SIZE = 2000
+
 # import's models
 
 import app.models.user
@@ -0,0 +1,129 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from config import Config
+
+
+def build_password_context(rounds: int) -> CryptContext:
+    """
+    Builds the bcrypt context with the given work factor.
+
+    Hashes made with any other number of rounds are reported by `needs_update()`, so
+    changing the work factor migrates the stored hashes as users log in.
+    """
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+# Единственный контекст паролей приложения
+pwd_context = build_password_context(Config.PASSWORD_HASH_ROUNDS)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    return pwd_context.needs_update(hashed_password)
+
+
+class PasswordHashingBusy(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password checks in progress, retry later",
+            headers={"Retry-After": "1"},
+        )
+
+
+class HashingExecutor:
+    """
+    Bounded pool that runs password hashing off the event loop.
+
+    bcrypt releases the GIL, so threads already use all cores; a process pool can be
+    selected instead for hashers that do not. At most `max_pending` calls may be running
+    or waiting at once, and the next one is refused with 503 instead of queueing without
+    limit, so a login burst cannot grow latency for everyone.
+    """
+
+    def __init__(self, kind: str, workers: int, max_pending: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+
+        self.pending = 0
+        self.completed_total = 0
+        self.rejected_total = 0
+
+        self.__executor: Optional[Executor] = None
+
+    def __get_executor(self) -> Executor:
+        # Пул создается при первом вызове, уже в процессе воркера, а не при импорте
+        if self.__executor is None:
+            if self.kind == "process":
+                self.__executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.__executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self.__executor
+
+    async def run(self, func: Callable, *args):
+        """
+        Runs `func(*args)` in the pool and returns its result.
+
+        With a process pool `func` must be a module-level function.
+
+        Raises:
+            PasswordHashingBusy: If `max_pending` calls are already running or waiting.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected_total += 1
+            raise PasswordHashingBusy()
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.__get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+            self.completed_total += 1
+
+    def shutdown(self):
+        """
+        Shuts the pool down; it is created again on the next call.
+        """
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=True)
+            self.__executor = None
+
+    def stats(self) -> dict:
+        """
+        Returns the pool size, the calls in progress and the totals.
+        """
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed_total": self.completed_total,
+            "rejected_total": self.rejected_total,
+        }
+
+
+hashing_workers = Config.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+
+hashing_executor = HashingExecutor(
+    kind=Config.PASSWORD_HASH_EXECUTOR,
+    workers=hashing_workers,
+    max_pending=Config.PASSWORD_HASH_MAX_PENDING or hashing_workers * 4,
+)
@@ -0,0 +1,160 @@
+import base64
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed448, ed25519, rsa
+from config import Config
+
+
+# Алгоритмы подписи, допустимые для ключа каждого типа; HS* не допускаются никогда
+EC_ALGORITHMS = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}
+RSA_ALGORITHMS = frozenset({"RS256", "RS384", "RS512", "PS256", "PS384", "PS512"})
+
+
+def decode_pem(value: str) -> bytes:
+    """
+    Returns the PEM bytes of a key given as base64-encoded PEM, as in the JWT_*_KEY settings.
+    """
+    return base64.b64decode(value)
+
+
+def key_algorithms(public_key) -> frozenset:
+    """
+    Returns the JWT algorithms a public key may verify.
+    """
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return RSA_ALGORITHMS
+    if isinstance(public_key, ec.EllipticCurvePublicKey):
+        return frozenset({EC_ALGORITHMS[public_key.curve.name]})
+    if isinstance(public_key, (ed25519.Ed25519PublicKey, ed448.Ed448PublicKey)):
+        return frozenset({"EdDSA"})
+    raise ValueError(f"Unsupported JWT key type: {type(public_key).__name__}")
+
+
+def key_id(public_key) -> str:
+    """
+    Derives a stable `kid` from the public key: the start of the SHA-256 of its DER encoding.
+    """
+    der = public_key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return hashlib.sha256(der).hexdigest()[:16]
+
+
+class VerificationKey:
+
+    def __init__(self, public_key):
+        self.public_key = public_key
+        self.kid = key_id(public_key)
+        self.algorithms = key_algorithms(public_key)
+
+
+class JwtKeyring:
+    """
+    Parsed signing and verification keys, loaded once per process.
+
+    Tokens are signed with the current private key and carry its `kid` in the header. A
+    token is verified with the key its `kid` names, either the current one or one of the
+    previous public keys kept for rotation; tokens without `kid`, issued before kids were
+    used, are verified with the current key. The algorithm in the token header must be
+    one the key's type allows, so a token cannot switch the key to another algorithm.
+    """
+
+    def __init__(self, algorithm: str, private_key_pem: bytes, public_key_pem: bytes, previous_public_key_pems: list):
+        self.algorithm = algorithm
+        self.private_key = serialization.load_pem_private_key(private_key_pem, password=None)
+
+        self.current = VerificationKey(serialization.load_pem_public_key(public_key_pem))
+        if algorithm not in self.current.algorithms:
+            raise ValueError(f"JWT_ALGORITHM {algorithm} does not match the type of JWT_PUBLIC_KEY")
+
+        self.keys = {self.current.kid: self.current}
+        for pem in previous_public_key_pems:
+            key = VerificationKey(serialization.load_pem_public_key(pem))
+            self.keys.setdefault(key.kid, key)
+
+    @property
+    def kid(self) -> str:
+        return self.current.kid
+
+    def verification_key(self, kid: Optional[str]) -> Optional[VerificationKey]:
+        """
+        Returns the key for the `kid` of a token header, or None for an unknown `kid`.
+        """
+        if kid is None:
+            return self.current
+        return self.keys.get(kid)
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache from the SHA-256 of a verified token to its claims.
+
+    A burst of requests with the same access token verifies the signature once. An entry
+    is used only until the token's `exp`, so an expired token is verified again and
+    rejected. Revocation is not cached here: it is checked after every lookup.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+
+        self.hits_total = 0
+        self.misses_total = 0
+
+        self.__entries = OrderedDict()
+
+    def __key(token: str, issuer: Optional[str]) -> tuple:
+        return hashlib.sha256(token.encode()).digest(), issuer
+
+    def get(self, token: str, issuer: Optional[str] = None) -> Optional[dict]:
+        """
+        Returns the claims of a token verified earlier and not expired yet, or None.
+        """
+        key = VerifiedTokenCache.__key(token, issuer)
+        claims = self.__entries.get(key)
+
+        if claims is not None and "exp" in claims and claims["exp"] <= time.time():
+            del self.__entries[key]
+            claims = None
+
+        if claims is None:
+            self.misses_total += 1
+            return None
+
+        self.__entries.move_to_end(key)
+        self.hits_total += 1
+        return dict(claims)
+
+    def put(self, token: str, issuer: Optional[str], claims: dict):
+        """
+        Stores the claims of a verified token, evicting the least recently used entry when full.
+        """
+        if self.size <= 0:
+            return
+
+        key = VerifiedTokenCache.__key(token, issuer)
+        self.__entries[key] = dict(claims)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.size:
+            self.__entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Returns the size and the hit counters of the cache in this process.
+        """
+        return {
+            "size": len(self.__entries),
+            "max_size": self.size,
+            "hits_total": self.hits_total,
+            "misses_total": self.misses_total,
+        }
+
+
+jwt_keyring = JwtKeyring(
+    algorithm=Config.JWT_ALGORITHM,
+    private_key_pem=decode_pem(Config.JWT_PRIVATE_KEY),
+    public_key_pem=decode_pem(Config.JWT_PUBLIC_KEY),
+    previous_public_key_pems=[decode_pem(value) for value in Config.JWT_PREVIOUS_PUBLIC_KEYS.split(",") if value.strip()],
+)
+
+verified_token_cache = VerifiedTokenCache(size=Config.JWT_VERIFY_CACHE_SIZE)
@@ -0,0 +1,76 @@
+from decimal import Decimal, InvalidOperation
+from typing import Annotated, Union
+from pydantic import BeforeValidator, PlainSerializer
+
+# Суммы хранятся и считаются в целых минорных единицах (копейках/центах)
+MINOR_UNITS = 100
+
+# Границы столбцов BIGINT, в которых хранятся суммы
+MIN_MINOR_UNITS = -2 ** 63
+MAX_MINOR_UNITS = 2 ** 63 - 1
+
+
+def to_minor_units(value) -> int:
+    """
+    Converts a decimal amount to integer minor units without rounding.
+
+    Args:
+        value: The amount as a decimal string, int, float or Decimal, e.g. "12.34".
+
+    Returns:
+        int: The amount in minor units, e.g. 1234.
+
+    Raises:
+        ValueError: If the value is not a number, has more than two decimal places or does
+            not fit the signed 64-bit range of the database columns.
+    """
+    if isinstance(value, bool):
+        raise ValueError("Amount must be a number")
+
+    try:
+        # float переводим через str, чтобы 0.1 стало Decimal("0.1"), а не двоичным приближением
+        amount = Decimal(str(value).strip()) * MINOR_UNITS
+    except (InvalidOperation, ValueError):
+        raise ValueError("Amount must be a decimal number")
+
+    if not amount.is_finite() or amount != amount.to_integral_value():
+        raise ValueError("Amount must have at most two decimal places")
+
+    if not MIN_MINOR_UNITS <= amount <= MAX_MINOR_UNITS:
+        raise ValueError("Amount is out of range")
+
+    return int(amount)
+
+
+def to_nonzero_minor_units(value) -> int:
+    """
+    Converts a decimal amount to integer minor units like `to_minor_units`, rejecting zero.
+
+    Negative amounts stay allowed: they are debits and lower the balance.
+
+    Raises:
+        ValueError: If the value is not a valid amount or is zero.
+    """
+    amount = to_minor_units(value)
+    if amount == 0:
+        raise ValueError("Amount must not be zero")
+    return amount
+
+
+def format_minor_units(value: int) -> str:
+    """
+    Formats integer minor units as a decimal string, e.g. 1234 -> "12.34".
+    """
+    sign = "-" if value < 0 else ""
+    whole, fraction = divmod(abs(int(value)), MINOR_UNITS)
+    return f"{sign}{whole}.{fraction:02d}"
+
+
+# Сумма во входящих данных: принимает десятичную строку или число, хранит минорные единицы
+MoneyInput = Annotated[int, BeforeValidator(to_minor_units, json_schema_input_type=Union[str, float])]
+
+# Сумма поступления: то же, но не ноль; отрицательная сумма — списание
+NonZeroMoneyInput = Annotated[int, BeforeValidator(to_nonzero_minor_units, json_schema_input_type=Union[str, float])]
+
+# Сумма в ответах: минорные единицы из базы, в JSON — десятичная строка
+Money = Annotated[int, PlainSerializer(format_minor_units, return_type=str)]
@@ -1,38 +1,102 @@
-import base64
 from datetime import timedelta
-from typing import List
+from typing import Dict, List, Optional, Union
+import jwt
 from fastapi import Depends, HTTPException, status
-from async_fastapi_jwt_auth import AuthJWT
+from async_fastapi_jwt_auth import AuthJWT as BaseAuthJWT
+from async_fastapi_jwt_auth.exceptions import InvalidHeaderError, JWTDecodeError
 from pydantic import BaseModel
 from sqlalchemy import select
 from app.common.database import AsyncSession, get_async_session
-from app.models.user import User as UserModel
+from app.models.user import User as UserModel, UserTokenRevocation
+from app.services.token_denylist import token_denylist, is_revoked_by
+from app.services.token_revocation import token_revocation
+from app.common.jwt_keys import jwt_keyring, verified_token_cache
 
 from config import Config
 JWT_ALGORITHM = Config.JWT_ALGORITHM
-PUBLIC_KEY = Config.JWT_PUBLIC_KEY
-PRIVATE_KEY = Config.JWT_PRIVATE_KEY
+JWT_DECODE_ALGORITHMS = [algorithm.strip() for algorithm in Config.JWT_DECODE_ALGORITHMS.split(",") if algorithm.strip()] or [JWT_ALGORITHM]
 
 class Settings(BaseModel):
     authjwt_algorithm: str = JWT_ALGORITHM
-    authjwt_decode_algorithms: List[str] = [JWT_ALGORITHM]
+    authjwt_decode_algorithms: List[str] = JWT_DECODE_ALGORITHMS
     authjwt_token_location: set = {'cookies'}
     authjwt_cookie_csrf_protect: bool = False
     authjwt_access_cookie_key: str = 'access_token'
     authjwt_refresh_cookie_key: str = 'refresh_token'
-    authjwt_public_key: str = base64.b64decode(PUBLIC_KEY).decode('utf-8')
-    authjwt_private_key: str = base64.b64decode(PRIVATE_KEY).decode('utf-8')
     authjwt_access_token_expires: timedelta = timedelta(minutes=30)
     authjwt_refresh_token_expires: timedelta = timedelta(days=30)
     authjwt_access_csrf_cookie_key: str = "access_token_csrf"
     authjwt_refresh_csrf_cookie_key: str = "refresh_token_csrf"
+    # Без хранилища отзывов фильтр не загружается, и каждая проверка шла бы в базу
+    authjwt_denylist_enabled: bool = Config.TOKEN_REVOCATION_ENABLED
+    authjwt_denylist_token_checks: set = {'access', 'refresh'}
 
 
+class AuthJWT(BaseAuthJWT):
+    """
+    AuthJWT with keys parsed once, `kid` rotation and a cache of verified tokens.
+
+    The library passes the PEM strings to PyJWT, which parses them on every call; here
+    the parsed key objects of `jwt_keyring` are used instead. Verification looks the token
+    up in `verified_token_cache` first, so the signature of a token is checked once until
+    it expires; the library still checks freshness, type and revocation after it.
+
+    The keys are decoded and parsed only in `jwt_keyring`, so `Settings` holds no PEM
+    strings. A token is accepted only with an algorithm that is both in
+    `authjwt_decode_algorithms` and allowed for the type of the key its `kid` names.
+    """
+
+    async def _get_secret_key(self, algorithm: str, process: str):
+        if process == "encode":
+            return jwt_keyring.private_key
+        return jwt_keyring.current.public_key
+
+    async def _create_token(self, *args, headers: Optional[Dict] = None, **kwargs) -> str:
+        return await super()._create_token(*args, headers={**(headers or {}), "kid": jwt_keyring.kid}, **kwargs)
+
+    async def _verified_token(self, encoded_token: str, issuer: Optional[str] = None) -> Dict[str, Union[str, int, bool]]:
+        claims = verified_token_cache.get(encoded_token, issuer)
+        if claims is not None:
+            return claims
+
+        try:
+            headers = jwt.get_unverified_header(encoded_token)
+        except Exception as err:
+            raise InvalidHeaderError(status_code=422, message=str(err))
+
+        key = jwt_keyring.verification_key(headers.get("kid"))
+        if key is None:
+            raise JWTDecodeError(status_code=422, message="Unknown signing key")
+
+        # Разрешены только настроенные алгоритмы, подходящие к типу ключа
+        algorithms = [algorithm for algorithm in (self._decode_algorithms or [self._algorithm]) if algorithm in key.algorithms]
+        if headers.get("alg") not in algorithms:
+            raise JWTDecodeError(status_code=422, message="The specified alg value is not allowed")
+
+        try:
+            claims = jwt.decode(
+                encoded_token,
+                key.public_key,
+                issuer=issuer,
+                audience=self._decode_audience,
+                leeway=self._decode_leeway,
+                algorithms=algorithms,
+            )
+        except Exception as err:
+            raise JWTDecodeError(status_code=422, message=str(err))
+
+        verified_token_cache.put(encoded_token, issuer, claims)
+        return claims
+
 
 @AuthJWT.load_config
 def get_config():
     return Settings()
 
+@AuthJWT.token_in_denylist_loader
+async def check_if_token_in_denylist(decrypted_token: dict) -> bool:
+    return await token_revocation.is_revoked(decrypted_token["jti"])
+
 class NotVerified(Exception):
     pass
 
@@ -40,33 +104,107 @@ class NotVerified(Exception):
 class UserNotFound(Exception):
     pass
 
+
+class TokenRevoked(Exception):
+    pass
+
+def auth_error(e: Exception) -> HTTPException:
+    """
+    Maps an authentication failure to the HTTP error returned to the client.
+    """
+    error = e.__class__.__name__
+
+    if error == 'MissingTokenError':
+        return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="You are not logged in")
+    
+    if error == 'UserNotFound':
+        return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User no longer exist")
+    
+    if error == 'NotVerified':
+        return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Please verify your account")
+    
+    if error == 'TokenRevoked':
+        return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked")
+
+    if error == 'AttributeError':
+        return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Something attribute error")
+    
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token is invalid or has expired")
+
 async def require_user(session: AsyncSession = Depends(get_async_session), Authorize: AuthJWT = Depends()):
+    """
+    Strict mode: verifies the access token and checks in the database that the user still
+    exists and that the user's tokens were not revoked after this one was issued.
+
+    Returns:
+        str: The ID of the user.
+    """
     async with session.begin():
         try:
             await Authorize.jwt_required()
+            claims = await Authorize.get_raw_jwt()
             user_id = await Authorize.get_jwt_subject()
-            user = await session.execute(select(UserModel).where(UserModel.id == int(user_id)))
-            user = user.scalars().first()
+            user = await session.execute(
+                select(UserModel, UserTokenRevocation.generation)
+                .outerjoin(UserTokenRevocation, UserTokenRevocation.user_id == UserModel.id)
+                .where(UserModel.id == int(user_id))
+            )
+            user = user.first()
 
             if not user:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User no longer exist")
 
+            # Отзыв всех токенов пользователя, например при повторном использовании refresh-токена
+            if is_revoked_by(claims, user.generation):
+                raise TokenRevoked()
+
         except Exception as e:
             await session.rollback()
-            error = e.__class__.__name__
-
-            if error == 'MissingTokenError':
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="You are not logged in")
-            
-            if error == 'UserNotFound':
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User no longer exist")
-            
-            if error == 'NotVerified':
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Please verify your account")
-            
-            if error == 'AttributeError':
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Something attribute error")
-            
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token is invalid or has expired")
+            raise auth_error(e)
         
-        return user_id
\ No newline at end of file
+        return user_id
+
+async def require_claims(session: AsyncSession = Depends(get_async_session), Authorize: AuthJWT = Depends()) -> dict:
+    """
+    Stateless mode: verifies the access token and trusts its signed claims (`sub`, `role_id`, `exp`).
+
+    Deleted users and revoked tokens are rejected by the in-memory denylist, without a
+    database query. Only when the denylist has not been reloaded for too long the user
+    is looked up as in the strict mode.
+
+    Returns:
+        dict: The claims of the access token.
+    """
+    try:
+        await Authorize.jwt_required()
+        claims = await Authorize.get_raw_jwt()
+        user_id = int(claims["sub"])
+
+        if token_denylist.is_revoked(user_id, claims):
+            raise UserNotFound()
+
+        if not token_denylist.is_fresh():
+            async with session.begin():
+                user = await session.execute(
+                    select(UserModel.id, UserTokenRevocation.generation)
+                    .outerjoin(UserTokenRevocation, UserTokenRevocation.user_id == UserModel.id)
+                    .where(UserModel.id == user_id)
+                )
+                user = user.first()
+                if not user:
+                    raise UserNotFound()
+                if is_revoked_by(claims, user.generation):
+                    raise TokenRevoked()
+    except Exception as e:
+        raise auth_error(e)
+
+    return claims
+
+async def require_user_stateless(claims: dict = Depends(require_claims)):
+    """
+    Stateless counterpart of `require_user`.
+
+    Returns:
+        str: The ID of the user.
+    """
+    return claims["sub"]
@@ -0,0 +1,292 @@
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import HTTPException, Request, status
+from config import Config
+import logging as log
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window rate limiter: at most `limit` failures per key within `window` seconds.
+
+    The window is approximated with two fixed windows, the current one and the previous one
+    weighted by how much of it still overlaps the sliding window, so a key costs three
+    numbers instead of a timestamp per failure.
+
+    `acquire()` counts an attempt before it is made, in one atomic step with the check, so
+    concurrent attempts of one key never all see the same count: at most `limit` of them
+    get through. An attempt that turns out not to be a failure is taken back with
+    `release()`, and a rejected one is taken back at once, so only failures stay counted
+    and nobody can keep a key blocked without failing over and over.
+
+    Keys live in `shards` LRU maps of at most `max_keys / shards` entries each; a new key
+    evicts the least recently used one of its shard, so memory stays bounded however many
+    distinct emails or addresses arrive. An evicted key starts from zero again, which
+    only errs on the permissive side for keys not seen for a while.
+
+    With a Redis URL the counters are shared by all workers instead; if Redis fails, the
+    in-process counters are used so the limit still holds per worker.
+    """
+
+    KEY_PREFIX = "ratelimit:"
+
+    def __init__(self, name: str, limit: int, window: float, shards: int, max_keys: int, redis_url: Optional[str] = None, redis_timeout: Optional[float] = None):
+        self.name = name
+        self.limit = limit
+        self.window = window
+
+        self.allowed_total = 0
+        self.rejected_total = 0
+        self.released_total = 0
+        self.evictions = 0
+        self.redis_errors = 0
+
+        # ключ -> [номер окна, попытки в предыдущем окне, попытки в текущем]
+        self.__shards = [OrderedDict() for _ in range(max(shards, 1))]
+        self.__shard_size = max(max_keys // len(self.__shards), 1)
+
+        self.__redis = None
+        if redis_url and aioredis is not None:
+            self.__redis = aioredis.from_url(redis_url, socket_timeout=redis_timeout, decode_responses=True)
+
+    def __retry_after(self, previous: int, current: int, elapsed: float) -> int:
+        # Через сколько секунд оценка опустится ниже лимита
+        if current >= self.limit:
+            # Текущее окно истечет и станет предыдущим; ждем, пока его вес не уменьшит оценку ниже лимита
+            wait = (self.window - elapsed) + self.window * (1 - self.limit / current)
+        else:
+            wait = self.window * (1 - (self.limit - current) / previous) - elapsed
+        return max(math.ceil(wait), 1)
+
+    def __estimate(self, previous: int, current: int, elapsed: float) -> float:
+        return previous * (1 - elapsed / self.window) + current
+
+    def __shard(self, key: str) -> OrderedDict:
+        return self.__shards[hash(key) % len(self.__shards)]
+
+    def __acquire_local(self, key: str, index: int) -> tuple:
+        shard = self.__shard(key)
+
+        # Счетчики, сдвинутые к текущему окну
+        entry = shard.get(key)
+        if entry is None or entry[0] < index - 1:
+            entry = [index, 0, 0]
+        elif entry[0] == index - 1:
+            entry = [index, entry[2], 0]
+
+        entry[2] += 1
+        shard[key] = entry
+        shard.move_to_end(key)
+        while len(shard) > self.__shard_size:
+            shard.popitem(last=False)
+            self.evictions += 1
+
+        return entry[1], entry[2]
+
+    def __release_local(self, key: str, index: int):
+        entry = self.__shard(key).get(key)
+        if entry is None:
+            return
+        # Попытка могла уже перейти из текущего окна в предыдущее
+        if entry[0] == index:
+            entry[2] -= 1
+        elif entry[0] == index + 1:
+            entry[1] -= 1
+
+    def __redis_key(self, key: str, index: int) -> str:
+        return f"{self.KEY_PREFIX}{self.name}:{key}:{index}"
+
+    async def __acquire_redis(self, key: str, index: int) -> tuple:
+        current_key = self.__redis_key(key, index)
+        async with self.__redis.pipeline(transaction=False) as pipe:
+            pipe.incr(current_key)
+            # Счетчик окна нужен, пока оно текущее и следующее за ним
+            pipe.expire(current_key, math.ceil(self.window * 2))
+            pipe.get(self.__redis_key(key, index - 1))
+            current, _, previous = await pipe.execute()
+        return int(previous or 0), current
+
+    async def __release_redis(self, key: str, index: int):
+        current_key = self.__redis_key(key, index)
+        async with self.__redis.pipeline(transaction=False) as pipe:
+            pipe.decr(current_key)
+            # Ключ мог истечь, пока шла попытка; без срока он остался бы навсегда
+            pipe.expire(current_key, math.ceil(self.window * 2))
+            await pipe.execute()
+
+    async def __release(self, key: str, slot: tuple):
+        index, in_redis = slot
+        if in_redis:
+            try:
+                await self.__release_redis(key, index)
+            except Exception as e:
+                self.redis_errors += 1
+                log.error(f"Ошибка ограничителя попыток в Redis: {e}")
+        else:
+            self.__release_local(key, index)
+
+    def __window(self) -> tuple:
+        now = time.time()
+        index = int(now // self.window)
+        return index, now - index * self.window
+
+    async def acquire(self, key: str) -> tuple:
+        """
+        Counts an attempt of the key before it is made, unless the key is over the limit.
+
+        Returns:
+            tuple: `(0, slot)` if the attempt is allowed, where `slot` is passed to `release()`
+            if the attempt does not fail; otherwise `(seconds to wait before retrying, None)`,
+            and nothing stays counted.
+        """
+        index, elapsed = self.__window()
+
+        counts = None
+        in_redis = False
+        if self.__redis is not None:
+            try:
+                counts = await self.__acquire_redis(key, index)
+                in_redis = True
+            except Exception as e:
+                self.redis_errors += 1
+                log.error(f"Ошибка ограничителя попыток в Redis: {e}")
+        if counts is None:
+            counts = self.__acquire_local(key, index)
+
+        # Текущий счетчик уже включает эту попытку
+        previous, current = counts[0], counts[1] - 1
+        slot = (index, in_redis)
+        if self.__estimate(previous, current, elapsed) < self.limit:
+            self.allowed_total += 1
+            return 0, slot
+
+        await self.__release(key, slot)
+        self.rejected_total += 1
+        return self.__retry_after(previous, current, elapsed), None
+
+    async def release(self, key: str, slot: tuple):
+        """
+        Takes back an attempt counted by `acquire()`, because it did not fail.
+        """
+        self.released_total += 1
+        await self.__release(key, slot)
+
+    def stats(self) -> dict:
+        """
+        Returns the key count and the counters of this process.
+        """
+        return {
+            "limit": self.limit,
+            "window": self.window,
+            "keys": sum(len(shard) for shard in self.__shards),
+            "max_keys": self.__shard_size * len(self.__shards),
+            "allowed_total": self.allowed_total,
+            "rejected_total": self.rejected_total,
+            "released_total": self.released_total,
+            "evictions": self.evictions,
+            "redis_errors": self.redis_errors,
+        }
+
+
+class LoginAttempt:
+    """
+    A login attempt counted against the limits of its address and email until it is known not to have failed.
+    """
+
+    def __init__(self, slots: list):
+        self.slots = slots
+        self.failed = False
+
+    async def fail(self):
+        """
+        Marks the attempt as failed with an unknown email or a wrong password, so it stays counted.
+        """
+        self.failed = True
+
+
+class LoginRateLimiter:
+    """
+    Limits failed login attempts per email and per client address.
+
+    An attempt is counted against both limits before any database query or password
+    hashing and taken back when it ends without failing, so concurrent attempts cannot
+    all pass the limit while their passwords are still being checked.
+    """
+
+    def __init__(self, by_email: SlidingWindowLimiter, by_ip: SlidingWindowLimiter, trust_forwarded: bool):
+        self.by_email = by_email
+        self.by_ip = by_ip
+        self.trust_forwarded = trust_forwarded
+
+    def client_ip(self, request: Request) -> str:
+        """
+        Returns the client address, taken from X-Forwarded-For only behind a trusted proxy.
+        """
+        if self.trust_forwarded:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    async def __release(self, slots: list):
+        for limiter, key, slot in slots:
+            await limiter.release(key, slot)
+
+    @asynccontextmanager
+    async def attempt(self, request: Request, email: str):
+        """
+        Counts a login attempt for its address and email for the duration of the block.
+
+        The attempt is taken back when the block ends, unless `LoginAttempt.fail()` was
+        awaited in it; an error in the block, e.g. a saturated hashing pool, is no failure.
+
+        Raises:
+            HTTPException: 429 with Retry-After if the address or the email failed too many times.
+        """
+        slots = []
+        retry_after = 0
+        for limiter, key in ((self.by_ip, self.client_ip(request)), (self.by_email, email.lower())):
+            wait, slot = await limiter.acquire(key)
+            if wait:
+                retry_after = max(retry_after, wait)
+            else:
+                slots.append((limiter, key, slot))
+
+        if retry_after:
+            await self.__release(slots)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts, retry later",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+        attempt = LoginAttempt(slots)
+        try:
+            yield attempt
+        finally:
+            if not attempt.failed:
+                await self.__release(slots)
+
+
+login_redis_url = Config.REDIS_URL if Config.LOGIN_RATE_LIMIT_REDIS else None
+login_redis_timeout = float(Config.REDIS_TIMEOUT) if Config.REDIS_TIMEOUT else None
+
+login_rate_limiter = LoginRateLimiter(
+    by_email=SlidingWindowLimiter(
+        "login-email", Config.LOGIN_RATE_LIMIT_PER_EMAIL, Config.LOGIN_RATE_LIMIT_WINDOW,
+        Config.LOGIN_RATE_LIMIT_SHARDS, Config.LOGIN_RATE_LIMIT_MAX_KEYS, login_redis_url, login_redis_timeout,
+    ),
+    by_ip=SlidingWindowLimiter(
+        "login-ip", Config.LOGIN_RATE_LIMIT_PER_IP, Config.LOGIN_RATE_LIMIT_WINDOW,
+        Config.LOGIN_RATE_LIMIT_SHARDS, Config.LOGIN_RATE_LIMIT_MAX_KEYS, login_redis_url, login_redis_timeout,
+    ),
+    trust_forwarded=Config.LOGIN_RATE_LIMIT_TRUST_FORWARDED,
+)
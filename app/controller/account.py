@@ -1,8 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.common.database import get_async_session
-from app.schemas.account import AccountBalanceRequest, AccountCreate, IncomingFundCreate, AccountCreateResponse, AccountBalanceResponse, IncomingFundCreateResponse, SettlementResponse
+from app.schemas.account import AccountBalanceRequest, AccountCreate, IncomingFundCreate, AccountCreateResponse, AccountBalanceResponse, IncomingFundCreateResponse, SettlementResponse, IncomingFundImportResponse, SettlementWorkerStats, BulkSettlementRequest, BulkSettlementResponse, StatementFormatEnum, AccountPage, IncomingFundPage, RollupGranularityEnum, InflowSeriesPoint, BalanceCacheStats, BalanceShardsRequest, BalanceShardsResponse, BatchBalanceRequest, BatchBalanceResponse, BalanceFeedStats, GroupCommitStats
 from app.services.account import AccountService
+from app.services.settlement import settlement_worker
+from app.services.rollup import RollupService
+from app.services.balance_shard import BalanceShardService
+from app.services.feed import balance_feed
+from app.services.group_commit import group_committer
+from app.common.cache import balance_cache
+from app.helpers.fund_import import iter_csv_rows, iter_ndjson_rows
+from config import Config
 from sqlalchemy.exc import SQLAlchemyError
 
 router = APIRouter(
@@ -49,8 +61,10 @@ async def account_balance(request: AccountBalanceRequest, session: AsyncSession
     """
     Retrieve the account balance for a given account ID.
 
+    When `datetime` is given, the balance as of that moment is returned instead of the current one.
+
     Parameters:
-    - request (AccountBalanceRequest): The request object containing the account ID and datetime.
+    - request (AccountBalanceRequest): The request object containing the account ID and an optional datetime.
     - session (AsyncSession, optional): The async session to use for the database transaction. Defaults to None.
 
     Returns:
@@ -59,9 +73,130 @@ async def account_balance(request: AccountBalanceRequest, session: AsyncSession
     Raises:
     - HTTPException: If there is a transaction error or internal server error.
     """
-    balance = await AccountService.get_account_balance(session, request.account_id)
+    if request.datetime is not None:
+        balance = await AccountService.get_account_balance_at(session, request.account_id, request.datetime)
+    else:
+        balance = await AccountService.get_account_balance(session, request.account_id)
     return {"account_id": request.account_id, "balance": balance}
 
+# Маршрут для получения балансов многих счетов за один запрос
+@router.post("/account/balances", response_model=BatchBalanceResponse)
+async def account_balances(request: BatchBalanceRequest, session: AsyncSession = Depends(get_async_session)):
+    """
+    Retrieve the balances of many accounts in one call.
+
+    When `datetime` is given, the balances as of that moment are returned instead of the current ones.
+
+    Parameters:
+    - request (BatchBalanceRequest): The account IDs and an optional datetime.
+    - session (AsyncSession, optional): The async session to use for the database transaction. Defaults to `Depends(get_async_session)`.
+
+    Returns:
+    - dict: One item per requested account in request order, with a null balance for
+      missing accounts, and the IDs of the missing accounts.
+
+    Raises:
+    - HTTPException: If too many accounts are requested or there is an internal server error.
+    """
+    if len(request.account_ids) > Config.BATCH_BALANCE_MAX_ACCOUNTS:
+        raise HTTPException(status_code=400, detail=f"At most {Config.BATCH_BALANCE_MAX_ACCOUNTS} accounts can be requested at once")
+
+    balances = await AccountService.get_account_balances(session, request.account_ids, request.datetime)
+    return {
+        "items": [{"account_id": account_id, "balance": balances.get(account_id)} for account_id in request.account_ids],
+        "missing": [account_id for account_id in dict.fromkeys(request.account_ids) if account_id not in balances],
+    }
+
+# Маршрут для постраничного списка счетов пользователя
+@router.get("/user/{user_id}/accounts", response_model=AccountPage)
+async def user_accounts(user_id: int, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None, session: AsyncSession = Depends(get_async_session)):
+    """
+    List the accounts of a user with cursor pagination.
+
+    Parameters:
+    - user_id (int): The ID of the user.
+    - limit (int): The page size, 1 to 500. Defaults to 50.
+    - cursor (str, optional): The `next_cursor` returned with the previous page.
+    - session (AsyncSession, optional): The async session to use for the database transaction. Defaults to `Depends(get_async_session)`.
+
+    Returns:
+    - dict: The accounts of the page and the cursor of the next page, or null on the last page.
+
+    Raises:
+    - HTTPException: If the cursor is invalid.
+    """
+    return await AccountService.list_user_accounts(session, user_id, limit, cursor)
+
+# Маршрут для постраничного списка входящих средств счета
+@router.get("/account/{account_id}/incoming-funds", response_model=IncomingFundPage)
+async def account_incoming_funds(account_id: int, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None, session: AsyncSession = Depends(get_async_session)):
+    """
+    List the incoming funds of an account by settlement date with cursor pagination.
+
+    Parameters:
+    - account_id (int): The ID of the account.
+    - limit (int): The page size, 1 to 500. Defaults to 50.
+    - cursor (str, optional): The `next_cursor` returned with the previous page.
+    - session (AsyncSession, optional): The async session to use for the database transaction. Defaults to `Depends(get_async_session)`.
+
+    Returns:
+    - dict: The funds of the page and the cursor of the next page, or null on the last page.
+
+    Raises:
+    - HTTPException: If the cursor is invalid.
+    """
+    return await AccountService.list_incoming_funds(session, account_id, limit, cursor)
+
+# Маршрут для выгрузки выписки по счету
+@router.get("/account/{account_id}/statement")
+async def account_statement(account_id: int, format: StatementFormatEnum = StatementFormatEnum.ndjson, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, session: AsyncSession = Depends(get_async_session)):
+    """
+    Export the incoming funds of an account as a streamed NDJSON or CSV statement.
+
+    Parameters:
+    - account_id (int): The ID of the account.
+    - format (StatementFormatEnum): `ndjson` (default) or `csv`.
+    - date_from (datetime, optional): Only funds settling at or after this moment.
+    - date_to (datetime, optional): Only funds settling at or before this moment.
+    - session (AsyncSession, optional): The async session used to check that the account exists. Defaults to `Depends(get_async_session)`.
+
+    Returns:
+    - StreamingResponse: The statement, produced chunk by chunk.
+
+    Raises:
+    - HTTPException: If the account is not found.
+    """
+    await AccountService.get_account(session, account_id)
+    await session.close()
+
+    media_type = "text/csv" if format == StatementFormatEnum.csv else "application/x-ndjson"
+    return StreamingResponse(
+        AccountService.stream_statement(account_id, date_from, date_to, format, Config.STATEMENT_EXPORT_CHUNK_SIZE),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="statement-{account_id}.{format.value}"'}
+    )
+
+# Маршрут для временных рядов поступлений
+@router.get("/rollups/inflow", response_model=List[InflowSeriesPoint])
+async def inflow_series(date_from: datetime, date_to: datetime, granularity: RollupGranularityEnum = RollupGranularityEnum.day, account_id: Optional[int] = None, session: AsyncSession = Depends(get_async_session)):
+    """
+    Retrieve daily or monthly inflow totals from the maintained rollups.
+
+    Parameters:
+    - date_from (datetime): The start of the range; the bucket containing it is included.
+    - date_to (datetime): The end of the range, inclusive.
+    - granularity (RollupGranularityEnum): `day` (default) or `month`.
+    - account_id (int, optional): The account; totals over all accounts when omitted.
+    - session (AsyncSession, optional): The async session to use for the database transaction. Defaults to `Depends(get_async_session)`.
+
+    Returns:
+    - list: One point per non-empty bucket with inflow and settled totals.
+
+    Raises:
+    - HTTPException: If there is an internal server error.
+    """
+    return await RollupService.get_inflow_series(session, granularity, date_from, date_to, account_id)
+
 # Маршрут для добавления входящих средств
 @router.post("/incoming-fund/", response_model=IncomingFundCreateResponse)
 async def create_incoming_fund(fund_data: IncomingFundCreate, session: AsyncSession = Depends(get_async_session)):
@@ -72,14 +207,177 @@ async def create_incoming_fund(fund_data: IncomingFundCreate, session: AsyncSess
     - fund_data: The data for creating the incoming fund.
     - session: The async session for database operations.
 
+    With `GROUP_COMMIT_ENABLED` the fund is written together with concurrent requests
+    in one batched transaction.
+
     Returns:
     - The created incoming fund.
+
+    Raises:
+    - HTTPException: 404 if the account is not found, 503 if the group-commit queue is full, 500 on unexpected errors.
     """
     try:
+        if Config.GROUP_COMMIT_ENABLED:
+            return await group_committer.submit(fund_data)
         fund = await AccountService.add_incoming_fund(session, fund_data)
         return fund
-    except HTTPException as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Неизвестная ошибка: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+# Маршрут для получения счетчиков групповой записи средств
+@router.get("/incoming-fund/group-commit/stats", response_model=GroupCommitStats)
+async def group_commit_stats():
+    """
+    Retrieve the queue length and batch counters of the group-commit writer of this process.
+
+    Returns:
+    - dict: The configuration, the number of queued deposits and the batch totals.
+    """
+    return group_committer.stats()
+
+# Маршрут для пакетной загрузки входящих средств
+@router.post("/incoming-fund/bulk", response_model=IncomingFundImportResponse)
+async def create_incoming_funds_bulk(request: Request, session: AsyncSession = Depends(get_async_session)):
+    """
+    Import incoming funds in bulk from the request body.
+
+    The body is streamed as NDJSON (one `IncomingFundCreate` object per line) or, with a
+    `text/csv` content type, as CSV with an `account_id,amount,settlement_date` header.
+
+    Parameters:
+    - request (Request): The incoming request whose body holds the funds.
+    - session (AsyncSession, optional): The async session to use for the database transaction. Defaults to `Depends(get_async_session)`.
+
+    Returns:
+    - dict: The import report with per-row errors and the throughput in rows per second.
+
+    Raises:
+    - HTTPException: If the import fails; nothing is written in that case.
+    """
+    if "csv" in request.headers.get("content-type", ""):
+        rows = iter_csv_rows(request.stream())
+    else:
+        rows = iter_ndjson_rows(request.stream())
+
+    return await AccountService.import_incoming_funds(session, rows, Config.BULK_IMPORT_BATCH_SIZE)
+
+# Маршрут для перевода счета в режим ячеек баланса и обратно
+@router.post("/account/{account_id}/balance-shards", response_model=BalanceShardsResponse)
+async def account_balance_shards(account_id: int, request: BalanceShardsRequest, session: AsyncSession = Depends(get_async_session)):
+    """
+    Switch an account between the normal and the sharded balance mode without downtime.
+
+    With `shards > 1` deposits to the account are spread over that many counter slots instead
+    of all waiting on the account row; `shards = 1` switches it back and folds the slots.
+
+    Parameters:
+    - account_id (int): The ID of the account.
+    - request (BalanceShardsRequest): The number of slots.
+    - session (AsyncSession, optional): The async session to use for the database transaction. Defaults to `Depends(get_async_session)`.
+
+    Returns:
+    - dict: The account ID, the new number of slots and the number of slot rows folded.
+
+    Raises:
+    - HTTPException: If the number of slots is too large or the account is not found.
+    """
+    if request.shards > Config.BALANCE_SHARDS_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {Config.BALANCE_SHARDS_MAX} balance shards are allowed")
+
+    folded = await BalanceShardService.set_shards(session, account_id, request.shards)
+    return {"account_id": account_id, "shards": request.shards, "folded": folded}
+
+# Маршрут для получения счетчиков кеша балансов
+@router.get("/cache/stats", response_model=BalanceCacheStats)
+async def cache_stats():
+    """
+    Retrieve the hit, miss and eviction counters of the balance cache of this process.
+
+    Returns:
+    - dict: The cache size and counters of the in-process and Redis tiers.
+    """
+    return balance_cache.stats()
+
+# Маршрут для подписки на изменения балансов
+@router.get("/balance-events")
+async def balance_events(account_id: Optional[List[int]] = Query(None), last_event_id: Optional[int] = Header(None)):
+    """
+    Stream committed balance changes as Server-Sent Events.
+
+    Each deposit and settlement is sent as an event named after its kind. Clients that
+    reconnect with the `Last-Event-ID` header first receive the events they missed.
+    A client that cannot keep up receives a `dropped` event and is disconnected.
+
+    Parameters:
+    - account_id (Optional[List[int]]): The accounts to follow; all accounts when omitted.
+    - last_event_id (Optional[int]): The ID of the last event received before reconnecting.
+
+    Returns:
+    - StreamingResponse: The `text/event-stream` response.
+
+    Raises:
+    - HTTPException: If the feed is disabled or this worker has too many subscribers.
+    """
+    if not Config.BALANCE_FEED_ENABLED:
+        raise HTTPException(status_code=404, detail="Balance feed is disabled")
+
+    # Подписываемся до начала ответа, чтобы отказ по лимиту вернулся кодом 503
+    subscription = balance_feed.subscribe(account_id)
+    return StreamingResponse(
+        balance_feed.stream(subscription, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Отписка и на случай, если клиент отключился до начала потока
+        background=BackgroundTask(balance_feed.unsubscribe, subscription),
+    )
+
+# Маршрут для получения счетчиков ленты балансов
+@router.get("/balance-events/stats", response_model=BalanceFeedStats)
+async def balance_events_stats():
+    """
+    Retrieve the subscriber and delivery counters of the balance feed of this process.
+
+    Returns:
+    - dict: Whether the listener is connected, the subscriber count and the delivery totals.
+    """
+    return balance_feed.stats()
+
+# Маршрут для получения счетчиков фонового урегулирования
+@router.get("/settlement/stats", response_model=SettlementWorkerStats)
+async def settlement_stats():
+    """
+    Retrieve the counters of the background settlement worker of this process.
+
+    Returns:
+    - dict: The worker configuration, totals and the settled funds per second over the last minute.
+    """
+    return settlement_worker.stats()
+
+# Маршрут для пакетного урегулирования средств
+@router.post("/settlement/bulk", response_model=BulkSettlementResponse)
+async def settlement_bulk(request: BulkSettlementRequest, session: AsyncSession = Depends(get_async_session)):
+    """
+    Process settlement for many funds in one transaction.
+
+    Parameters:
+    - request (BulkSettlementRequest): Either `fund_ids` or an inclusive `fund_id_from`/`fund_id_to` range.
+    - session (AsyncSession, optional): The async session to use for the database transaction. Defaults to `Depends(get_async_session)`.
+
+    Returns:
+    - dict: The number of settled funds and the outcome for each requested fund.
+
+    Raises:
+    - HTTPException: If the request is invalid or there is an internal server error.
+    """
+    fund_ids = AccountService.resolve_settlement_fund_ids(request, Config.BULK_SETTLEMENT_MAX_FUNDS)
+    results = await AccountService.process_settlement_bulk(session, fund_ids)
+    return {
+        "settled": sum(1 for result in results if result["status"] == "settled"),
+        "results": results
+    }
 
 # Маршрут для обработки урегулирования средств
 @router.post("/settlement/{fund_id}", response_model=SettlementResponse)
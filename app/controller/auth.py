@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy import select
 from app.common.database import get_async_session, AsyncSession
 from app.common.oauth2 import AuthJWT
+from app.common.rate_limit import login_rate_limiter
 from app.common.exceptions.validation_exception import ValidationLoginException, ValidationRegisterException
 from app.schemas.auth import GetUserAfterRegistrationSchema
 from app.schemas.user import CreateUserSchema, UserLoginSchema, ResponseLoginUser
 import logging as log
+from config import Config
 from app.services.auth import AuthService
 
 router = APIRouter(
@@ -36,12 +38,13 @@ async def register(payload: CreateUserSchema, session: AsyncSession = Depends(ge
     return user
         
 @router.post('/login', response_model=ResponseLoginUser)
-async def login(payload: UserLoginSchema, response: Response, session: AsyncSession = Depends(get_async_session), Authorize: AuthJWT = Depends()):
+async def login(payload: UserLoginSchema, request: Request, response: Response, session: AsyncSession = Depends(get_async_session), Authorize: AuthJWT = Depends()):
     """
     Login function for authenticating a user.
 
     Parameters:
     - payload (UserLoginSchema): The user login payload containing the username and password.
+    - request (Request): The incoming request, for the client address.
     - response (Response): The response object to send back to the client.
     - session (AsyncSession, optional): The async session to use for database operations. Defaults to the session obtained from `get_async_session` dependency.
     - Authorize (AuthJWT, optional): The AuthJWT instance for handling JWT authentication. Defaults to the instance obtained from `Depends()`.
@@ -50,11 +53,52 @@ async def login(payload: UserLoginSchema, response: Response, session: AsyncSess
     - auth: The authentication result.
 
     Raises:
-    - HTTPException: If there is an internal server error during the login process.
+    - HTTPException: If there were too many failed attempts (429) or there is an internal server error during the login process.
     """
     errors = ValidationLoginException.validate_payload(payload)
     if errors:
         raise ValidationLoginException(errors)
 
-    auth = await AuthService.login(session, payload, response, Authorize)
-    return auth
\ No newline at end of file
+    if not Config.LOGIN_RATE_LIMIT_ENABLED:
+        auth = await AuthService.login(session, payload, response, Authorize)
+        return auth
+
+    # Попытка засчитывается до запроса к базе и до bcrypt и возвращается, если вход не провалился
+    async with login_rate_limiter.attempt(request, payload.email) as attempt:
+        auth = await AuthService.login(session, payload, response, Authorize, attempt.fail)
+    return auth
+
+@router.post('/refresh', response_model=ResponseLoginUser)
+async def refresh(response: Response, session: AsyncSession = Depends(get_async_session), Authorize: AuthJWT = Depends()):
+    """
+    Exchange the refresh token cookie for a new access and refresh token pair.
+
+    Parameters:
+    - response (Response): The response object that receives the new token cookies.
+    - session (AsyncSession, optional): The async session to use for database operations.
+    - Authorize (AuthJWT, optional): The AuthJWT instance for handling JWT authentication.
+
+    Returns:
+    - auth: The user and the permissions of the new access token.
+
+    Raises:
+    - HTTPException: If the refresh token is missing, invalid, revoked or already used.
+    """
+    auth = await AuthService.refresh(session, response, Authorize)
+    return auth
+
+@router.post('/logout')
+async def logout(request: Request, response: Response, session: AsyncSession = Depends(get_async_session), Authorize: AuthJWT = Depends()):
+    """
+    Revoke the access and refresh tokens of the request and clear the token cookies.
+
+    Parameters:
+    - request (Request): The request with the token cookies.
+    - response (Response): The response object whose cookies are cleared.
+    - session (AsyncSession, optional): The async session to use for database operations.
+    - Authorize (AuthJWT, optional): The AuthJWT instance for handling JWT authentication.
+
+    Returns:
+    - dict: The status code and message.
+    """
+    return await AuthService.logout(session, request, response, Authorize)
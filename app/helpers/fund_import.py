@@ -0,0 +1,104 @@
+import csv
+import json
+from typing import AsyncIterator, Optional, Tuple
+
+# Строка файла импорта: номер строки, разобранные поля, ошибка разбора
+ImportRow = Tuple[int, Optional[dict], Optional[str]]
+
+
+def decode_line(line: bytes) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Decodes one line as UTF-8.
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: The stripped text (or None) and the decode error (or None).
+    """
+    try:
+        return line.decode("utf-8").strip(), None
+    except UnicodeDecodeError as e:
+        return None, f"Invalid UTF-8 at byte {e.start}"
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[str], Optional[str]]]:
+    """
+    Splits a stream of byte chunks into numbered, non-empty text lines.
+
+    A line that is not valid UTF-8 is yielded with its error instead of the text, so it
+    fails on its own and the rest of the stream is still read.
+
+    Args:
+        chunks (AsyncIterator[bytes]): The raw byte stream, e.g. a request body.
+
+    Yields:
+        Tuple[int, Optional[str], Optional[str]]: The 1-based line number, the decoded line (or None) and the decode error (or None).
+    """
+    buffer = b""
+    line_number = 0
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            text, error = decode_line(line)
+            if text or error:
+                yield line_number, text, error
+
+    if buffer.strip():
+        text, error = decode_line(buffer)
+        yield line_number + 1, text, error
+
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[ImportRow]:
+    """
+    Parses a newline-delimited JSON stream, one object per line.
+
+    Yields:
+        ImportRow: The line number, the parsed object (or None) and the parse error (or None).
+    """
+    async for line_number, text, error in iter_lines(chunks):
+        if error is not None:
+            yield line_number, None, error
+            continue
+
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+
+        yield line_number, row, None
+
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[ImportRow]:
+    """
+    Parses a CSV stream whose first line is the header. Quoted values must not contain line breaks.
+
+    Yields:
+        ImportRow: The line number, the row as a dict (or None) and the parse error (or None).
+    """
+    header = None
+
+    async for line_number, text, error in iter_lines(chunks):
+        if error is not None:
+            yield line_number, None, error
+            # Без заголовка остальные строки не разобрать
+            if header is None:
+                return
+            continue
+
+        fields = next(csv.reader([text]))
+
+        if header is None:
+            header = [field.strip() for field in fields]
+            continue
+
+        if len(fields) != len(header):
+            yield line_number, None, f"Expected {len(header)} columns, got {len(fields)}"
+            continue
+
+        yield line_number, dict(zip(header, fields)), None
@@ -1,49 +1,56 @@
 from functools import wraps
 from fastapi import HTTPException, status
-from fastapi.encoders import jsonable_encoder
-from app.common.database import AsyncSession, engine
-from app.models.user import User
-from sqlalchemy import select, or_, and_
-from sqlalchemy.orm import joinedload
-from app.models.role import Role
+from app.services.permission import permission_resolver
 
 def has_permission(permissions: list):
-    
+    """
+    Allows the call if the user's role has at least one of the given permissions.
+
+    The required slugs are compiled into a bitmask once per permission catalog version, so
+    a check is a bitwise AND. When the route receives the token `claims` (see
+    `require_claims`) and their permission version `pv` is current, the role mask `pm`
+    from the token is used as is. A token issued before a permission change, or a route
+    without claims, falls back to the role's mask from `permission_resolver`; the role is
+    then taken from the claims or looked up by `user_id`.
+    """
+    required = frozenset(permissions)
+    compiled = {"version": None, "mask": 0}
+
+    def required_mask() -> int:
+        # Маска пересобирается только после смены версии каталога прав
+        if compiled["version"] != permission_resolver.version:
+            compiled["mask"] = permission_resolver.mask_of(required)
+            compiled["version"] = permission_resolver.version
+        return compiled["mask"]
+
     def decorator(func):
-    
+
         @wraps(func)
-    
+
         async def wrapper(*args, **kwargs):
-            session = AsyncSession(bind=engine)
-            user_id = kwargs.get('user_id')
-            
-            async with session.begin():
-                try:
-                    user = await session.execute(select(User).filter(User.id == int(user_id)))
-                    user = user.scalars().first()
+            claims = kwargs.get('claims') or {}
+            await permission_resolver.ensure_fresh()
+
+            if 'pm' in claims and claims.get('pv') == permission_resolver.version:
+                granted = claims['pm']
+            else:
+                role_id = claims.get('role_id')
+                if role_id is None:
                     try:
-                        role = await session.execute(select(Role).options(joinedload(Role.permissions)).filter(Role.id == user.role_id))
-                        role = role.scalars().first()
-                        user_permissions = [role['slug'] for role in jsonable_encoder(role.permissions)]
+                        role_id = await permission_resolver.get_user_role(int(kwargs.get('user_id')))
                     except Exception as e:
                         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
-                except Exception as e:
-                    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
-            
-            if not user:
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-            
-            existing_permissions = []
-
-            for permission in permissions:
-                if permission in user_permissions:
-                    existing_permissions.append(permission)
-
-            if not existing_permissions:
+
+                    if role_id is None:
+                        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+
+                granted, _ = await permission_resolver.get_mask(role_id)
+
+            if not granted & required_mask():
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Access denied")
 
             return await func(*args, **kwargs)
-        
+
         return wrapper
-    
-    return decorator
\ No newline at end of file
+
+    return decorator
@@ -0,0 +1,62 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException, status
+
+
+def encode_cursor(*values) -> str:
+    """
+    Packs the sort key of the last returned row into an opaque URL-safe cursor.
+
+    Args:
+        *values: The key values; datetimes are stored in ISO format.
+
+    Returns:
+        str: The cursor to pass back to get the next page.
+    """
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+# Ключи курсоров — столбцы INTEGER; большее значение база отвергла бы ошибкой, а не 400
+INTEGER_MAX = 2 ** 31 - 1
+
+
+def decode_key_value(value, kind: type):
+    if kind is datetime:
+        # Курсоры хранят наивное время, как в столбцах; время с часовым поясом курсор не выдавал
+        parsed = datetime.fromisoformat(value) if isinstance(value, str) else None
+        return parsed if parsed is not None and parsed.tzinfo is None else None
+    if kind is int:
+        return value if type(value) is int and -INTEGER_MAX - 1 <= value <= INTEGER_MAX else None
+    return None
+
+
+def decode_cursor(cursor: str, *kinds: type) -> list:
+    """
+    Unpacks a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor (str): The cursor received from the client.
+        *kinds: The expected type of each key value, `int` or `datetime`.
+
+    Returns:
+        list: The key values converted to the expected types.
+
+    Raises:
+        HTTPException: If the cursor is malformed or its values do not have the expected types.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(kinds):
+            raise ValueError("wrong number of key values")
+
+        decoded = [decode_key_value(value, kind) for value, kind in zip(values, kinds)]
+        if None in decoded:
+            raise ValueError("wrong key value type")
+    # RecursionError — JSON с глубокой вложенностью
+    except (ValueError, RecursionError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    return decoded
@@ -1,10 +1,73 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from config import Config
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Фоновые задачи запускаются вместе с приложением, если включены в конфигурации
+    from app.services.settlement import settlement_worker
+    from app.services.partition import PartitionService
+    from app.services.balance_shard import BalanceShardService
+    from app.services.feed import balance_feed
+    from app.services.group_commit import group_committer
+    from app.common.hashing import hashing_executor
+    from app.services.token_denylist import token_denylist
+    from app.services.permission import permission_resolver
+    from app.services.token_revocation import token_revocation
+
+    if Config.SETTLEMENT_WORKER_ENABLED:
+        settlement_worker.start()
+    if Config.AUTH_DENYLIST_ENABLED:
+        token_denylist.start()
+    if Config.PERMISSION_CACHE_ENABLED:
+        permission_resolver.start()
+    if Config.TOKEN_REVOCATION_ENABLED:
+        await token_revocation.start()
+    if Config.BALANCE_FEED_ENABLED:
+        balance_feed.start()
+    if Config.GROUP_COMMIT_ENABLED:
+        group_committer.start()
+    if Config.PARTITION_MAINTENANCE_ENABLED:
+        partition_maintenance = asyncio.create_task(
+            PartitionService.run_maintenance(Config.PARTITION_MONTHS_AHEAD, Config.PARTITION_MAINTENANCE_INTERVAL)
+        )
+    if Config.BALANCE_SHARD_COMPACTION_ENABLED:
+        balance_shard_compaction = asyncio.create_task(
+            BalanceShardService.run_compaction(Config.BALANCE_SHARD_COMPACTION_INTERVAL, Config.BALANCE_SHARD_COMPACTION_BATCH_SIZE)
+        )
+    yield
+    if Config.GROUP_COMMIT_ENABLED:
+        await group_committer.stop()
+    if Config.BALANCE_SHARD_COMPACTION_ENABLED:
+        balance_shard_compaction.cancel()
+        with suppress(asyncio.CancelledError):
+            await balance_shard_compaction
+    if Config.PARTITION_MAINTENANCE_ENABLED:
+        partition_maintenance.cancel()
+        with suppress(asyncio.CancelledError):
+            await partition_maintenance
+    if Config.BALANCE_FEED_ENABLED:
+        await balance_feed.stop()
+    if Config.SETTLEMENT_WORKER_ENABLED:
+        await settlement_worker.stop()
+    if Config.AUTH_DENYLIST_ENABLED:
+        await token_denylist.stop()
+    if Config.PERMISSION_CACHE_ENABLED:
+        await permission_resolver.stop()
+    if Config.TOKEN_REVOCATION_ENABLED:
+        await token_revocation.stop()
+    hashing_executor.shutdown()
+
+
 app = FastAPI(
     title="Auth Service",
     description="Auth Service API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 app.add_middleware(
     CORSMiddleware,
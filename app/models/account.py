@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, DECIMAL
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index, text
 from sqlalchemy.orm import relationship, validates
 
 from app.common.database import Base
@@ -9,18 +9,93 @@ class Account(Base):
 
     account_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("user.id"))
-    balance = Column(DECIMAL(18, 2), default=0)
+    balance = Column(BigInteger, default=0)
+    # Число ячеек баланса: 1 — обычный счет, больше 1 — поступления копятся в account_balance_shard
+    balance_shards = Column(Integer, nullable=False, default=1, server_default="1")
 
     owner = relationship("User", back_populates="accounts")
     incoming_funds = relationship("IncomingFunds", back_populates="accounts")
 
+    __table_args__ = (
+        # Индекс для постраничного вывода счетов пользователя по ключу
+        Index("ix_account_user_id_account_id", "user_id", "account_id"),
+    )
+
 
 class IncomingFunds(Base):
     __tablename__ = "incoming_fund"
 
-    fund_id = Column(Integer, primary_key=True, index=True)
+    # Таблица секционирована по месяцам settlement_date, поэтому ключ секционирования входит в первичный ключ
+    fund_id = Column(Integer, primary_key=True, autoincrement=True)
     account_id = Column(Integer, ForeignKey("account.account_id"))
-    amount = Column(DECIMAL(18, 2), nullable=False)
-    settlement_date = Column(DateTime, nullable=False)
+    amount = Column(BigInteger, nullable=False)
+    settlement_date = Column(DateTime, primary_key=True, nullable=False)
+    settled_at = Column(DateTime, nullable=True)
+
+    accounts = relationship("Account", back_populates="incoming_funds")
+
+    __table_args__ = (
+        # Покрывающий индекс для выборок по счету и дате урегулирования и постраничного вывода по ключу
+        Index("ix_incoming_fund_account_id_settlement_date_fund_id", "account_id", "settlement_date", "fund_id", postgresql_include=["amount"]),
+        # Частичный индекс очереди урегулирования: только еще не урегулированные средства
+        Index("ix_incoming_fund_unsettled_settlement_date", "settlement_date", postgresql_where=text("settled_at IS NULL")),
+        {"postgresql_partition_by": "RANGE (settlement_date)"},
+    )
+
+
+class AccountBalanceSnapshot(Base):
+    __tablename__ = "account_balance_snapshot"
+
+    account_id = Column(Integer, ForeignKey("account.account_id"), primary_key=True)
+    period_start = Column(DateTime, primary_key=True)
+    # Баланс на конец периода: сумма средств с settlement_date до начала следующего периода
+    balance = Column(BigInteger, nullable=False, default=0)
+
+
+class AccountInflowRollup(Base):
+    __tablename__ = "account_inflow_rollup"
+
+    account_id = Column(Integer, ForeignKey("account.account_id"), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    granularity = Column(String(8), primary_key=True)
+    # Поступления по дате урегулирования и урегулированная часть из них
+    inflow_amount = Column(BigInteger, nullable=False, default=0)
+    inflow_count = Column(BigInteger, nullable=False, default=0)
+    settled_amount = Column(BigInteger, nullable=False, default=0)
+    settled_count = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        # Временные ряды по всем счетам сразу
+        Index("ix_account_inflow_rollup_granularity_bucket_start", "granularity", "bucket_start"),
+    )
+
+
+class AccountBalanceShard(Base):
+    __tablename__ = "account_balance_shard"
+
+    account_id = Column(Integer, ForeignKey("account.account_id"), primary_key=True)
+    slot = Column(Integer, primary_key=True)
+    granularity = Column(String(8), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    # Еще не свернутые поступления счета в режиме ячеек: сумма месячных строк — прирост баланса
+    amount = Column(BigInteger, nullable=False, default=0)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class BalanceEvent(Base):
+    __tablename__ = "balance_event"
+
+    # Исходящие события об изменениях балансов, записываются в транзакции изменения
+    event_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    account_id = Column(Integer, ForeignKey("account.account_id"), nullable=False)
+    kind = Column(String(16), nullable=False)
+    fund_id = Column(Integer, nullable=False)
+    amount = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
-    accounts = relationship("Account", back_populates="incoming_funds")
\ No newline at end of file
+    __table_args__ = (
+        # Повтор пропущенных событий счета после переподключения подписчика
+        Index("ix_balance_event_account_id_event_id", "account_id", "event_id"),
+        # Удаление устаревших событий
+        Index("ix_balance_event_created_at", "created_at"),
+    )
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, SmallInteger, String, text
 from sqlalchemy.orm import relationship
 
 from app.common.database import Base
@@ -27,4 +27,14 @@ class Permission(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
     slug = Column(String(255), nullable=False)
-    roles = relationship("Role", secondary=RolePermission.__table__, back_populates="permissions")
\ No newline at end of file
+    # Постоянный номер бита права в маске роли; не переиспользуется после удаления права
+    bit = Column(SmallInteger, nullable=False, unique=True, server_default=text("nextval('permission_bit_seq')"))
+    roles = relationship("Role", secondary=RolePermission.__table__, back_populates="permissions")
+
+class PermissionVersion(Base):
+    """
+    Single-row counter bumped by triggers on every change of roles, permissions or their links.
+    """
+    __tablename__ = 'permission_version'
+    id = Column(SmallInteger, primary_key=True, default=1)
+    version = Column(BigInteger, nullable=False, default=1)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
 from sqlalchemy.orm import relationship, validates
 
 from app.common.database import Base
@@ -33,4 +33,40 @@ class User(Base):
     @validates('password')
     def validate_password(self, key, password):
         assert len(password) > 4
-        return password
\ No newline at end of file
+        return password
+
+class UserTokenRevocation(Base):
+    """
+    Revocations of all tokens of a user.
+
+    Every revocation increments `generation`; tokens carry the generation that was current
+    when they were issued (the `rg` claim) and are no longer accepted once it is older.
+    `revoked_before` is the time of the last revocation, used to load only the ones recent
+    enough to matter.
+
+    No foreign key to the user: the row must outlive a deleted user until the tokens expire.
+    """
+
+    __tablename__ = 'user_token_revocation'
+
+    user_id = Column(Integer, primary_key=True)
+    revoked_before = Column(DateTime, nullable=False, index=True)
+    generation = Column(Integer, nullable=False, default=1, server_default='1')
+
+
+class RevokedToken(Base):
+    """
+    JTIs of tokens that are no longer accepted, kept until the tokens expire.
+
+    `rotated` marks refresh tokens consumed by a refresh: their reuse is caught by the
+    primary key when the refresh endpoint consumes them, so they stay out of the
+    in-memory filter that checks every request.
+    """
+
+    __tablename__ = 'revoked_token'
+
+    jti = Column(String(36), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    rotated = Column(Boolean, nullable=False, default=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
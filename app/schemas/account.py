@@ -1,14 +1,17 @@
+from enum import Enum
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
+import datetime as dt
+from app.common.money import Money, NonZeroMoneyInput
 
 class AccountBalanceRequest(BaseModel):
     account_id: int
-    datetime: datetime
+    datetime: Optional[dt.datetime] = None
 
 class IncomingFundCreate(BaseModel):
     account_id: int
-    amount: float
+    amount: NonZeroMoneyInput
     settlement_date: datetime
 
 class AccountCreate(BaseModel):
@@ -16,18 +19,157 @@ class AccountCreate(BaseModel):
 
 class AccountCreateResponse(BaseModel):
     account_id: int
-    balance: float
+    balance: Money
     user_id: int
 
 class AccountBalanceResponse(BaseModel):
     account_id: int
-    balance: float
+    balance: Money
 
 class IncomingFundCreateResponse(BaseModel):
     fund_id: int
     account_id: int
-    amount: float
+    amount: Money
     settlement_date: datetime
 
+class GroupCommitStats(BaseModel):
+    running: bool
+    max_batch: int
+    max_delay_ms: float
+    queued: int
+    batches_total: int
+    funds_total: int
+    average_batch: float
+    errors_total: int
+    splits_total: int
+
 class SettlementResponse(BaseModel):
-    message: str
\ No newline at end of file
+    message: str
+
+class IncomingFundImportError(BaseModel):
+    line: int
+    error: str
+
+class IncomingFundImportResponse(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    elapsed_seconds: float
+    rows_per_second: float
+    errors: List[IncomingFundImportError]
+
+class SettlementWorkerStats(BaseModel):
+    running: bool
+    batch_size: int
+    concurrency: int
+    poll_interval: float
+    settled_total: int
+    batches_total: int
+    errors_total: int
+    uptime_seconds: float
+    settled_per_second: float
+
+class SettlementStatusEnum(str, Enum):
+    settled = 'settled'
+    already_settled = 'already_settled'
+    not_found = 'not_found'
+
+class BulkSettlementRequest(BaseModel):
+    fund_ids: Optional[List[int]] = None
+    fund_id_from: Optional[int] = None
+    fund_id_to: Optional[int] = None
+
+class SettlementOutcome(BaseModel):
+    fund_id: int
+    status: SettlementStatusEnum
+
+class BulkSettlementResponse(BaseModel):
+    settled: int
+    results: List[SettlementOutcome]
+
+class StatementFormatEnum(str, Enum):
+    ndjson = 'ndjson'
+    csv = 'csv'
+
+class AccountResponse(BaseModel):
+    account_id: int
+    user_id: int
+    balance: Money
+
+    class Config:
+        from_attributes = True
+
+class AccountPage(BaseModel):
+    items: List[AccountResponse]
+    next_cursor: Optional[str]
+
+class IncomingFundResponse(BaseModel):
+    fund_id: int
+    account_id: int
+    amount: Money
+    settlement_date: datetime
+    settled_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+class IncomingFundPage(BaseModel):
+    items: List[IncomingFundResponse]
+    next_cursor: Optional[str]
+
+class RollupGranularityEnum(str, Enum):
+    day = 'day'
+    month = 'month'
+
+class InflowSeriesPoint(BaseModel):
+    bucket_start: datetime
+    inflow_amount: Money
+    inflow_count: int
+    settled_amount: Money
+    settled_count: int
+
+class BalanceCacheStats(BaseModel):
+    size: int
+    max_size: int
+    ttl: float
+    redis_enabled: bool
+    hits_local: int
+    hits_redis: int
+    misses: int
+    hit_ratio: float
+    evictions: int
+    invalidations: int
+    redis_errors: int
+
+class BalanceShardsRequest(BaseModel):
+    shards: int = Field(ge=1)
+
+class BalanceShardsResponse(BaseModel):
+    account_id: int
+    shards: int
+    folded: int
+
+class BatchBalanceRequest(BaseModel):
+    account_ids: List[int] = Field(min_length=1)
+    datetime: Optional[dt.datetime] = None
+
+class BatchBalanceItem(BaseModel):
+    account_id: int
+    balance: Optional[Money]
+
+class BatchBalanceResponse(BaseModel):
+    items: List[BatchBalanceItem]
+    missing: List[int]
+
+class BalanceEventKindEnum(str, Enum):
+    deposit = 'deposit'
+    settlement = 'settlement'
+
+class BalanceFeedStats(BaseModel):
+    listening: bool
+    subscribers: int
+    max_subscribers: int
+    queue_size: int
+    published_total: int
+    delivered_total: int
+    dropped_total: int
@@ -23,4 +23,5 @@ class GetUserAfterLoginSchema(BaseModel):
 class ResponseLoginUser(BaseModel):
     status_code: int
     message: str
-    data: GetUserAfterLoginSchema
\ No newline at end of file
+    data: GetUserAfterLoginSchema
+    permissions: List[str] = []
\ No newline at end of file
@@ -1,12 +1,26 @@
-from decimal import ROUND_DOWN, Decimal
+import csv
+import io
+import json
+import random
+import time
+from collections import defaultdict
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import update, delete
-from app.models.account import Account, IncomingFunds
+from sqlalchemy import update, delete, func, values, column, and_, tuple_, cast, any_, bindparam, Integer, BigInteger, DateTime
+from sqlalchemy.dialects.postgresql import insert, ARRAY
+from app.models.account import Account, IncomingFunds, AccountBalanceSnapshot, AccountBalanceShard
 from datetime import datetime
 from fastapi import HTTPException, status
-from typing import Optional
-from app.schemas.account import IncomingFundCreate
+from typing import AsyncIterator, Optional
+from pydantic import ValidationError
+from app.schemas.account import IncomingFundCreate, BulkSettlementRequest, SettlementStatusEnum, StatementFormatEnum, RollupGranularityEnum, BalanceEventKindEnum
+from app.common.database import async_session_maker, VALUES_CHUNK_SIZE
+from app.helpers.fund_import import ImportRow
+from app.helpers.pagination import encode_cursor, decode_cursor
+from app.services.rollup import RollupService
+from app.services.feed import FeedService
+from app.common.cache import balance_cache
+from app.common.money import format_minor_units
 from app.models.user import User
 import logging as log
 
@@ -72,31 +86,70 @@ class AccountService:
             return dt.replace(tzinfo=None)
         return dt
 
+    def pending_shard_amount(account_id, before: Optional[datetime] = None):
+        """
+        Returns a scalar subquery summing the deposits of a sharded account that are not compacted yet.
+
+        Args:
+            account_id: The account ID, or the `Account.account_id` column for a correlated subquery.
+            before (Optional[datetime]): Only deposits of snapshot periods before this one.
+
+        Returns:
+            The subquery; 0 for accounts without pending deposits.
+        """
+        stmt = select(func.coalesce(func.sum(AccountBalanceShard.amount), 0))\
+            .where(
+                AccountBalanceShard.account_id == account_id,
+                # Каждое поступление лежит и в дневной, и в месячной строке — считаем только месячные
+                AccountBalanceShard.granularity == RollupGranularityEnum.month.value,
+            )
+
+        if before is not None:
+            stmt = stmt.where(AccountBalanceShard.bucket_start < before)
+        return stmt.scalar_subquery()
+
+    def balance_expression():
+        """
+        Returns the current balance of `Account` rows as a SQL expression: the running total
+        plus the pending deposits of sharded accounts.
+        """
+        return cast(func.coalesce(Account.balance, 0) + AccountService.pending_shard_amount(Account.account_id), BigInteger)
+
     async def get_account_balance(session: AsyncSession, account_id: int):
         """
         Retrieves the account balance for the specified account ID.
+
+        The balance is the running total kept in `Account.balance` by the write
+        paths plus the not yet compacted deposits of a sharded account, so the read
+        is a primary key lookup regardless of how many incoming funds the account has.
+        Results are cached in `balance_cache`, which the writers invalidate after commit.
+
         Args:
             account_id (int): The ID of the account.
             session (AsyncSession): The async session object for database operations.
-            target_datetime (Optional[datetime], optional): The target datetime to calculate the future balance. Defaults to None.
         Returns:
-            float: The account balance.
+            int: The account balance in minor units.
         Raises:
             HTTPException: If the account is not found or if there is an internal server error.
         """
+        read_at = balance_cache.begin_read()
+        cached = await balance_cache.get(account_id)
+        if cached is not None:
+            return cached
+
         async with session.begin():
             try:
-                # Получение всех средств, которые будут урегулированы до указанного времени
-                stmt = select(IncomingFunds)\
-                    .filter(IncomingFunds.account_id == account_id)
-                result = await session.execute(stmt)
-                incoming_funds = result.scalars().all()
+                # Баланс поддерживается инкрементально, поэтому читаем одну строку по первичному ключу
+                result = await session.execute(
+                    select(Account.account_id, AccountService.balance_expression().label("balance"))
+                    .where(Account.account_id == account_id)
+                )
+                account = result.first()
 
-                future_balance = 0
-                for fund in incoming_funds:
-                    future_balance += fund.amount
+                if not account:
+                    raise HTTPException(status_code=404, detail="Account not found")
 
-                return future_balance
+                balance = account.balance
             except HTTPException as e:
                 raise e
             except Exception as e:
@@ -104,6 +157,328 @@ class AccountService:
                 print(f"Ошибка при получении баланса аккаунта: {e}")
                 raise HTTPException(status_code=500, detail="Internal server error")
 
+        await balance_cache.set(account_id, balance, read_at)
+        return balance
+
+    async def get_account_balances(session: AsyncSession, account_ids: list, target_datetime: Optional[datetime] = None) -> dict:
+        """
+        Retrieves the balances of many accounts in one round trip.
+
+        Current balances are looked up in `balance_cache` with one multi-get first, and the
+        misses are read by a single `WHERE account_id = ANY(:ids)` query. Balances as of
+        `target_datetime` bypass the cache and are computed for all accounts by one query.
+
+        Args:
+            session (AsyncSession): The async session object for database operations.
+            account_ids (list): The IDs of the accounts; duplicates are allowed.
+            target_datetime (Optional[datetime]): The moment to compute the balances for, or None for now.
+
+        Returns:
+            dict: `{account_id: balance}` in minor units for the accounts that exist.
+
+        Raises:
+            HTTPException: If there is an internal server error.
+        """
+        unique_ids = list(dict.fromkeys(account_ids))
+
+        if target_datetime is None:
+            read_at = balance_cache.begin_read()
+            balances = await balance_cache.get_many(unique_ids)
+            balance = AccountService.balance_expression()
+        else:
+            balances = {}
+            balance = AccountService.balance_at_expression(target_datetime)
+
+        remaining = [account_id for account_id in unique_ids if account_id not in balances]
+        if not remaining:
+            return balances
+
+        async with session.begin():
+            try:
+                # Один массив-параметр вместо списка из тысячи параметров IN
+                result = await session.execute(
+                    select(Account.account_id, balance.label("balance"))
+                    .where(Account.account_id == any_(bindparam("account_ids", remaining, type_=ARRAY(Integer))))
+                )
+                loaded = {account_id: balance for account_id, balance in result.all()}
+            except Exception as e:
+                log.error(f"Ошибка при получении балансов счетов: {e}")
+                raise HTTPException(status_code=500, detail="Internal server error")
+
+        if target_datetime is None:
+            await balance_cache.set_many(loaded, read_at)
+
+        balances.update(loaded)
+        return balances
+
+    def snapshot_period(dt: datetime) -> datetime:
+        """
+        Returns the start of the snapshot period (calendar month) that contains the given datetime.
+
+        Args:
+            dt (datetime): A naive datetime.
+
+        Returns:
+            datetime: The first moment of the month containing `dt`.
+        """
+        return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    def balance_at_expression(target_datetime: datetime):
+        """
+        Returns the balance of `Account` rows as of the given moment as a SQL expression.
+
+        The closing balance of the latest snapshot before the target period and the pending
+        slot totals of the earlier periods are added to the funds of the target period up
+        to `target_datetime`. The subqueries are correlated to `Account.account_id`.
+        """
+        target_datetime = AccountService.make_naive(target_datetime)
+        period = AccountService.snapshot_period(target_datetime)
+
+        # Баланс на конец ближайшего предыдущего периода и еще не свернутые поступления до него
+        pending = AccountService.pending_shard_amount(Account.account_id, before=period)
+        closing = select(AccountBalanceSnapshot.balance)\
+            .where(AccountBalanceSnapshot.account_id == Account.account_id, AccountBalanceSnapshot.period_start < period)\
+            .order_by(AccountBalanceSnapshot.period_start.desc())\
+            .limit(1)\
+            .scalar_subquery()
+
+        # Дельта только за текущий период до указанного момента
+        delta = select(func.coalesce(func.sum(IncomingFunds.amount), 0))\
+            .where(
+                IncomingFunds.account_id == Account.account_id,
+                IncomingFunds.settlement_date >= period,
+                IncomingFunds.settlement_date <= target_datetime,
+            )\
+            .scalar_subquery()
+
+        return cast(func.coalesce(closing, 0) + pending + delta, BigInteger)
+
+    async def get_account_balance_at(session: AsyncSession, account_id: int, target_datetime: datetime):
+        """
+        Retrieves the balance of an account as of the given moment, i.e. the sum of
+        incoming funds whose settlement date is at or before `target_datetime`.
+
+        The closing balance of the latest snapshot before the target period is read
+        from `account_balance_snapshot`, and only the funds of the target period are
+        summed through the `(account_id, settlement_date)` covering index. Snapshot
+        periods match the monthly partitions of `incoming_fund`, so the sum reads one partition.
+
+        Args:
+            account_id (int): The ID of the account.
+            session (AsyncSession): The async session object for database operations.
+            target_datetime (datetime): The moment to compute the balance for.
+        Returns:
+            int: The account balance as of `target_datetime` in minor units.
+        Raises:
+            HTTPException: If the account is not found or if there is an internal server error.
+        """
+        async with session.begin():
+            try:
+                result = await session.execute(
+                    select(Account.account_id, AccountService.balance_at_expression(target_datetime).label("balance"))
+                    .where(Account.account_id == account_id)
+                )
+                account = result.first()
+
+                if not account:
+                    raise HTTPException(status_code=404, detail="Account not found")
+
+                return account.balance
+            except HTTPException as e:
+                raise e
+            except Exception as e:
+                log.error(f"Ошибка при получении баланса аккаунта на дату: {e}")
+                raise HTTPException(status_code=500, detail="Internal server error")
+
+    async def apply_balance_deltas(session: AsyncSession, deltas: dict):
+        """
+        Credits several accounts at once.
+
+        `deltas` maps `account_id` to the amount to add. The account rows are locked in
+        `account_id` order first, so concurrent batches touching the same accounts cannot
+        deadlock, and then updated by one `UPDATE ... FROM (VALUES ...)` statement per
+        `VALUES_CHUNK_SIZE` accounts.
+        """
+        account_ids = sorted(deltas)
+
+        for offset in range(0, len(account_ids), VALUES_CHUNK_SIZE):
+            chunk = account_ids[offset:offset + VALUES_CHUNK_SIZE]
+
+            # Блокируем строки счетов в одном порядке, чтобы параллельные пакеты не взаимоблокировались;
+            # FOR NO KEY UPDATE не мешает вставкам средств, проверяющим внешний ключ на счет
+            await session.execute(
+                select(Account.account_id)
+                .where(Account.account_id.in_(chunk))
+                .order_by(Account.account_id)
+                .with_for_update(key_share=True)
+            )
+
+            rows = values(
+                column("account_id", Integer),
+                column("delta", BigInteger),
+                name="delta",
+            ).data([(account_id, deltas[account_id]) for account_id in chunk])
+
+            await session.execute(
+                update(Account)
+                .where(Account.account_id == rows.c.account_id)
+                .values(balance=Account.balance + rows.c.delta)
+            )
+
+    async def apply_snapshot_deltas(session: AsyncSession, deltas: dict):
+        """
+        Applies new funds to the balance snapshots of their accounts.
+
+        `deltas` maps `(account_id, period_start)` to the total amount of the new funds of
+        that period. Missing snapshots are created from the previous closing balance, then
+        every snapshot at or after a changed period is shifted by the sum of the deltas up
+        to it. Must be called after the affected account rows are locked in the same
+        transaction, so writers of one account are serialized.
+        """
+        items = sorted((account_id, period, amount) for (account_id, period), amount in deltas.items())
+
+        # Пакеты применяются последовательно; сдвиги складываются, поэтому результат не зависит от разбиения
+        for offset in range(0, len(items), VALUES_CHUNK_SIZE):
+            rows = values(
+                column("account_id", Integer),
+                column("period_start", DateTime),
+                column("delta", BigInteger),
+                name="delta",
+            ).data(items[offset:offset + VALUES_CHUNK_SIZE])
+
+            previous = select(AccountBalanceSnapshot.balance)\
+                .where(AccountBalanceSnapshot.account_id == rows.c.account_id, AccountBalanceSnapshot.period_start < rows.c.period_start)\
+                .order_by(AccountBalanceSnapshot.period_start.desc())\
+                .limit(1)\
+                .scalar_subquery()
+
+            await session.execute(
+                insert(AccountBalanceSnapshot)
+                .from_select(
+                    ["account_id", "period_start", "balance"],
+                    select(rows.c.account_id, rows.c.period_start, func.coalesce(previous, 0)),
+                )
+                .on_conflict_do_nothing(index_elements=[AccountBalanceSnapshot.account_id, AccountBalanceSnapshot.period_start])
+            )
+
+            shift = select(
+                    AccountBalanceSnapshot.account_id,
+                    AccountBalanceSnapshot.period_start,
+                    func.sum(rows.c.delta).label("delta"),
+                )\
+                .join(rows, and_(
+                    rows.c.account_id == AccountBalanceSnapshot.account_id,
+                    rows.c.period_start <= AccountBalanceSnapshot.period_start,
+                ))\
+                .group_by(AccountBalanceSnapshot.account_id, AccountBalanceSnapshot.period_start)\
+                .subquery()
+
+            await session.execute(
+                update(AccountBalanceSnapshot)
+                .where(
+                    AccountBalanceSnapshot.account_id == shift.c.account_id,
+                    AccountBalanceSnapshot.period_start == shift.c.period_start,
+                )
+                .values(balance=AccountBalanceSnapshot.balance + shift.c.delta)
+            )
+
+    async def add_to_balance_shard(session: AsyncSession, account_id: int, shards: int, settlement_date: datetime, amount: int):
+        """
+        Records a deposit of a sharded account in one of its `shards` slots.
+
+        The account row is not locked: concurrent deposits are spread over the slots and only
+        wait for each other when they pick the same one. The slot rows hold the daily and
+        monthly totals of the deposits until `fold_balance_shards` moves them into the balance,
+        the snapshots and the rollups.
+        """
+        await AccountService.add_to_balance_shards(session, {account_id: shards}, [(account_id, settlement_date, amount)])
+
+    async def add_to_balance_shards(session: AsyncSession, shards: dict, deposits: list):
+        """
+        Records many deposits of sharded accounts, as `add_to_balance_shard` would one by one.
+
+        `shards` maps `account_id` to its number of slots and `deposits` holds
+        `(account_id, settlement_date, amount)` tuples. All deposits of one account go to the
+        same randomly chosen slot and are summed per bucket, so the slot rows are written by
+        one statement per `VALUES_CHUNK_SIZE` rows.
+        """
+        slots = {account_id: random.randrange(shards[account_id]) for account_id in {account_id for account_id, _, _ in deposits}}
+
+        totals = defaultdict(lambda: [0, 0])
+        for account_id, settlement_date, amount in deposits:
+            for granularity in RollupGranularityEnum:
+                total = totals[(account_id, slots[account_id], granularity.value, RollupService.bucket_start(settlement_date, granularity))]
+                total[0] += amount
+                total[1] += 1
+
+        # Строки идут в порядке первичного ключа, как и при свертке, поэтому взаимоблокировок нет
+        rows = [
+            {"account_id": account_id, "slot": slot, "granularity": granularity, "bucket_start": bucket_start, "amount": amount, "count": count}
+            for (account_id, slot, granularity, bucket_start), (amount, count) in sorted(totals.items())
+        ]
+
+        for offset in range(0, len(rows), VALUES_CHUNK_SIZE):
+            stmt = insert(AccountBalanceShard).values(rows[offset:offset + VALUES_CHUNK_SIZE])
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[AccountBalanceShard.account_id, AccountBalanceShard.slot, AccountBalanceShard.granularity, AccountBalanceShard.bucket_start],
+                    set_={
+                        "amount": AccountBalanceShard.amount + stmt.excluded.amount,
+                        "count": AccountBalanceShard.count + stmt.excluded.count,
+                    },
+                )
+            )
+
+    async def fold_balance_shards(session: AsyncSession, account_ids: list) -> int:
+        """
+        Moves the pending slot totals of the given accounts into their balances, snapshots and rollups.
+
+        Must run inside the writer's transaction after the account rows are locked. The slot
+        rows are locked in primary key order and deleted by one statement, so deposits that
+        arrive meanwhile either are folded too or create new slot rows for the next run.
+        The effective balance does not change, so the balance cache stays valid.
+
+        Args:
+            session (AsyncSession): The database session.
+            account_ids (list): The IDs of the locked accounts.
+
+        Returns:
+            int: The number of slot rows folded.
+        """
+        if not account_ids:
+            return 0
+
+        key = [AccountBalanceShard.account_id, AccountBalanceShard.slot, AccountBalanceShard.granularity, AccountBalanceShard.bucket_start]
+        locked = select(*key)\
+            .where(AccountBalanceShard.account_id.in_(account_ids))\
+            .order_by(*key)\
+            .with_for_update()\
+            .cte("locked")
+
+        folded = await session.execute(
+            delete(AccountBalanceShard)
+            .where(tuple_(*key) == tuple_(*locked.c))
+            .returning(*key, AccountBalanceShard.amount, AccountBalanceShard.count)
+        )
+        folded = folded.all()
+
+        balance_deltas = defaultdict(int)
+        snapshot_deltas = defaultdict(int)
+        rollups = RollupService.new_deltas()
+        for account_id, slot, granularity, bucket_start, amount, count in folded:
+            rollups[(account_id, bucket_start, granularity)][0] += amount
+            rollups[(account_id, bucket_start, granularity)][1] += count
+            if granularity == RollupGranularityEnum.month.value:
+                balance_deltas[account_id] += amount
+                snapshot_deltas[(account_id, bucket_start)] += amount
+
+        if folded:
+            await AccountService.apply_balance_deltas(session, balance_deltas)
+            await AccountService.apply_snapshot_deltas(session, snapshot_deltas)
+            await RollupService.apply_deltas(session, rollups)
+
+        return len(folded)
+
     async def __get_fund_by_id(session: AsyncSession, fund_id: int):
         async with session.begin_nested():
             try:
@@ -126,45 +501,154 @@ class AccountService:
     async def process_settlement(session: AsyncSession, fund_id: int):
         """
         Process settlement for a given fund ID.
+
+        The amount was credited to the balance when the fund was added, so settlement only
+        flags the fund and counts it in the settled rollups; the balance does not change.
         Parameters:
         - fund_id (int): The ID of the fund to process settlement for.
         - session (AsyncSession): The asynchronous session object for database operations.
         Raises:
-        - HTTPException: If the fund with the given ID is not found.
+        - HTTPException: If the fund with the given ID is not found or is already settled.
         Returns:
         - None
         """
         async with session.begin():
             fund = await AccountService.__get_fund_by_id(session, fund_id)
 
-            # Транзакция: добавляем средства к счету и удаляем запись о входящих средствах
-            async with session.begin_nested():
-                await session.execute(
-                    update(Account)
-                    .where(Account.account_id == fund.account_id)
-                    .values(balance=Account.balance + fund.amount)
+            # Помечаем средство урегулированным; условие на settled_at исключает повторное зачисление
+            claimed = await session.execute(
+                update(IncomingFunds)
+                .where(
+                    IncomingFunds.fund_id == fund_id,
+                    # Дата урегулирования сводит обновление к одной секции
+                    IncomingFunds.settlement_date == fund.settlement_date,
+                    IncomingFunds.settled_at.is_(None),
                 )
+                .values(settled_at=datetime.utcnow())
+                .returning(IncomingFunds.fund_id)
+            )
+            if not claimed.first():
+                raise HTTPException(status_code=409, detail="Fund already settled")
+
+            # Сумма зачислена на баланс при поступлении, здесь обновляются только урегулированные агрегаты
+            rollups = RollupService.new_deltas()
+            RollupService.collect(rollups, fund.account_id, fund.settlement_date, fund.amount)
+            await RollupService.apply_deltas(session, rollups, settled=True)
+
+            await FeedService.record(session, [
+                {"account_id": fund.account_id, "kind": BalanceEventKindEnum.settlement.value, "fund_id": fund.fund_id, "amount": fund.amount}
+            ])
+
             await session.commit()
 
-    def calculate_new_balance(amount, funds):
-        new_balance = 0
-        if amount < 0:
-            new_balance -= round(abs(Decimal(amount)))
-        elif amount > 0:
-            new_balance += Decimal(amount)
+    def resolve_settlement_fund_ids(request: BulkSettlementRequest, max_funds: int) -> list:
+        """
+        Turns a bulk settlement request into a de-duplicated, ordered list of fund IDs.
+
+        Args:
+            request (BulkSettlementRequest): Either an explicit list of fund IDs or an inclusive ID range.
+            max_funds (int): The maximum number of funds settled per request.
+
+        Returns:
+            list: The fund IDs to settle.
+
+        Raises:
+            HTTPException: If the request is ambiguous, empty or too large.
+        """
+        has_range = request.fund_id_from is not None or request.fund_id_to is not None
 
-        for fund in funds:
-            if fund.amount < 0:
-                new_balance -= round(abs(Decimal(fund.amount)))
-            elif fund.amount > 0:
-                new_balance += Decimal(fund.amount)
+        if request.fund_ids is not None and has_range:
+            raise HTTPException(status_code=400, detail="Pass either fund_ids or a fund_id range, not both")
 
-        return new_balance
+        if has_range:
+            if request.fund_id_from is None or request.fund_id_to is None or request.fund_id_from > request.fund_id_to:
+                raise HTTPException(status_code=400, detail="Invalid fund_id range")
+            if request.fund_id_to - request.fund_id_from + 1 > max_funds:
+                raise HTTPException(status_code=400, detail=f"At most {max_funds} funds can be settled at once")
+            return list(range(request.fund_id_from, request.fund_id_to + 1))
+
+        if not request.fund_ids:
+            raise HTTPException(status_code=400, detail="No funds to settle")
+
+        fund_ids = sorted(set(request.fund_ids))
+        if len(fund_ids) > max_funds:
+            raise HTTPException(status_code=400, detail=f"At most {max_funds} funds can be settled at once")
+        return fund_ids
+
+    async def process_settlement_bulk(session: AsyncSession, fund_ids: list):
+        """
+        Settles many funds in one transaction.
+
+        All unsettled funds among `fund_ids` are flagged as settled by a single conditional
+        UPDATE, and the settled rollups are updated once per bucket. Balances do not change,
+        the funds were credited when they were added. The remaining IDs are classified as already settled or not found with
+        one more query.
+
+        Args:
+            session (AsyncSession): The asynchronous session object for database operations.
+            fund_ids (list): The IDs of the funds to settle.
+
+        Returns:
+            list: One `{"fund_id", "status"}` outcome per requested fund, ordered by fund ID.
+
+        Raises:
+            HTTPException: If there is an internal server error.
+        """
+        try:
+            async with session.begin():
+                # Помечаем урегулированными все еще не урегулированные средства одним запросом
+                claimed = await session.execute(
+                    update(IncomingFunds)
+                    .where(IncomingFunds.fund_id.in_(fund_ids), IncomingFunds.settled_at.is_(None))
+                    .values(settled_at=datetime.utcnow())
+                    .returning(IncomingFunds.fund_id, IncomingFunds.account_id, IncomingFunds.amount, IncomingFunds.settlement_date)
+                    .execution_options(synchronize_session=False)
+                )
+                claimed = claimed.all()
+
+                outcomes = {fund_id: SettlementStatusEnum.not_found for fund_id in fund_ids}
+                rollups = RollupService.new_deltas()
+                for fund_id, account_id, amount, settlement_date in claimed:
+                    outcomes[fund_id] = SettlementStatusEnum.settled
+                    RollupService.collect(rollups, account_id, settlement_date, amount)
+
+                # Оставшиеся идентификаторы либо уже урегулированы, либо не существуют
+                remaining = [fund_id for fund_id, outcome in outcomes.items() if outcome == SettlementStatusEnum.not_found]
+                if remaining:
+                    existing = await session.execute(
+                        select(IncomingFunds.fund_id).where(IncomingFunds.fund_id.in_(remaining))
+                    )
+                    for fund_id in existing.scalars().all():
+                        outcomes[fund_id] = SettlementStatusEnum.already_settled
+
+                if claimed:
+                    await RollupService.apply_deltas(session, rollups, settled=True)
+                    await FeedService.record(session, [
+                        {"account_id": account_id, "kind": BalanceEventKindEnum.settlement.value, "fund_id": fund_id, "amount": amount}
+                        for fund_id, account_id, amount, settlement_date in claimed
+                    ])
+
+            return [{"fund_id": fund_id, "status": outcomes[fund_id]} for fund_id in fund_ids]
+
+        except HTTPException:
+            raise
+
+        except Exception as e:
+            log.error(f"Ошибка при пакетном урегулировании средств: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error")
 
     async def add_incoming_fund(session: AsyncSession, fund_data: IncomingFundCreate):
         """
         Adds a new record of incoming funds to the database and updates the account balance.
 
+        The balance is changed by a single `UPDATE ... SET balance = balance + :amount RETURNING`
+        statement, which both checks that the account exists and holds its row lock until
+        commit, so concurrent deposits to one account are applied one after another and
+        none of them is lost.
+
+        Deposits to a sharded account (`balance_shards > 1`) skip that row lock and go to one
+        of its slots instead, see `add_to_balance_shard`.
+
         Args:
             fund_data (IncomingFundCreate): The data for the incoming funds.
             session (AsyncSession): The database session.
@@ -181,55 +665,402 @@ class AccountService:
                 try:
                     # Приведение даты к наивному datetime
                     target_datetime = AccountService.make_naive(fund_data.settlement_date)
+                    amount = fund_data.amount
 
-                    # Получение аккаунта
+                    # Атомарное обновление баланса на дельту; строка счета блокируется до конца транзакции
                     account = await session.execute(
-                        select(Account).where(Account.account_id == fund_data.account_id)
+                        update(Account)
+                        .where(Account.account_id == fund_data.account_id, Account.balance_shards <= 1)
+                        .values(balance=Account.balance + amount)
+                        .returning(Account.account_id, Account.balance)
                     )
-                    account = account.scalars().first()
+                    account = account.first()
 
-                    if not account:
-                        raise HTTPException(status_code=404, detail="Account not found")
-                    
-                    funds = await session.execute(select(IncomingFunds).filter_by(account_id=fund_data.account_id))
-                    funds = funds.scalars().all()
+                    if account:
+                        # Обновление снимков баланса за период средства и последующие периоды
+                        await AccountService.apply_snapshot_deltas(
+                            session, {(fund_data.account_id, AccountService.snapshot_period(target_datetime)): amount}
+                        )
 
-                    new_balance = AccountService.calculate_new_balance(fund_data.amount, funds)
+                        # Обновление дневных и месячных агрегатов поступлений
+                        rollups = RollupService.new_deltas()
+                        RollupService.collect(rollups, fund_data.account_id, target_datetime, amount)
+                        await RollupService.apply_deltas(session, rollups)
+                    else:
+                        shards = await session.execute(
+                            select(Account.balance_shards).where(Account.account_id == fund_data.account_id)
+                        )
+                        shards = shards.scalar()
 
-                    # Обновление баланса аккаунта
-                    await session.execute(
-                        update(Account)
-                        .where(Account.account_id == fund_data.account_id)
-                        .values(balance=Decimal(new_balance))
-                    )
+                        if shards is None:
+                            raise HTTPException(status_code=404, detail="Account not found")
+
+                        # Горячий счет в режиме ячеек: строка счета не блокируется, сумма сворачивается позже
+                        await AccountService.add_to_balance_shard(session, fund_data.account_id, shards, target_datetime, amount)
 
                     # Создание новой записи о входящих средствах
                     new_fund = IncomingFunds(
                         account_id=fund_data.account_id,
-                        amount=fund_data.amount,
+                        amount=amount,
                         settlement_date=target_datetime
                     )
+                    session.add(new_fund)
 
-                    # Вложенная транзакция для добавления новой записи
-                    async with session.begin_nested():
-                        session.add(new_fund)
-
-                    # Фиксация изменений
+                    # Отправляем INSERT, чтобы получить fund_id
                     await session.flush()
-                    await session.refresh(new_fund)
 
-                    return new_fund
+                    # Событие для ленты балансов уходит подписчикам только после фиксации
+                    await FeedService.record(session, [
+                        {"account_id": fund_data.account_id, "kind": BalanceEventKindEnum.deposit.value, "fund_id": new_fund.fund_id, "amount": amount}
+                    ])
+
+                except HTTPException:
+                    raise
 
                 except Exception as e:
                     # Логирование ошибки
                     print(f"Ошибка при добавлении входящих средств: {e}")
                     raise HTTPException(status_code=500, detail=str(e))
 
+            # Транзакция зафиксирована — сбрасываем закешированный баланс
+            await balance_cache.invalidate(fund_data.account_id)
+            return new_fund
+
+        except HTTPException:
+            raise
+
         except Exception as e:
             # Логирование общей ошибки
             print(f"Ошибка в методе: {e}")
             raise HTTPException(status_code=500, detail="Internal server error")
 
+    async def add_incoming_funds_batch(session: AsyncSession, funds: list) -> list:
+        """
+        Adds many incoming funds in one transaction, as `add_incoming_fund` would one by one.
+
+        The accounts are read with one query, the balances, snapshots and rollups of normal
+        accounts are updated once per account from the summed amounts, deposits to sharded
+        accounts go to their slots with one statement, and all funds are written by one multi-row INSERT with
+        fund IDs taken from the sequence beforehand, so every result is matched to its input.
+
+        Args:
+            session (AsyncSession): The database session.
+            funds (list): The `IncomingFundCreate` items.
+
+        Returns:
+            list: For every item, in order, the created fund as a dict, or None if its account does not exist.
+        """
+        async with session.begin():
+            account_ids = list(dict.fromkeys(fund.account_id for fund in funds))
+            accounts = await session.execute(
+                select(Account.account_id, Account.balance_shards)
+                .where(Account.account_id == any_(bindparam("account_ids", account_ids, type_=ARRAY(Integer))))
+            )
+            shards = dict(accounts.all())
+
+            accepted = [fund for fund in funds if fund.account_id in shards]
+            if not accepted:
+                return [None] * len(funds)
+
+            fund_ids = await session.execute(
+                select(func.nextval("incoming_fund_fund_id_seq")).select_from(func.generate_series(1, len(accepted)))
+            )
+            fund_ids = fund_ids.scalars().all()
+
+            rows = []
+            shard_deposits = []
+            balance_deltas = defaultdict(int)
+            snapshot_deltas = defaultdict(int)
+            rollups = RollupService.new_deltas()
+            for fund_id, fund in zip(fund_ids, accepted):
+                settlement_date = AccountService.make_naive(fund.settlement_date)
+                rows.append({"fund_id": fund_id, "account_id": fund.account_id, "amount": fund.amount, "settlement_date": settlement_date})
+
+                if shards[fund.account_id] > 1:
+                    shard_deposits.append((fund.account_id, settlement_date, fund.amount))
+                else:
+                    balance_deltas[fund.account_id] += fund.amount
+                    snapshot_deltas[(fund.account_id, AccountService.snapshot_period(settlement_date))] += fund.amount
+                    RollupService.collect(rollups, fund.account_id, settlement_date, fund.amount)
+
+            # Сначала блокировки счетов (в порядке account_id), затем снимки и агрегаты
+            if balance_deltas:
+                await AccountService.apply_balance_deltas(session, balance_deltas)
+                await AccountService.apply_snapshot_deltas(session, snapshot_deltas)
+                await RollupService.apply_deltas(session, rollups)
+            if shard_deposits:
+                await AccountService.add_to_balance_shards(session, shards, shard_deposits)
+
+            for offset in range(0, len(rows), VALUES_CHUNK_SIZE):
+                await session.execute(insert(IncomingFunds).values(rows[offset:offset + VALUES_CHUNK_SIZE]))
+
+            await FeedService.record(session, [
+                {"account_id": row["account_id"], "kind": BalanceEventKindEnum.deposit.value, "fund_id": row["fund_id"], "amount": row["amount"]}
+                for row in rows
+            ])
+
+        await balance_cache.invalidate(*{row["account_id"] for row in rows})
+
+        created = iter(rows)
+        return [next(created) if fund.account_id in shards else None for fund in funds]
+
+    async def __copy_fund_batch(session: AsyncSession, batch: list, report: dict, balance_deltas: dict, snapshot_deltas: dict, rollup_deltas: dict):
+        """
+        Writes a batch of validated incoming funds with a single COPY and accumulates their
+        balance, snapshot and rollup deltas. Rows referencing unknown accounts are reported as errors.
+        """
+        # Проверяем существование всех счетов пакета одним запросом; он же открывает транзакцию до COPY
+        existing = await session.execute(
+            select(Account.account_id).where(Account.account_id.in_({fund.account_id for _, fund in batch}))
+        )
+        existing = set(existing.scalars().all())
+
+        records = []
+        for line_number, fund in batch:
+            if fund.account_id not in existing:
+                report["errors"].append({"line": line_number, "error": "Account not found"})
+                continue
+
+            amount = fund.amount
+            settlement_date = AccountService.make_naive(fund.settlement_date)
+
+            records.append((fund.account_id, amount, settlement_date))
+            balance_deltas[fund.account_id] += amount
+            snapshot_deltas[(fund.account_id, AccountService.snapshot_period(settlement_date))] += amount
+            RollupService.collect(rollup_deltas, fund.account_id, settlement_date, amount)
+
+        if not records:
+            return
+
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            IncomingFunds.__tablename__,
+            records=records,
+            columns=["account_id", "amount", "settlement_date"],
+        )
+        report["inserted"] += len(records)
+
+    async def import_incoming_funds(session: AsyncSession, rows: AsyncIterator[ImportRow], batch_size: int):
+        """
+        Imports a stream of incoming funds in one transaction.
+
+        Every row is validated with `IncomingFundCreate`; valid rows are written in batches
+        through asyncpg `copy_records_to_table`, and the balances, snapshots and rollups are
+        updated once at the end from deltas aggregated per account, so the account rows are locked
+        only for the final statements.
+
+        Args:
+            session (AsyncSession): The database session.
+            rows (AsyncIterator[ImportRow]): Parsed rows, see `app.helpers.fund_import`.
+            batch_size (int): The number of rows written per COPY.
+
+        Returns:
+            dict: The import report with counters, per-row errors and the throughput.
+
+        Raises:
+            HTTPException: If the import fails; nothing is written in that case.
+        """
+        started = time.perf_counter()
+        report = {"received": 0, "inserted": 0, "failed": 0, "errors": []}
+        balance_deltas = defaultdict(int)
+        snapshot_deltas = defaultdict(int)
+        rollup_deltas = RollupService.new_deltas()
+        batch = []
+
+        try:
+            async with session.begin():
+                async for line_number, row, error in rows:
+                    report["received"] += 1
+
+                    if error is None:
+                        try:
+                            batch.append((line_number, IncomingFundCreate(**row)))
+                        except ValidationError as e:
+                            error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+                    if error is not None:
+                        report["errors"].append({"line": line_number, "error": error})
+                        continue
+
+                    if len(batch) >= batch_size:
+                        await AccountService.__copy_fund_batch(session, batch, report, balance_deltas, snapshot_deltas, rollup_deltas)
+                        batch = []
+
+                if batch:
+                    await AccountService.__copy_fund_batch(session, batch, report, balance_deltas, snapshot_deltas, rollup_deltas)
+
+                # Одно обновление балансов, снимков и агрегатов на весь импорт
+                if balance_deltas:
+                    await AccountService.apply_balance_deltas(session, balance_deltas)
+                    await AccountService.apply_snapshot_deltas(session, snapshot_deltas)
+                    await RollupService.apply_deltas(session, rollup_deltas)
+
+        except Exception as e:
+            log.error(f"Ошибка при импорте входящих средств: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+        await balance_cache.invalidate(*balance_deltas)
+
+        elapsed = time.perf_counter() - started
+        report["failed"] = len(report["errors"])
+        report["elapsed_seconds"] = round(elapsed, 3)
+        report["rows_per_second"] = round(report["inserted"] / elapsed, 1) if elapsed > 0 else 0.0
+        return report
+
+    async def list_user_accounts(session: AsyncSession, user_id: int, limit: int, cursor: Optional[str] = None):
+        """
+        Lists the accounts of a user ordered by `account_id`, one page at a time.
+
+        Pages are selected by key (`account_id > :last`) through the `(user_id, account_id)`
+        index, so any page costs the same as the first one.
+
+        Args:
+            session (AsyncSession): The database session.
+            user_id (int): The ID of the user.
+            limit (int): The maximum number of accounts per page.
+            cursor (Optional[str]): The `next_cursor` of the previous page.
+
+        Returns:
+            dict: The page items and the cursor of the next page, or None on the last page.
+
+        Raises:
+            HTTPException: If the cursor is invalid.
+        """
+        stmt = select(Account.account_id, Account.user_id, AccountService.balance_expression().label("balance"))\
+            .where(Account.user_id == user_id)\
+            .order_by(Account.account_id)\
+            .limit(limit + 1)
+
+        if cursor is not None:
+            last_account_id, = decode_cursor(cursor, int)
+            stmt = stmt.where(Account.account_id > last_account_id)
+
+        async with session.begin():
+            result = await session.execute(stmt)
+            accounts = result.all()
+
+        next_cursor = None
+        if len(accounts) > limit:
+            accounts = accounts[:limit]
+            next_cursor = encode_cursor(accounts[-1].account_id)
+
+        return {"items": accounts, "next_cursor": next_cursor}
+
+    async def list_incoming_funds(session: AsyncSession, account_id: int, limit: int, cursor: Optional[str] = None):
+        """
+        Lists the incoming funds of an account ordered by `(settlement_date, fund_id)`, one page at a time.
+
+        Pages are selected by a row comparison on the sort key, which is served by the
+        `(account_id, settlement_date, fund_id)` index, so any page costs the same as the first one.
+
+        Args:
+            session (AsyncSession): The database session.
+            account_id (int): The ID of the account.
+            limit (int): The maximum number of funds per page.
+            cursor (Optional[str]): The `next_cursor` of the previous page.
+
+        Returns:
+            dict: The page items and the cursor of the next page, or None on the last page.
+
+        Raises:
+            HTTPException: If the cursor is invalid.
+        """
+        stmt = select(IncomingFunds)\
+            .where(IncomingFunds.account_id == account_id)\
+            .order_by(IncomingFunds.settlement_date, IncomingFunds.fund_id)\
+            .limit(limit + 1)
+
+        if cursor is not None:
+            last_settlement_date, last_fund_id = decode_cursor(cursor, datetime, int)
+            stmt = stmt.where(
+                # Сравнение кортежей не отсекает секции, отдельное условие на дату — отсекает
+                IncomingFunds.settlement_date >= last_settlement_date,
+                tuple_(IncomingFunds.settlement_date, IncomingFunds.fund_id)
+                > tuple_(last_settlement_date, last_fund_id),
+            )
+
+        async with session.begin():
+            result = await session.execute(stmt)
+            funds = result.scalars().all()
+
+        next_cursor = None
+        if len(funds) > limit:
+            funds = funds[:limit]
+            next_cursor = encode_cursor(funds[-1].settlement_date, funds[-1].fund_id)
+
+        return {"items": funds, "next_cursor": next_cursor}
+
+    async def stream_statement(account_id: int, date_from: Optional[datetime], date_to: Optional[datetime], file_format: StatementFormatEnum, chunk_size: int):
+        """
+        Streams the incoming funds of an account as NDJSON or CSV.
+
+        Rows are read through a server-side cursor `chunk_size` at a time and each chunk is
+        serialized and yielded before the next one is fetched, so memory use does not depend
+        on the length of the history. The generator uses its own session, because it keeps
+        running after the request handler has returned.
+
+        Args:
+            account_id (int): The ID of the account.
+            date_from (Optional[datetime]): Only funds settling at or after this moment.
+            date_to (Optional[datetime]): Only funds settling at or before this moment.
+            file_format (StatementFormatEnum): The output format.
+            chunk_size (int): The number of rows fetched and yielded at a time.
+
+        Yields:
+            str: Serialized chunks of the statement.
+        """
+        columns = ["fund_id", "account_id", "amount", "settlement_date", "settled_at"]
+
+        stmt = select(
+                IncomingFunds.fund_id,
+                IncomingFunds.account_id,
+                IncomingFunds.amount,
+                IncomingFunds.settlement_date,
+                IncomingFunds.settled_at,
+            )\
+            .where(IncomingFunds.account_id == account_id)\
+            .order_by(IncomingFunds.settlement_date, IncomingFunds.fund_id)\
+            .execution_options(yield_per=chunk_size)
+
+        if date_from is not None:
+            stmt = stmt.where(IncomingFunds.settlement_date >= AccountService.make_naive(date_from))
+        if date_to is not None:
+            stmt = stmt.where(IncomingFunds.settlement_date <= AccountService.make_naive(date_to))
+
+        if file_format == StatementFormatEnum.csv:
+            yield ",".join(columns) + "\n"
+
+        async with async_session_maker() as session:
+            async with session.begin():
+                result = await session.stream(stmt)
+
+                async for rows in result.partitions():
+                    buffer = io.StringIO()
+
+                    if file_format == StatementFormatEnum.csv:
+                        writer = csv.writer(buffer, lineterminator="\n")
+                        for row in rows:
+                            writer.writerow([
+                                row.fund_id,
+                                row.account_id,
+                                format_minor_units(row.amount),
+                                row.settlement_date.isoformat(),
+                                row.settled_at.isoformat() if row.settled_at else "",
+                            ])
+                    else:
+                        for row in rows:
+                            buffer.write(json.dumps({
+                                "fund_id": row.fund_id,
+                                "account_id": row.account_id,
+                                "amount": format_minor_units(row.amount),
+                                "settlement_date": row.settlement_date.isoformat(),
+                                "settled_at": row.settled_at.isoformat() if row.settled_at else None,
+                            }))
+                            buffer.write("\n")
+
+                    yield buffer.getvalue()
+
     async def get_user_by_id(session: AsyncSession, user_id: int):
         """
         Retrieves a user by their ID.
@@ -1,12 +1,17 @@
-from fastapi import HTTPException, status, Depends, Response
+from fastapi import HTTPException, status, Depends, Request, Response
 from datetime import timedelta
-from app.common.oauth2 import AuthJWT
-from app.common.database import AsyncSession
-from app.models.user import User as UserModel
+from app.common.oauth2 import AuthJWT, auth_error
+from app.common.database import AsyncSession, async_session_maker
+from app.models.user import User as UserModel, UserTokenRevocation
 from app.models.role import Role as RoleModel
-from passlib.context import CryptContext
-from sqlalchemy import select
+from app.services.permission import permission_resolver
+from app.services.token_denylist import token_denylist, is_revoked_by
+from app.services.token_revocation import token_revocation
+from app.common.hashing import hashing_executor, PasswordHashingBusy, hash_password, verify_password, password_needs_rehash
+from sqlalchemy import select, update
 from sqlalchemy.orm import joinedload
+import asyncio
+from typing import Awaitable, Callable, Optional
 import logging as log
 from config import Config
 
@@ -15,74 +20,64 @@ REFRESH_TOKEN_EXPIRES_IN  = Config.REFRESH_TOKEN_EXPIRES_IN
 
 class AuthService:
 
-    async def __get_user_by_email(session: AsyncSession, email: str) -> UserModel:
+    # Фоновые пересчеты хешей; ссылки держим, чтобы задачи не собрал сборщик мусора
+    __rehash_tasks = set()
+
+    async def __get_user_by_email(session: AsyncSession, email: str) -> tuple:
         """
-        Retrieves a user from the database based on their email address.
+        Retrieves a user together with the role, its permissions and the user's revocation generation in one query.
 
         Args:
             session (AsyncSession): The database session.
             email (str): The email address of the user.
 
         Returns:
-            UserModel: The user object retrieved from the database.
-
-        Raises:
-            Exception: If an error occurs while retrieving the user.
+            tuple: The user with `role.permissions` loaded (or None if there is no such user) and the generation (or None).
         """
-        async with session.begin_nested():
-            try:
-                user_stmt = select(UserModel).where(UserModel.email == email.lower())
-                user = await session.execute(user_stmt)
-                user = user.scalars().first()
-
-                return user
-
-            except HTTPException as e:
-                log.error(f"HTTP Exception occurred: {e.detail}")
-                raise
+        user = await session.execute(
+            select(UserModel, UserTokenRevocation.generation)
+            .outerjoin(UserTokenRevocation, UserTokenRevocation.user_id == UserModel.id)
+            .options(joinedload(UserModel.role).joinedload(RoleModel.permissions))
+            .where(UserModel.email == email.lower())
+        )
+        return user.unique().first() or (None, None)
 
-            except Exception as e:
-                log.error(f"An unexpected error occurred: {str(e)}")
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal server error")
-
-    async def __get_role_by_slug(session: AsyncSession, slug: str) -> RoleModel:
+    async def __get_user_for_refresh(session: AsyncSession, user_id: int) -> tuple:
         """
-        Retrieves a role from the database based on its slug.
-        Args:
-            session (AsyncSession): The database session.
-            slug (str): The slug of the role.
+        Retrieves a user with the role and its permissions, and the user's revocation generation.
+
         Returns:
-            RoleModel: The role object.
-        Raises:
-            HTTPException: If the role is not found in the database.
-            Exception: If an error occurs while retrieving the role.
+            tuple: The user (or None if there is no such user) and the generation (or None).
         """
-        async with session.begin_nested():
-            try:
-                role = await session.execute(select(RoleModel).where(RoleModel.slug == slug))
-                role = role.scalars().first()
+        result = await session.execute(
+            select(UserModel, UserTokenRevocation.generation)
+            .outerjoin(UserTokenRevocation, UserTokenRevocation.user_id == UserModel.id)
+            .options(joinedload(UserModel.role).joinedload(RoleModel.permissions))
+            .where(UserModel.id == user_id)
+        )
+        return result.unique().first() or (None, None)
 
-                if not role:
-                    log.error('Role not found')
-                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Role not found')
+    async def __email_exists(session: AsyncSession, email: str) -> bool:
+        """
+        Checks whether a user with the given email address exists.
+        """
+        user = await session.execute(select(UserModel.id).where(UserModel.email == email.lower()))
+        return user.first() is not None
 
-                return role
-            except Exception as e:
-                log.error(e)
-                raise Exception(e)
-    
     async def __hash_password(password: str) -> str:
         """
-        Hashes the given password using bcrypt algorithm.
+        Hashes the given password using bcrypt algorithm, in the hashing pool off the event loop.
 
         Parameters:
             password (str): The password to be hashed.
 
         Returns:
             str: The hashed password.
+
+        Raises:
+            PasswordHashingBusy: If the hashing pool is saturated.
         """
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        return pwd_context.hash(password)
+        return await hashing_executor.run(hash_password, password)
     
     async def __verify_password(password: str, hashed_password: str) -> bool:
         """
@@ -94,9 +89,66 @@ class AuthService:
 
         Returns:
         - bool: True if the password matches the hashed password, False otherwise.
+
+        Raises:
+        - PasswordHashingBusy: If the hashing pool is saturated.
+        """
+        return await hashing_executor.run(verify_password, password, hashed_password)
+
+    async def __rehash_password(user_id: int, password: str, hashed_password: str):
+        """
+        Re-hashes a password with the current work factor and stores it, unless the hash was changed meanwhile.
+
+        Failures are only logged: the old hash stays valid and is replaced on a later login.
+        """
+        try:
+            new_hashed_password = await hashing_executor.run(hash_password, password)
+            async with async_session_maker() as session:
+                async with session.begin():
+                    await session.execute(
+                        update(UserModel)
+                        .where(UserModel.id == user_id, UserModel.password == hashed_password)
+                        .values(password=new_hashed_password)
+                    )
+        except Exception as e:
+            log.error(f"Ошибка при пересчете хеша пароля пользователя {user_id}: {e}")
+
+    def __schedule_rehash(user_id: int, password: str, hashed_password: str):
+        task = asyncio.create_task(AuthService.__rehash_password(user_id, password, hashed_password))
+        AuthService.__rehash_tasks.add(task)
+        task.add_done_callback(AuthService.__rehash_tasks.discard)
+
+    async def __issue_tokens(user: UserModel, permission_version: int, generation: Optional[int], response: Response, Authorize: AuthJWT) -> list:
         """
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        return pwd_context.verify(password, hashed_password)
+        Creates the access and refresh tokens of a user and stores them in cookies.
+
+        Parameters:
+        - user (UserModel): The user with `role.permissions` loaded.
+        - permission_version (int): The permission catalog version read before the user was loaded.
+        - generation (Optional[int]): The user's revocation generation read with the user, None if never revoked.
+        - response (Response): The HTTP response object.
+        - Authorize (AuthJWT): The authorization object.
+
+        Returns:
+        - list: The permission slugs of the user's role.
+        """
+        # Create access token
+        # Роль, маска ее прав и версия каталога прав нужны проверкам без запроса к базе
+        permissions = [permission.slug for permission in user.role.permissions]
+        permission_mask = sum(1 << permission.bit for permission in user.role.permissions)
+        # Поколение отзыва, прочитанное вместе с пользователем: токены отзываются, когда оно устареет
+        claims = {"role_id": user.role_id, "pm": permission_mask, "pv": permission_version, "rg": generation or 0}
+        access_token = await Authorize.create_access_token(subject=str(user.id), expires_time=timedelta(minutes=int(Config.ACCESS_TOKEN_EXPIRES_IN)), user_claims=claims)
+
+        # Create refresh token
+        refresh_token = await Authorize.create_refresh_token(subject=str(user.id), expires_time=timedelta(minutes=int(Config.REFRESH_TOKEN_EXPIRES_IN)), user_claims={"rg": generation or 0})
+
+        # Store refresh and access tokens in cookie
+        response.set_cookie('access_token', access_token, int(ACCESS_TOKEN_EXPIRES_IN) * 60, int(ACCESS_TOKEN_EXPIRES_IN) * 60, '/', None, False, True, 'lax')
+        response.set_cookie('refresh_token', refresh_token, int(REFRESH_TOKEN_EXPIRES_IN) * 60, int(REFRESH_TOKEN_EXPIRES_IN) * 60, '/', None, False, True, 'lax')
+        response.set_cookie('logged_in', 'True', int(ACCESS_TOKEN_EXPIRES_IN) * 60, int(ACCESS_TOKEN_EXPIRES_IN) * 60, '/', None, False, False, 'lax')
+
+        return permissions
 
     @staticmethod
     async def register_user(session: AsyncSession, payload):
@@ -111,19 +163,21 @@ class AuthService:
             HTTPException: If the email already exists or if there is an internal server error.
         """
         async with session.begin():
-            # Get user role
-            role = await AuthService.__get_role_by_slug(session, "user_role")
+            # Get user role; its ID comes from the permission cache, without a query
+            role_id = await permission_resolver.get_role_id("user_role")
+            if role_id is None:
+                log.error('Role not found')
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Role not found')
 
             # Check if email already exists
-            user = await AuthService.__get_user_by_email(session, payload.email.lower())
-            if user:
+            if await AuthService.__email_exists(session, payload.email):
                 log.error('Email already exists')
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Email already exists')
 
             # hashing password
             payload.password = await AuthService.__hash_password(payload.password)
             del payload.passwordConfirm
-            payload.role_id = role.id
+            payload.role_id = role_id
             payload.email = payload.email.lower()
 
             # remove creator_id if it is 0
@@ -148,7 +202,7 @@ class AuthService:
                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
         
     @staticmethod
-    async def login(session: AsyncSession, payload, response: Response, Authorize: AuthJWT = Depends()):
+    async def login(session: AsyncSession, payload, response: Response, Authorize: AuthJWT = Depends(), on_failure: Optional[Callable[[], Awaitable]] = None):
         """
         Login function for authenticating a user.
         Parameters:
@@ -156,43 +210,135 @@ class AuthService:
         - payload: The login payload containing email and password.
         - response (Response): The HTTP response object.
         - Authorize (AuthJWT): The authorization object.
+        - on_failure (Optional[Callable]): Awaited when the email is unknown or the password is wrong, e.g. to count the failure.
         Returns:
         - dict: A dictionary containing the status code, message, and user data.
         Raises:
         - HTTPException: If there is an error during the login process.
         """
         try:
-            user = await AuthService.__get_user_by_email(session, payload.email.lower())
+            # Версия каталога прав берется до чтения прав пользователя: права в токене не старше нее
+            await permission_resolver.ensure_fresh()
+            permission_version = permission_resolver.version
+
+            # Транзакция закрывается до проверки пароля, чтобы не держать соединение на время bcrypt
+            async with session.begin():
+                user, generation = await AuthService.__get_user_by_email(session, payload.email.lower())
 
             if not user:
                 log.error('User not found')
+                if on_failure is not None:
+                    await on_failure()
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='User not found')
 
             verify_password = await AuthService.__verify_password(payload.password, user.password)
             if not verify_password:
                 log.error('Invalid password')
+                if on_failure is not None:
+                    await on_failure()
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid password')
 
-            # Create access token
-            access_token = await Authorize.create_access_token(subject=str(user.id), expires_time=timedelta(minutes=int(Config.ACCESS_TOKEN_EXPIRES_IN)))
-
-            # Create refresh token
-            refresh_token = await Authorize.create_refresh_token(subject=str(user.id), expires_time=timedelta(minutes=int(Config.REFRESH_TOKEN_EXPIRES_IN)))
+            # Хеш с устаревшей стоимостью пересчитывается в фоне, ответ его не ждет
+            if password_needs_rehash(user.password):
+                AuthService.__schedule_rehash(user.id, payload.password, user.password)
 
-            # Store refresh and access tokens in cookie
-            response.set_cookie('access_token', access_token, int(ACCESS_TOKEN_EXPIRES_IN) * 60, int(ACCESS_TOKEN_EXPIRES_IN) * 60, '/', None, False, True, 'lax')
-            response.set_cookie('refresh_token', refresh_token, int(REFRESH_TOKEN_EXPIRES_IN) * 60, int(REFRESH_TOKEN_EXPIRES_IN) * 60, '/', None, False, True, 'lax')
-            response.set_cookie('logged_in', 'True', int(ACCESS_TOKEN_EXPIRES_IN) * 60, int(ACCESS_TOKEN_EXPIRES_IN) * 60, '/', None, False, False, 'lax')
+            permissions = await AuthService.__issue_tokens(user, permission_version, generation, response, Authorize)
 
-            my_permissions = await session.execute(select(RoleModel).filter(RoleModel.id == user.role_id).options(joinedload(RoleModel.permissions)))
-            my_permissions = my_permissions.scalars().first().permissions
-            my_permissions = [permission.slug for permission in my_permissions]
-            
             return {
                 "status_code": status.HTTP_200_OK,
                 "message": "Login successful",
-                "data": user
+                "data": user,
+                "permissions": permissions
             }
+        except PasswordHashingBusy:
+            raise
         except Exception as e:
             log.error(e)
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    @staticmethod
+    async def refresh(session: AsyncSession, response: Response, Authorize: AuthJWT = Depends()):
+        """
+        Exchanges a refresh token for a new access and refresh token pair, without checking the password.
+
+        Each refresh token is accepted once: it is consumed in the same transaction that
+        reads the user. Presenting a used refresh token again means it was copied, so every
+        token of the user issued until now is revoked and the user has to log in again.
+
+        Parameters:
+        - session (AsyncSession): The database session.
+        - response (Response): The HTTP response object.
+        - Authorize (AuthJWT): The authorization object.
+        Returns:
+        - dict: A dictionary containing the status code, message, user data and permissions.
+        Raises:
+        - HTTPException: If the refresh token is missing, invalid, revoked or already used.
+        """
+        try:
+            await Authorize.jwt_refresh_token_required()
+            claims = await Authorize.get_raw_jwt()
+        except Exception as e:
+            raise auth_error(e)
+
+        user_id = int(claims["sub"])
+
+        # Версия каталога прав берется до чтения прав пользователя, как при входе
+        await permission_resolver.ensure_fresh()
+        permission_version = permission_resolver.version
+
+        async with session.begin():
+            consumed = await token_revocation.consume(session, claims)
+            user, generation = await AuthService.__get_user_for_refresh(session, user_id)
+
+        if not consumed:
+            log.error(f'Refresh token reuse for user {user_id}')
+            await token_denylist.revoke(session, user_id)
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Refresh token has already been used')
+
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='User no longer exist')
+
+        if is_revoked_by(claims, generation):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Token has been revoked')
+
+        permissions = await AuthService.__issue_tokens(user, permission_version, generation, response, Authorize)
+
+        return {
+            "status_code": status.HTTP_200_OK,
+            "message": "Token refreshed",
+            "data": user,
+            "permissions": permissions
+        }
+
+    @staticmethod
+    async def logout(session: AsyncSession, request: Request, response: Response, Authorize: AuthJWT = Depends()):
+        """
+        Revokes the access and refresh tokens of the request and clears the cookies.
+
+        Tokens that are missing or no longer valid are skipped, so logging out never fails.
+
+        Parameters:
+        - session (AsyncSession): The database session.
+        - request (Request): The HTTP request with the token cookies.
+        - response (Response): The HTTP response object.
+        - Authorize (AuthJWT): The authorization object.
+        Returns:
+        - dict: A dictionary containing the status code and message.
+        """
+        for cookie in ('access_token', 'refresh_token'):
+            token = request.cookies.get(cookie)
+            if not token:
+                continue
+            try:
+                claims = await Authorize.get_raw_jwt(token)
+            except Exception:
+                continue
+            await token_revocation.revoke(session, claims)
+
+        for cookie in ('access_token', 'refresh_token', 'logged_in'):
+            response.delete_cookie(cookie, '/')
+
+        return {
+            "status_code": status.HTTP_200_OK,
+            "message": "Logout successful"
+        }
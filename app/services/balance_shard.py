@@ -0,0 +1,80 @@
+import asyncio
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.common.database import async_session_maker
+from app.models.account import Account, AccountBalanceShard
+from app.services.account import AccountService
+import logging as log
+
+
+class BalanceShardService:
+
+    async def set_shards(session: AsyncSession, account_id: int, shards: int) -> int:
+        """
+        Switches an account between the normal and the sharded balance mode online.
+
+        The account row is locked, so the switch waits for the deposits holding it. Demoting
+        to one slot also folds the pending slot totals in the same transaction; deposits that
+        still picked a slot before the switch are folded by the next compaction, and readers
+        add them to the balance in the meantime.
+
+        Args:
+            session (AsyncSession): The database session.
+            account_id (int): The ID of the account.
+            shards (int): The number of slots; 1 switches the account back to the normal mode.
+
+        Returns:
+            int: The number of slot rows folded.
+
+        Raises:
+            HTTPException: If the account is not found.
+        """
+        async with session.begin():
+            result = await session.execute(
+                update(Account)
+                .where(Account.account_id == account_id)
+                .values(balance_shards=shards)
+                .returning(Account.account_id)
+            )
+            if not result.first():
+                raise HTTPException(status_code=404, detail="Account not found")
+
+            folded = 0
+            if shards <= 1:
+                folded = await AccountService.fold_balance_shards(session, [account_id])
+
+        return folded
+
+    async def compact(session: AsyncSession, batch_size: int) -> int:
+        """
+        Folds the pending slot totals of up to `batch_size` accounts in one transaction.
+
+        Accounts whose rows are locked by another writer or compactor are skipped until the
+        next run.
+
+        Returns:
+            int: The number of slot rows folded.
+        """
+        async with session.begin():
+            pending = select(AccountBalanceShard.account_id).distinct().limit(batch_size).scalar_subquery()
+            locked = await session.execute(
+                select(Account.account_id)
+                .where(Account.account_id.in_(pending))
+                .order_by(Account.account_id)
+                .with_for_update(key_share=True, skip_locked=True)
+            )
+            return await AccountService.fold_balance_shards(session, locked.scalars().all())
+
+    async def run_compaction(interval: float, batch_size: int):
+        """
+        Compacts the sharded balances every `interval` seconds until cancelled.
+        """
+        while True:
+            try:
+                async with async_session_maker() as session:
+                    await BalanceShardService.compact(session, batch_size)
+            except Exception as e:
+                log.error(f"Ошибка при свертке ячеек баланса: {e}")
+
+            await asyncio.sleep(interval)
@@ -0,0 +1,326 @@
+import asyncio
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterable, Optional
+import asyncpg
+from fastapi import HTTPException
+from sqlalchemy import select, delete, func, cast, Text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.common.database import async_session_maker, VALUES_CHUNK_SIZE
+from app.common.money import format_minor_units
+from app.models.account import BalanceEvent
+from config import Config
+import logging as log
+
+
+class FeedService:
+
+    # Канал LISTEN/NOTIFY, через который события доходят до всех процессов приложения
+    CHANNEL = "balance_events"
+
+    async def record(session: AsyncSession, events: list):
+        """
+        Writes balance events to the outbox and notifies the listeners, inside the caller's transaction.
+
+        Postgres delivers the notifications only when the transaction commits, so subscribers
+        never see a change that was rolled back. The price is that a committing transaction
+        with NOTIFY takes a database-wide lock, so with the feed enabled all deposits and
+        settlements commit one at a time; that is why `BALANCE_FEED_ENABLED` is off by default.
+
+        Args:
+            session (AsyncSession): The database session of the writer's transaction.
+            events (list): Dicts with `account_id`, `kind`, `fund_id` and `amount`.
+        """
+        if not Config.BALANCE_FEED_ENABLED or not events:
+            return
+
+        created_at = datetime.utcnow()
+        for offset in range(0, len(events), VALUES_CHUNK_SIZE):
+            rows = [{**event, "created_at": created_at} for event in events[offset:offset + VALUES_CHUNK_SIZE]]
+
+            inserted = insert(BalanceEvent).values(rows)\
+                .returning(BalanceEvent.event_id, BalanceEvent.account_id, BalanceEvent.kind, BalanceEvent.fund_id, BalanceEvent.amount, BalanceEvent.created_at)\
+                .cte("inserted")
+            payload = func.json_build_object(
+                "event_id", inserted.c.event_id,
+                "account_id", inserted.c.account_id,
+                "kind", inserted.c.kind,
+                "fund_id", inserted.c.fund_id,
+                "amount", inserted.c.amount,
+                "created_at", inserted.c.created_at,
+            )
+            # Вставка и уведомления одним запросом
+            notified = select(func.pg_notify(FeedService.CHANNEL, cast(payload, Text)).label("notified"))\
+                .select_from(inserted)\
+                .subquery()
+            await session.execute(select(func.count()).select_from(notified))
+
+    async def replay(session: AsyncSession, account_ids: Optional[frozenset], after_event_id: int, limit: int) -> list:
+        """
+        Reads the outbox events after `after_event_id`, optionally only of the given accounts.
+        """
+        stmt = select(BalanceEvent)\
+            .where(BalanceEvent.event_id > after_event_id)\
+            .order_by(BalanceEvent.event_id)\
+            .limit(limit)
+
+        if account_ids is not None:
+            stmt = stmt.where(BalanceEvent.account_id.in_(account_ids))
+
+        async with session.begin():
+            result = await session.execute(stmt)
+            return [
+                {
+                    "event_id": event.event_id,
+                    "account_id": event.account_id,
+                    "kind": event.kind,
+                    "fund_id": event.fund_id,
+                    "amount": event.amount,
+                    "created_at": event.created_at.isoformat(),
+                }
+                for event in result.scalars().all()
+            ]
+
+    async def prune(session: AsyncSession, older_than: datetime) -> int:
+        """
+        Deletes the outbox events created before `older_than`.
+        """
+        async with session.begin():
+            result = await session.execute(delete(BalanceEvent).where(BalanceEvent.created_at < older_than))
+            return result.rowcount
+
+    def format_event(event: dict) -> str:
+        """
+        Formats an event as a Server-Sent Events message.
+        """
+        data = {**event, "amount": format_minor_units(event["amount"])}
+        return f"id: {event['event_id']}\nevent: {event['kind']}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    """
+    One subscriber of the balance feed with its own bounded queue.
+
+    `None` in the queue means the subscriber was dropped for falling behind.
+    """
+
+    def __init__(self, account_ids: Optional[frozenset], queue_size: int):
+        self.account_ids = account_ids
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+
+class BalanceFeed:
+    """
+    In-process fan-out of balance events received through LISTEN.
+
+    Every process keeps one listening connection and delivers each event only to the
+    subscribers of its account and to the unfiltered ones, so idle subscribers cost
+    nothing per event. Delivery never waits: a subscriber whose queue is full is dropped
+    and told so, and the publisher moves on.
+    """
+
+    # Повтор подключения к базе после обрыва, секунды
+    RECONNECT_DELAY = 1.0
+    # Как часто удаляются устаревшие события
+    PRUNE_INTERVAL = timedelta(hours=1)
+
+    def __init__(self, queue_size: int, max_subscribers: int, heartbeat: float, retention: timedelta):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self.retention = retention
+
+        self.published_total = 0
+        self.delivered_total = 0
+        self.dropped_total = 0
+        self.listening = False
+
+        self.__by_account = defaultdict(set)
+        self.__unfiltered = set()
+        self.__subscribers = 0
+        self.__stopping = asyncio.Event()
+        self.__task = None
+
+    def subscribe(self, account_ids: Optional[Iterable[int]] = None) -> Subscription:
+        """
+        Registers a subscriber for the given accounts, or for all accounts when none are given.
+
+        Raises:
+            HTTPException: If this process already serves `max_subscribers` subscribers.
+        """
+        if self.__subscribers >= self.max_subscribers:
+            raise HTTPException(status_code=503, detail="Too many balance feed subscribers")
+
+        subscription = Subscription(frozenset(account_ids) if account_ids else None, self.queue_size)
+        if subscription.account_ids is None:
+            self.__unfiltered.add(subscription)
+        else:
+            for account_id in subscription.account_ids:
+                self.__by_account[account_id].add(subscription)
+        self.__subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """
+        Removes a subscriber; removing it twice is a no-op.
+        """
+        if subscription.account_ids is None:
+            if subscription not in self.__unfiltered:
+                return
+            self.__unfiltered.discard(subscription)
+        else:
+            account_id = next(iter(subscription.account_ids))
+            if subscription not in self.__by_account.get(account_id, ()):
+                return
+            for account_id in subscription.account_ids:
+                subscribers = self.__by_account[account_id]
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.__by_account[account_id]
+        self.__subscribers -= 1
+
+    def publish(self, event: dict):
+        """
+        Delivers an event to the matching subscribers without waiting on any of them.
+        """
+        self.published_total += 1
+        targets = list(self.__unfiltered)
+        targets.extend(self.__by_account.get(event["account_id"], ()))
+
+        for subscription in targets:
+            try:
+                subscription.queue.put_nowait(event)
+                self.delivered_total += 1
+            except asyncio.QueueFull:
+                self.__drop(subscription)
+
+    def __drop(self, subscription: Subscription):
+        # Медленный подписчик: очередь очищается, последним сообщением идет отметка об отключении
+        self.unsubscribe(subscription)
+        self.dropped_total += 1
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    async def stream(self, subscription: Subscription, last_event_id: Optional[int]) -> AsyncIterator[str]:
+        """
+        Yields the Server-Sent Events of one subscriber until it disconnects or is dropped,
+        then unsubscribes it.
+
+        With `last_event_id` the missed outbox events are replayed first. The subscription
+        is registered before the replay, so no event falls between the two; events seen in
+        both are sent once.
+
+        Args:
+            subscription (Subscription): The subscriber returned by `subscribe()`.
+            last_event_id (Optional[int]): The ID of the last event the client received.
+
+        Yields:
+            str: SSE messages, and comments as heartbeats.
+        """
+        try:
+            replayed = set()
+            if last_event_id is not None:
+                async with async_session_maker() as session:
+                    events = await FeedService.replay(session, subscription.account_ids, last_event_id, Config.BALANCE_FEED_REPLAY_LIMIT)
+                for event in events:
+                    replayed.add(event["event_id"])
+                    yield FeedService.format_event(event)
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if event is None:
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+                if event["event_id"] not in replayed:
+                    yield FeedService.format_event(event)
+        finally:
+            self.unsubscribe(subscription)
+
+    def __on_notification(self, connection, pid, channel, payload):
+        try:
+            self.publish(json.loads(payload))
+        except Exception as e:
+            log.error(f"Ошибка при рассылке события баланса: {e}")
+
+    async def run(self):
+        """
+        Listens for balance events until `stop()` is called, reconnecting after failures.
+        """
+        self.__stopping.clear()
+        pruned_at = datetime.min
+
+        while not self.__stopping.is_set():
+            connection = None
+            try:
+                connection = await asyncpg.connect(
+                    user=Config.DB_USER, password=Config.DB_PASS, host=Config.DB_HOST,
+                    port=Config.DB_PORT, database=Config.DB_NAME,
+                )
+                await connection.add_listener(FeedService.CHANNEL, self.__on_notification)
+                self.listening = True
+
+                while not self.__stopping.is_set():
+                    try:
+                        await asyncio.wait_for(self.__stopping.wait(), timeout=self.heartbeat)
+                    except asyncio.TimeoutError:
+                        pass
+
+                    # Проверяем, что соединение живо: иначе события теряются молча
+                    await connection.execute("SELECT 1")
+
+                    if datetime.utcnow() - pruned_at >= self.PRUNE_INTERVAL:
+                        async with async_session_maker() as session:
+                            await FeedService.prune(session, datetime.utcnow() - self.retention)
+                        pruned_at = datetime.utcnow()
+            except Exception as e:
+                log.error(f"Ошибка соединения ленты балансов: {e}")
+                await asyncio.sleep(self.RECONNECT_DELAY)
+            finally:
+                self.listening = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+    def start(self):
+        """
+        Starts listening as a task of the running event loop.
+        """
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stops listening and waits for the listener to close its connection.
+        """
+        self.__stopping.set()
+        if self.__task is not None:
+            await self.__task
+
+    def stats(self) -> dict:
+        """
+        Returns the subscriber and delivery counters of this process.
+        """
+        return {
+            "listening": self.listening,
+            "subscribers": self.__subscribers,
+            "max_subscribers": self.max_subscribers,
+            "queue_size": self.queue_size,
+            "published_total": self.published_total,
+            "delivered_total": self.delivered_total,
+            "dropped_total": self.dropped_total,
+        }
+
+
+balance_feed = BalanceFeed(
+    queue_size=Config.BALANCE_FEED_QUEUE_SIZE,
+    max_subscribers=Config.BALANCE_FEED_MAX_SUBSCRIBERS,
+    heartbeat=Config.BALANCE_FEED_HEARTBEAT,
+    retention=timedelta(hours=Config.BALANCE_FEED_RETENTION_HOURS),
+)
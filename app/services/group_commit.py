@@ -0,0 +1,175 @@
+import asyncio
+import time
+from fastapi import HTTPException
+from app.common.database import async_session_maker
+from app.schemas.account import IncomingFundCreate
+from app.services.account import AccountService
+from config import Config
+import logging as log
+
+
+class GroupCommitter:
+    """
+    Coalesces concurrent deposits into batched transactions.
+
+    Callers put their deposit on a bounded queue and wait on a future. One committer task
+    takes up to `max_batch` deposits, waiting at most `max_delay` seconds after the first
+    one for more to arrive, writes them with `AccountService.add_incoming_funds_batch` and
+    resolves every future with its own result.
+
+    A batch that fails is split in halves and retried, down to single deposits, so only
+    the deposit that causes the error fails and the other callers of the batch succeed.
+    """
+
+    def __init__(self, max_batch: int, max_delay: float, queue_size: int):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+
+        self.batches_total = 0
+        self.funds_total = 0
+        self.errors_total = 0
+        self.splits_total = 0
+        self.running = False
+
+        self.__queue = asyncio.Queue(maxsize=queue_size)
+        self.__task = None
+        self.__committing = None
+
+    async def submit(self, fund_data: IncomingFundCreate) -> dict:
+        """
+        Queues a deposit for the next batch and waits until that batch is committed.
+
+        Returns:
+            dict: The created fund.
+
+        Raises:
+            HTTPException: If the queue is full, the account is not found or the batch failed.
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.__queue.put_nowait((fund_data, future))
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=503, detail="Too many pending deposits")
+
+        return await future
+
+    async def __collect(self) -> list:
+        batch = [await self.__queue.get()]
+        deadline = time.monotonic() + self.max_delay
+
+        try:
+            while len(batch) < self.max_batch:
+                # Сначала забираем все, что уже в очереди, и только потом ждем новых
+                if not self.__queue.empty():
+                    batch.append(self.__queue.get_nowait())
+                    continue
+
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.__queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            GroupCommitter.__fail(batch, 503, "Service is shutting down")
+            raise
+
+        return batch
+
+    def __fail(batch: list, status_code: int, detail: str):
+        for fund_data, future in batch:
+            if not future.done():
+                future.set_exception(HTTPException(status_code=status_code, detail=detail))
+
+    async def __commit(self, batch: list):
+        try:
+            async with async_session_maker() as session:
+                results = await AccountService.add_incoming_funds_batch(session, [fund_data for fund_data, future in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                # Делим пачку пополам, чтобы ошибка одного депозита не отклонила остальные
+                self.splits_total += 1
+                middle = len(batch) // 2
+                await self.__commit(batch[:middle])
+                await self.__commit(batch[middle:])
+                return
+
+            self.errors_total += 1
+            log.error(f"Ошибка при групповой записи входящих средств: {e}")
+            GroupCommitter.__fail(batch, 500, "Internal server error")
+            return
+
+        self.batches_total += 1
+        self.funds_total += len(batch)
+        for (fund_data, future), fund in zip(batch, results):
+            # Вызывающий мог быть отменен, пока пачка записывалась
+            if future.done():
+                continue
+            if fund is None:
+                future.set_exception(HTTPException(status_code=404, detail="Account not found"))
+            else:
+                future.set_result(fund)
+
+    async def run(self):
+        """
+        Commits batches until cancelled.
+        """
+        self.running = True
+        try:
+            while True:
+                batch = await self.__collect()
+                # Начатая пачка дописывается и при остановке, stop() ее дожидается
+                self.__committing = asyncio.ensure_future(self.__commit(batch))
+                await asyncio.shield(self.__committing)
+        finally:
+            self.running = False
+
+    def start(self):
+        """
+        Starts the committer as a task of the running event loop.
+        """
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stops the committer, waits for the batch being written and fails the deposits still in the queue.
+        """
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+        if self.__committing is not None:
+            await self.__committing
+
+        pending = []
+        while not self.__queue.empty():
+            pending.append(self.__queue.get_nowait())
+        GroupCommitter.__fail(pending, 503, "Service is shutting down")
+
+    def stats(self) -> dict:
+        """
+        Returns the queue length and the batch counters of this process.
+        """
+        return {
+            "running": self.running,
+            "max_batch": self.max_batch,
+            "max_delay_ms": round(self.max_delay * 1000, 3),
+            "queued": self.__queue.qsize(),
+            "batches_total": self.batches_total,
+            "funds_total": self.funds_total,
+            "average_batch": round(self.funds_total / self.batches_total, 2) if self.batches_total else 0.0,
+            "errors_total": self.errors_total,
+            "splits_total": self.splits_total,
+        }
+
+
+group_committer = GroupCommitter(
+    max_batch=Config.GROUP_COMMIT_MAX_BATCH,
+    max_delay=Config.GROUP_COMMIT_MAX_DELAY_MS / 1000,
+    queue_size=Config.GROUP_COMMIT_QUEUE_SIZE,
+)
@@ -0,0 +1,192 @@
+import asyncio
+import re
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.common.database import async_session_maker
+from app.models.account import IncomingFunds
+import logging as log
+
+
+class PartitionService:
+    """
+    Maintenance of the monthly range partitions of `incoming_fund`.
+
+    Partitions are named `incoming_fund_pYYYYMM` and cover `[month start, next month start)`
+    of `settlement_date`. Rows outside every partition land in `incoming_fund_default`,
+    which is expected to stay empty as long as future partitions are created in advance.
+    """
+
+    PARENT = IncomingFunds.__tablename__
+    DEFAULT_PARTITION = f"{PARENT}_default"
+    NAME_PATTERN = re.compile(rf"^{PARENT}_p(\d{{4}})(\d{{2}})$")
+    SCHEMA_PATTERN = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+    # Ключ advisory-блокировки: обслуживание секций не выполняется параллельно
+    LOCK_KEY = 0x1F0A_2B01
+
+    def month_start(dt: datetime) -> datetime:
+        """
+        Returns the first moment of the month containing the given datetime.
+        """
+        return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+    def add_months(month: datetime, months: int) -> datetime:
+        """
+        Returns the start of the month `months` months after the given month start.
+        """
+        index = month.year * 12 + month.month - 1 + months
+        return month.replace(year=index // 12, month=index % 12 + 1)
+
+    def partition_name(month: datetime) -> str:
+        """
+        Returns the name of the partition holding the given month.
+        """
+        return f"{PartitionService.PARENT}_p{month.year:04d}{month.month:02d}"
+
+    async def list_partitions(session: AsyncSession) -> dict:
+        """
+        Returns the attached monthly partitions as `{month start: partition name}`.
+        """
+        result = await session.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = CAST(:parent AS regclass)"
+            ),
+            {"parent": PartitionService.PARENT},
+        )
+
+        partitions = {}
+        for name in result.scalars().all():
+            match = PartitionService.NAME_PATTERN.match(name)
+            if match:
+                partitions[datetime(int(match.group(1)), int(match.group(2)), 1)] = name
+        return partitions
+
+    async def __lock(session: AsyncSession):
+        await session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PartitionService.LOCK_KEY})
+
+    async def ensure_partitions(session: AsyncSession, months_ahead: int, now: Optional[datetime] = None) -> list:
+        """
+        Creates the missing partitions from the current month up to `months_ahead` months ahead.
+
+        A partition is first created as a standalone table, the rows of its range are moved
+        into it from the default partition, and only then it is attached, so the attach
+        never fails on rows that arrived in the default partition earlier.
+
+        Args:
+            session (AsyncSession): The database session.
+            months_ahead (int): How many months after the current one must have a partition.
+            now (Optional[datetime]): The current moment; `datetime.utcnow()` by default.
+
+        Returns:
+            list: The names of the created partitions.
+        """
+        first = PartitionService.month_start(now or datetime.utcnow())
+        created = []
+
+        async with session.begin():
+            await PartitionService.__lock(session)
+            existing = await PartitionService.list_partitions(session)
+
+            for offset in range(months_ahead + 1):
+                month = PartitionService.add_months(first, offset)
+                if month in existing:
+                    continue
+
+                name = PartitionService.partition_name(month)
+                bounds = {"lower": month, "upper": PartitionService.add_months(month, 1)}
+
+                await session.execute(text(f'CREATE TABLE "{name}" (LIKE "{PartitionService.PARENT}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+                moved = await session.execute(
+                    text(
+                        f'WITH moved AS ('
+                        f'DELETE FROM "{PartitionService.DEFAULT_PARTITION}" '
+                        f'WHERE settlement_date >= :lower AND settlement_date < :upper RETURNING *'
+                        f') INSERT INTO "{name}" SELECT * FROM moved'
+                    ),
+                    bounds,
+                )
+                # Границы секции — литералы DDL, параметры здесь не поддерживаются
+                await session.execute(text(
+                    f'ALTER TABLE "{PartitionService.PARENT}" ATTACH PARTITION "{name}" '
+                    f"FOR VALUES FROM ('{bounds['lower'].isoformat(sep=' ')}') TO ('{bounds['upper'].isoformat(sep=' ')}')"
+                ))
+
+                if moved.rowcount:
+                    log.warning(f"В секцию {name} перенесено {moved.rowcount} строк из секции по умолчанию")
+                created.append(name)
+
+        return created
+
+    async def detach_partitions(session: AsyncSession, before: datetime, archive_schema: Optional[str] = None, drop: bool = False) -> list:
+        """
+        Detaches the partitions whose whole range lies before the given month.
+
+        Partitions that still hold unsettled funds are skipped, so the settlement worker
+        never loses pending credits. A detached partition is left as a standalone table,
+        moved to `archive_schema`, or dropped.
+
+        Account balances do not depend on the detached rows. The as-of balance of a moment
+        inside a detached month, statements over that period and rollup rebuilds of it no
+        longer see the detached funds; the monthly snapshots and rollups already written stay.
+
+        Args:
+            session (AsyncSession): The database session.
+            before (datetime): Partitions ending at or before the start of this month are detached.
+            archive_schema (Optional[str]): The schema to move detached partitions to.
+            drop (bool): Whether to drop detached partitions instead of keeping them.
+
+        Returns:
+            list: The names of the detached partitions.
+
+        Raises:
+            ValueError: If `archive_schema` is not a plain lowercase identifier.
+        """
+        if archive_schema and not PartitionService.SCHEMA_PATTERN.match(archive_schema):
+            raise ValueError(f"Invalid schema name: {archive_schema}")
+
+        cutoff = PartitionService.month_start(before)
+        detached = []
+
+        async with session.begin():
+            await PartitionService.__lock(session)
+            existing = await PartitionService.list_partitions(session)
+
+            if archive_schema:
+                await session.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"'))
+
+            for month, name in sorted(existing.items()):
+                if PartitionService.add_months(month, 1) > cutoff:
+                    continue
+
+                unsettled = await session.execute(text(f'SELECT EXISTS (SELECT 1 FROM "{name}" WHERE settled_at IS NULL)'))
+                if unsettled.scalar():
+                    log.warning(f"Секция {name} содержит неурегулированные средства и не будет отсоединена")
+                    continue
+
+                await session.execute(text(f'ALTER TABLE "{PartitionService.PARENT}" DETACH PARTITION "{name}"'))
+                if drop:
+                    await session.execute(text(f'DROP TABLE "{name}"'))
+                elif archive_schema:
+                    await session.execute(text(f'ALTER TABLE "{name}" SET SCHEMA "{archive_schema}"'))
+                detached.append(name)
+
+        return detached
+
+    async def run_maintenance(months_ahead: int, interval: float):
+        """
+        Keeps future partitions created, checking every `interval` seconds until cancelled.
+        """
+        while True:
+            try:
+                async with async_session_maker() as session:
+                    created = await PartitionService.ensure_partitions(session, months_ahead)
+                if created:
+                    log.info(f"Созданы секции incoming_fund: {', '.join(created)}")
+            except Exception as e:
+                log.error(f"Ошибка при создании секций incoming_fund: {e}")
+
+            await asyncio.sleep(interval)
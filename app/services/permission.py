@@ -0,0 +1,206 @@
+import asyncio
+import time
+from types import MappingProxyType
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.common.database import async_session_maker
+from app.models.role import Role, Permission, RolePermission, PermissionVersion
+from app.models.user import User
+from config import Config
+import logging as log
+
+
+class PermissionResolver:
+    """
+    In-memory map from role ID to the frozenset of its permission slugs and to its bitmask.
+
+    Every permission has a stable bit index (`Permission.bit`), and a role's mask has the
+    bits of its permissions set, so a check is a bitwise AND against a required mask.
+
+    The whole role/permission graph is small, so it is loaded at once and replaced as a
+    whole, never mutated: readers always see one consistent version. Every `interval`
+    seconds the resolver reads `permission_version`, which triggers bump on any change of
+    roles, permissions or their links, and reloads the graph only when it moved, so role
+    edits reach every worker within one interval. A check against a map older than
+    `max_staleness` seconds, or for a role the map does not know, refreshes it first.
+    """
+
+    def __init__(self, interval: float, max_staleness: float):
+        self.interval = interval
+        self.max_staleness = max_staleness
+
+        self.version = None
+        self.checked_at = None
+        self.reloads_total = 0
+        self.errors_total = 0
+
+        self.__roles = MappingProxyType({})
+        self.__masks = MappingProxyType({})
+        self.__bits = MappingProxyType({})
+        self.__role_ids = MappingProxyType({})
+        self.__lock = asyncio.Lock()
+        self.__task = None
+
+    async def refresh(self, session: AsyncSession) -> bool:
+        """
+        Reloads the graph if its version changed since the last load.
+
+        Returns:
+            bool: True if the graph was reloaded.
+        """
+        async with session.begin():
+            result = await session.execute(select(PermissionVersion.version).where(PermissionVersion.id == 1))
+            version = result.scalar()
+
+            if version is not None and version == self.version:
+                self.checked_at = time.monotonic()
+                return False
+
+            # Версия читается до графа: изменение между запросами даст лишнюю перезагрузку, но не потерю
+            result = await session.execute(
+                select(Role.id, Role.slug, Permission.slug, Permission.bit)
+                .select_from(Role)
+                .outerjoin(RolePermission, RolePermission.role_id == Role.id)
+                .outerjoin(Permission, Permission.id == RolePermission.permission_id)
+            )
+            roles = {}
+            masks = {}
+            bits = {}
+            role_ids = {}
+            for role_id, role_slug, slug, bit in result.all():
+                role_ids[role_slug] = role_id
+                slugs = roles.setdefault(role_id, set())
+                masks.setdefault(role_id, 0)
+                if slug is not None:
+                    slugs.add(slug)
+                    masks[role_id] |= 1 << bit
+                    bits[slug] = bit
+
+        self.__roles = MappingProxyType({role_id: frozenset(slugs) for role_id, slugs in roles.items()})
+        self.__masks = MappingProxyType(masks)
+        self.__bits = MappingProxyType(bits)
+        self.__role_ids = MappingProxyType(role_ids)
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.reloads_total += 1
+        return True
+
+    async def __refresh_after(self, checked_at: Optional[float]):
+        async with self.__lock:
+            # Пока ждали блокировку, карту мог обновить другой запрос
+            if self.checked_at == checked_at:
+                async with async_session_maker() as session:
+                    await self.refresh(session)
+
+    async def ensure_fresh(self):
+        """
+        Refreshes the map first if it is older than `max_staleness` seconds.
+        """
+        if self.checked_at is None or time.monotonic() - self.checked_at > self.max_staleness:
+            await self.__refresh_after(self.checked_at)
+
+    async def __ensure_role(self, role_id: int):
+        await self.ensure_fresh()
+        if role_id not in self.__roles:
+            # Роль могла появиться после загрузки карты
+            await self.__refresh_after(self.checked_at)
+
+    async def get(self, role_id: int) -> frozenset:
+        """
+        Returns the permission slugs of a role, an empty set for an unknown role.
+        """
+        await self.__ensure_role(role_id)
+        return self.__roles.get(role_id, frozenset())
+
+    async def get_mask(self, role_id: int) -> tuple:
+        """
+        Returns the permission bitmask of a role and the version it was computed from.
+        """
+        await self.__ensure_role(role_id)
+        return self.__masks.get(role_id, 0), self.version
+
+    async def get_role_id(self, slug: str) -> Optional[int]:
+        """
+        Returns the ID of the role with the given slug, or None if there is none.
+        """
+        await self.ensure_fresh()
+        if slug not in self.__role_ids:
+            await self.__refresh_after(self.checked_at)
+        return self.__role_ids.get(slug)
+
+    def mask_of(self, slugs: frozenset) -> int:
+        """
+        Compiles permission slugs into a bitmask with the loaded bit indexes.
+
+        Only the permissions granted to some role are loaded; any other slug adds no bit,
+        which is correct since no role could pass it anyway.
+        """
+        mask = 0
+        for slug in slugs:
+            bit = self.__bits.get(slug)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    async def get_user_role(self, user_id: int) -> Optional[int]:
+        """
+        Returns the role ID of a user, or None if the user does not exist.
+
+        Used when the caller has no token claims with the role.
+        """
+        async with async_session_maker() as session:
+            async with session.begin():
+                result = await session.execute(select(User.role_id).where(User.id == user_id))
+                return result.scalar()
+
+    async def run(self):
+        """
+        Checks the version every `interval` seconds until cancelled.
+        """
+        while True:
+            try:
+                async with self.__lock:
+                    async with async_session_maker() as session:
+                        await self.refresh(session)
+            except Exception as e:
+                self.errors_total += 1
+                log.error(f"Ошибка при загрузке прав ролей: {e}")
+
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """
+        Starts the version checks as a task of the running event loop.
+        """
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stops the version checks.
+        """
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        """
+        Returns the loaded version and the reload counters of this process.
+        """
+        return {
+            "version": self.version,
+            "roles": len(self.__roles),
+            "checked_seconds_ago": round(time.monotonic() - self.checked_at, 3) if self.checked_at is not None else None,
+            "reloads_total": self.reloads_total,
+            "errors_total": self.errors_total,
+        }
+
+
+permission_resolver = PermissionResolver(
+    interval=Config.PERMISSION_CACHE_INTERVAL,
+    max_staleness=Config.PERMISSION_CACHE_MAX_STALENESS,
+)
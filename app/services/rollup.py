@@ -0,0 +1,189 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, delete, func, literal, cast, BigInteger
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from app.common.database import VALUES_CHUNK_SIZE
+from app.models.account import Account, IncomingFunds, AccountInflowRollup
+from app.schemas.account import RollupGranularityEnum
+import logging as log
+
+
+class RollupService:
+
+    def bucket_start(dt: datetime, granularity: RollupGranularityEnum) -> datetime:
+        """
+        Returns the start of the day or month bucket containing the given datetime.
+
+        Args:
+            dt (datetime): A naive datetime.
+            granularity (RollupGranularityEnum): The bucket size.
+
+        Returns:
+            datetime: The first moment of the bucket.
+        """
+        day = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        if granularity == RollupGranularityEnum.month:
+            return day.replace(day=1)
+        return day
+
+    def new_deltas() -> dict:
+        """
+        Returns an empty accumulator for `collect`, mapping a rollup key to `[amount, count]`.
+        """
+        return defaultdict(lambda: [0, 0])
+
+    def collect(deltas: dict, account_id: int, settlement_date: datetime, amount):
+        """
+        Adds one fund to the daily and monthly buckets of its account in `deltas`.
+        """
+        for granularity in RollupGranularityEnum:
+            key = (account_id, RollupService.bucket_start(settlement_date, granularity), granularity.value)
+            deltas[key][0] += amount
+            deltas[key][1] += 1
+
+    async def apply_deltas(session: AsyncSession, deltas: dict, settled: bool = False):
+        """
+        Adds the accumulated amounts and counts to the rollups with upserts.
+
+        No account row lock is needed: each upsert adds its delta to the stored value under
+        the lock of the rollup row itself, so concurrent writers never overwrite each other,
+        and rows are written in sorted key order, so writers lock them in the same order
+        and do not deadlock on each other.
+
+        Args:
+            session (AsyncSession): The database session; must be inside the writer's transaction.
+            deltas (dict): The accumulator filled by `collect`.
+            settled (bool): Whether the funds were settled (settled columns) or added (inflow columns).
+        """
+        amount_column, count_column = ("settled_amount", "settled_count") if settled else ("inflow_amount", "inflow_count")
+        items = sorted(deltas.items())
+
+        for offset in range(0, len(items), VALUES_CHUNK_SIZE):
+            rows = [
+                {
+                    "account_id": account_id,
+                    "bucket_start": bucket_start,
+                    "granularity": granularity,
+                    "inflow_amount": 0,
+                    "inflow_count": 0,
+                    "settled_amount": 0,
+                    "settled_count": 0,
+                    amount_column: amount,
+                    count_column: count,
+                }
+                for (account_id, bucket_start, granularity), (amount, count) in items[offset:offset + VALUES_CHUNK_SIZE]
+            ]
+
+            stmt = insert(AccountInflowRollup).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[AccountInflowRollup.account_id, AccountInflowRollup.bucket_start, AccountInflowRollup.granularity],
+                set_={
+                    amount_column: getattr(AccountInflowRollup, amount_column) + getattr(stmt.excluded, amount_column),
+                    count_column: getattr(AccountInflowRollup, count_column) + getattr(stmt.excluded, count_column),
+                },
+            )
+            await session.execute(stmt)
+
+    async def get_inflow_series(session: AsyncSession, granularity: RollupGranularityEnum, date_from: datetime, date_to: datetime, account_id: Optional[int] = None):
+        """
+        Retrieves the inflow time series of one account or of all accounts from the rollups.
+
+        Args:
+            session (AsyncSession): The database session.
+            granularity (RollupGranularityEnum): `day` or `month`.
+            date_from (datetime): The start of the range; the bucket containing it is included.
+            date_to (datetime): The end of the range, inclusive.
+            account_id (Optional[int]): The account, or None for the totals over all accounts.
+
+        Returns:
+            list: One point per non-empty bucket, ordered by `bucket_start`.
+
+        Raises:
+            HTTPException: If there is an internal server error.
+        """
+        stmt = select(
+                AccountInflowRollup.bucket_start,
+                cast(func.sum(AccountInflowRollup.inflow_amount), BigInteger).label("inflow_amount"),
+                cast(func.sum(AccountInflowRollup.inflow_count), BigInteger).label("inflow_count"),
+                cast(func.sum(AccountInflowRollup.settled_amount), BigInteger).label("settled_amount"),
+                cast(func.sum(AccountInflowRollup.settled_count), BigInteger).label("settled_count"),
+            )\
+            .where(
+                AccountInflowRollup.granularity == granularity.value,
+                AccountInflowRollup.bucket_start >= RollupService.bucket_start(date_from.replace(tzinfo=None), granularity),
+                AccountInflowRollup.bucket_start <= date_to.replace(tzinfo=None),
+            )\
+            .group_by(AccountInflowRollup.bucket_start)\
+            .order_by(AccountInflowRollup.bucket_start)
+
+        if account_id is not None:
+            stmt = stmt.where(AccountInflowRollup.account_id == account_id)
+
+        async with session.begin():
+            try:
+                result = await session.execute(stmt)
+                return [row._asdict() for row in result.all()]
+            except Exception as e:
+                log.error(f"Ошибка при получении агрегатов поступлений: {e}")
+                raise HTTPException(status_code=500, detail="Internal server error")
+
+    async def rebuild(session: AsyncSession, account_id_from: int, account_id_to: int) -> int:
+        """
+        Rebuilds the rollups of an inclusive range of accounts from the incoming fund history.
+
+        The account rows of the range are locked first, so writers of these accounts wait
+        until the rebuilt rollups are committed and then apply their own deltas on top.
+        Pending slot totals of sharded accounts are folded before the rebuild, otherwise
+        their deposits would be counted again by the next compaction.
+
+        Args:
+            session (AsyncSession): The database session.
+            account_id_from (int): The first account ID of the range.
+            account_id_to (int): The last account ID of the range.
+
+        Returns:
+            int: The number of rollup rows written.
+        """
+        in_range = Account.account_id.between(account_id_from, account_id_to)
+        written = 0
+
+        # Импорт внутри метода: сервис счетов сам зависит от сервиса агрегатов
+        from app.services.account import AccountService
+
+        async with session.begin():
+            # FOR UPDATE, а не FOR NO KEY UPDATE: ждем и вставки средств на счета диапазона
+            locked = await session.execute(
+                select(Account.account_id).where(in_range).order_by(Account.account_id).with_for_update()
+            )
+            await AccountService.fold_balance_shards(session, locked.scalars().all())
+            await session.execute(
+                delete(AccountInflowRollup).where(AccountInflowRollup.account_id.between(account_id_from, account_id_to))
+            )
+
+            settled = IncomingFunds.settled_at.isnot(None)
+            for granularity in RollupGranularityEnum:
+                bucket = func.date_trunc(granularity.value, IncomingFunds.settlement_date)
+                aggregated = select(
+                        IncomingFunds.account_id,
+                        bucket,
+                        literal(granularity.value),
+                        func.sum(IncomingFunds.amount),
+                        func.count(),
+                        func.coalesce(func.sum(IncomingFunds.amount).filter(settled), 0),
+                        func.count().filter(settled),
+                    )\
+                    .where(IncomingFunds.account_id.between(account_id_from, account_id_to))\
+                    .group_by(IncomingFunds.account_id, bucket)
+
+                result = await session.execute(
+                    insert(AccountInflowRollup).from_select(
+                        ["account_id", "bucket_start", "granularity", "inflow_amount", "inflow_count", "settled_amount", "settled_count"],
+                        aggregated,
+                    )
+                )
+                written += result.rowcount
+
+        return written
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy import select, update
+from app.common.database import async_session_maker
+from app.models.account import IncomingFunds
+from app.services.rollup import RollupService
+from app.services.feed import FeedService
+from app.schemas.account import BalanceEventKindEnum
+from config import Config
+import logging as log
+
+
+class SettlementWorker:
+    """
+    Background worker that settles due incoming funds in batches.
+
+    Each lane claims up to `batch_size` funds whose settlement date has passed with
+    `FOR UPDATE SKIP LOCKED`, flags them as settled and adds them to the settled rollups
+    in the same transaction; the balances were credited when the funds were added. Lanes of one or several processes never wait
+    on each other's funds, they only skip them.
+    """
+
+    # Окно, по которому считается текущая скорость урегулирования
+    RATE_WINDOW_SECONDS = 60
+
+    def __init__(self, batch_size: int, concurrency: int, poll_interval: float):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+
+        self.settled_total = 0
+        self.batches_total = 0
+        self.errors_total = 0
+        self.started_at = None
+        self.running = False
+
+        self.__recent = deque()
+        self.__stopping = asyncio.Event()
+        self.__task = None
+
+    async def settle_batch(self) -> int:
+        """
+        Settles one batch of due funds in its own transaction.
+
+        Returns:
+            int: The number of funds settled.
+        """
+        now = datetime.utcnow()
+
+        async with async_session_maker() as session:
+            async with session.begin():
+                # Забираем пачку наступивших средств, пропуская строки, заблокированные другими воркерами
+                due = select(IncomingFunds.fund_id)\
+                    .where(IncomingFunds.settled_at.is_(None), IncomingFunds.settlement_date <= now)\
+                    .order_by(IncomingFunds.settlement_date)\
+                    .limit(self.batch_size)\
+                    .with_for_update(skip_locked=True)\
+                    .scalar_subquery()
+
+                claimed = await session.execute(
+                    update(IncomingFunds)
+                    .where(IncomingFunds.fund_id.in_(due))
+                    .values(settled_at=now)
+                    .returning(IncomingFunds.fund_id, IncomingFunds.account_id, IncomingFunds.amount, IncomingFunds.settlement_date)
+                    .execution_options(synchronize_session=False)
+                )
+                claimed = claimed.all()
+
+                if not claimed:
+                    return 0
+
+                # Баланс не меняется: средства зачислены при поступлении
+                rollups = RollupService.new_deltas()
+                for fund_id, account_id, amount, settlement_date in claimed:
+                    RollupService.collect(rollups, account_id, settlement_date, amount)
+
+                await RollupService.apply_deltas(session, rollups, settled=True)
+                await FeedService.record(session, [
+                    {"account_id": account_id, "kind": BalanceEventKindEnum.settlement.value, "fund_id": fund_id, "amount": amount}
+                    for fund_id, account_id, amount, settlement_date in claimed
+                ])
+
+        self.__record(len(claimed))
+        return len(claimed)
+
+    async def __run_lane(self):
+        while not self.__stopping.is_set():
+            try:
+                settled = await self.settle_batch()
+            except Exception as e:
+                self.errors_total += 1
+                log.error(f"Ошибка при урегулировании пачки средств: {e}")
+                settled = 0
+
+            # Полная пачка означает, что очередь не пуста — продолжаем без паузы
+            if settled >= self.batch_size:
+                continue
+
+            try:
+                await asyncio.wait_for(self.__stopping.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        """
+        Runs `concurrency` lanes until `stop()` is called.
+        """
+        self.started_at = time.monotonic()
+        self.running = True
+        self.__stopping.clear()
+        try:
+            await asyncio.gather(*(self.__run_lane() for _ in range(self.concurrency)))
+        finally:
+            self.running = False
+
+    def start(self):
+        """
+        Starts the worker as a task of the running event loop.
+        """
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Asks the lanes to finish their current batch and waits for them.
+        """
+        self.__stopping.set()
+        if self.__task is not None:
+            await self.__task
+
+    def __record(self, settled: int):
+        now = time.monotonic()
+        self.settled_total += settled
+        self.batches_total += 1
+        self.__recent.append((now, settled))
+
+        while self.__recent and self.__recent[0][0] < now - self.RATE_WINDOW_SECONDS:
+            self.__recent.popleft()
+
+    def stats(self) -> dict:
+        """
+        Returns the worker counters, including the settlement rate over the last minute.
+        """
+        now = time.monotonic()
+        uptime = now - self.started_at if self.started_at is not None else 0
+        window = min(uptime, self.RATE_WINDOW_SECONDS)
+        recent = sum(settled for moment, settled in self.__recent if moment >= now - self.RATE_WINDOW_SECONDS)
+
+        return {
+            "running": self.running,
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "poll_interval": self.poll_interval,
+            "settled_total": self.settled_total,
+            "batches_total": self.batches_total,
+            "errors_total": self.errors_total,
+            "uptime_seconds": round(uptime, 3),
+            "settled_per_second": round(recent / window, 2) if window > 0 else 0.0,
+        }
+
+
+settlement_worker = SettlementWorker(
+    batch_size=Config.SETTLEMENT_BATCH_SIZE,
+    concurrency=Config.SETTLEMENT_CONCURRENCY,
+    poll_interval=Config.SETTLEMENT_POLL_INTERVAL,
+)
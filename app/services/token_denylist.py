@@ -0,0 +1,154 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.common.database import async_session_maker
+from app.models.user import UserTokenRevocation
+from config import Config
+import logging as log
+
+
+def token_generation(claims: dict) -> int:
+    """
+    Returns the revocation generation a token was issued in; tokens issued before generations existed count as 0.
+    """
+    return claims.get("rg", 0)
+
+
+def is_revoked_by(claims: dict, generation: Optional[int]) -> bool:
+    """
+    Returns whether a token falls under the user's revocations, whose current `generation` is None if there were none.
+
+    A token is revoked when it was issued in an older generation than the current one.
+    Unlike a comparison of the `iat` second with the revocation time, this also revokes
+    tokens issued in the same second before the revocation, and accepts those issued in
+    that second after it, whatever the clocks of the workers.
+    """
+    return generation is not None and token_generation(claims) < generation
+
+
+class TokenDenylist:
+    """
+    In-memory copy of the token revocations that can still matter, for the stateless auth mode.
+
+    Only revocations newer than the access token lifetime are kept: tokens issued before
+    an older one have expired anyway, so the map stays as small as the number of users
+    revoked within that window. It is reloaded every `interval` seconds; when the last
+    successful reload is older than `max_staleness`, `is_fresh()` turns false and the
+    stateless check falls back to the database.
+    """
+
+    def __init__(self, interval: float, max_staleness: float, window: timedelta):
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self.window = window
+
+        self.synced_at = None
+        self.syncs_total = 0
+        self.errors_total = 0
+
+        self.__revoked = {}
+        self.__task = None
+
+    def is_fresh(self) -> bool:
+        """
+        Returns whether the copy was reloaded within `max_staleness` seconds.
+        """
+        return self.synced_at is not None and time.monotonic() - self.synced_at <= self.max_staleness
+
+    def is_revoked(self, user_id: int, claims: dict) -> bool:
+        """
+        Returns whether a token of the user was revoked, see `is_revoked_by`.
+        """
+        return is_revoked_by(claims, self.__revoked.get(user_id))
+
+    async def sync(self, session: AsyncSession):
+        """
+        Reloads the revocations within the access token lifetime.
+        """
+        async with session.begin():
+            result = await session.execute(
+                select(UserTokenRevocation.user_id, UserTokenRevocation.generation)
+                .where(UserTokenRevocation.revoked_before > datetime.utcnow() - self.window)
+            )
+            self.__revoked = dict(result.all())
+
+        self.synced_at = time.monotonic()
+        self.syncs_total += 1
+
+    async def revoke(self, session: AsyncSession, user_id: int) -> int:
+        """
+        Revokes every token of the user issued until now by starting a new generation.
+
+        The revocation applies in this process at once and in the others after their next reload.
+
+        Returns:
+            int: The new generation of the user.
+        """
+        async with session.begin():
+            stmt = insert(UserTokenRevocation).values(user_id=user_id, revoked_before=datetime.utcnow(), generation=1)
+            result = await session.execute(stmt.on_conflict_do_update(
+                index_elements=[UserTokenRevocation.user_id],
+                set_={
+                    "revoked_before": stmt.excluded.revoked_before,
+                    "generation": UserTokenRevocation.generation + 1,
+                },
+            ).returning(UserTokenRevocation.generation))
+            generation = result.scalar()
+
+        self.__revoked[user_id] = generation
+        return generation
+
+    async def run(self):
+        """
+        Reloads the revocations every `interval` seconds until cancelled.
+        """
+        while True:
+            try:
+                async with async_session_maker() as session:
+                    await self.sync(session)
+            except Exception as e:
+                self.errors_total += 1
+                log.error(f"Ошибка при загрузке отозванных токенов: {e}")
+
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """
+        Starts reloading as a task of the running event loop.
+        """
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stops reloading.
+        """
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        """
+        Returns the size and the freshness of the copy in this process.
+        """
+        return {
+            "fresh": self.is_fresh(),
+            "revoked_users": len(self.__revoked),
+            "synced_seconds_ago": round(time.monotonic() - self.synced_at, 3) if self.synced_at is not None else None,
+            "syncs_total": self.syncs_total,
+            "errors_total": self.errors_total,
+        }
+
+
+token_denylist = TokenDenylist(
+    interval=Config.AUTH_DENYLIST_SYNC_INTERVAL,
+    max_staleness=Config.AUTH_DENYLIST_MAX_STALENESS,
+    window=timedelta(minutes=int(Config.ACCESS_TOKEN_EXPIRES_IN or 30)),
+)
@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete, exists
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.common.database import async_session_maker
+from app.models.user import RevokedToken
+from config import Config
+import logging as log
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter of strings.
+
+    `might_contain` never misses an added item and wrongly reports an absent one with
+    about the `error_rate` it was sized for, as long as no more than `capacity` items are added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.bits = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.bits / self.capacity * math.log(2)), 1)
+        self.count = 0
+
+        self.__array = bytearray((self.bits + 7) // 8)
+
+    def __positions(self, item: str):
+        # Двойное хеширование: k позиций из двух 64-битных половин одного дайджеста
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.bits
+
+    def add(self, item: str):
+        for position in self.__positions(item):
+            self.__array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, item: str) -> bool:
+        return all(self.__array[position >> 3] & (1 << (position & 7)) for position in self.__positions(item))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.__array)
+
+
+class TokenRevocationStore:
+    """
+    Revoked token JTIs: the `revoked_token` table behind an in-memory Bloom filter.
+
+    Every request checks its token's JTI against the filter; only a filter hit, i.e. a
+    revoked token or a rare false positive, is confirmed with a primary key lookup. New
+    revocations are added to the filter of this process at once and to the others within
+    `interval` seconds. Every `rebuild_interval` seconds the filter is rebuilt from the
+    revocations that have not expired, and the expired rows are deleted, so the filter
+    only holds tokens that could still be presented.
+    """
+
+    # Запас при инкрементальной загрузке: транзакция могла зафиксироваться позже своего revoked_at
+    SYNC_OVERLAP = timedelta(minutes=1)
+
+    def __init__(self, interval: float, rebuild_interval: float, capacity: int, error_rate: float):
+        self.interval = interval
+        self.rebuild_interval = rebuild_interval
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        self.lookups_total = 0
+        self.filter_hits_total = 0
+        self.revoked_hits_total = 0
+        self.errors_total = 0
+
+        self.__filter = BloomFilter(capacity, error_rate)
+        self.__synced_until = None
+        self.__rebuilt_at = None
+        self.__task = None
+
+    def __expires_at(exp: int) -> datetime:
+        return datetime.fromtimestamp(exp, tz=timezone.utc).replace(tzinfo=None)
+
+    async def is_revoked(self, jti: str) -> bool:
+        """
+        Returns whether the token with the given JTI was revoked.
+
+        Consumed refresh tokens are not revoked here: their reuse must reach the refresh
+        endpoint, which detects it.
+        """
+        self.lookups_total += 1
+        # До первой загрузки фильтр пуст, и решает только таблица; `start()` загружает его до приема запросов
+        if self.__rebuilt_at is not None and not self.__filter.might_contain(jti):
+            return False
+
+        self.filter_hits_total += 1
+        async with async_session_maker() as session:
+            async with session.begin():
+                result = await session.execute(
+                    select(exists().where(RevokedToken.jti == jti, RevokedToken.rotated.is_(False)))
+                )
+                revoked = result.scalar()
+
+        if revoked:
+            self.revoked_hits_total += 1
+        return revoked
+
+    async def revoke(self, session: AsyncSession, claims: dict):
+        """
+        Revokes a token until it expires; revoking it again is a no-op.
+        """
+        async with session.begin():
+            await session.execute(
+                insert(RevokedToken)
+                .values(
+                    jti=claims["jti"],
+                    user_id=int(claims["sub"]),
+                    rotated=False,
+                    expires_at=TokenRevocationStore.__expires_at(claims["exp"]),
+                    revoked_at=datetime.utcnow(),
+                )
+                .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+            )
+        self.__filter.add(claims["jti"])
+
+    async def consume(self, session: AsyncSession, claims: dict) -> bool:
+        """
+        Marks a refresh token as used, inside the caller's transaction.
+
+        The primary key makes this atomic across all workers, so each refresh token is
+        exchanged at most once. Consumed tokens are not added to the filter: the refresh
+        endpoint always consumes, and the conflict is what catches their reuse.
+
+        Returns:
+            bool: False if the token was already used or revoked.
+        """
+        result = await session.execute(
+            insert(RevokedToken)
+            .values(
+                jti=claims["jti"],
+                user_id=int(claims["sub"]),
+                rotated=True,
+                expires_at=TokenRevocationStore.__expires_at(claims["exp"]),
+                revoked_at=datetime.utcnow(),
+            )
+            .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+            .returning(RevokedToken.jti)
+        )
+        return result.first() is not None
+
+    async def sync(self, session: AsyncSession):
+        """
+        Adds the revocations made since the last sync to the filter, or rebuilds it when due.
+        """
+        now = datetime.utcnow()
+        rebuild = self.__rebuilt_at is None or time.monotonic() - self.__rebuilt_at >= self.rebuild_interval
+
+        async with session.begin():
+            stmt = select(RevokedToken.jti).where(RevokedToken.rotated.is_(False), RevokedToken.expires_at > now)
+            if rebuild:
+                await session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+            else:
+                stmt = stmt.where(RevokedToken.revoked_at >= self.__synced_until - self.SYNC_OVERLAP)
+
+            result = await session.execute(stmt)
+            jtis = result.scalars().all()
+
+        if rebuild:
+            # Фильтр пересоздается с запасом, чтобы доля ложных срабатываний не росла до следующей пересборки
+            bloom = BloomFilter(max(self.capacity, len(jtis) * 2), self.error_rate)
+            for jti in jtis:
+                bloom.add(jti)
+            self.__filter = bloom
+            self.__rebuilt_at = time.monotonic()
+        else:
+            for jti in jtis:
+                self.__filter.add(jti)
+
+        self.__synced_until = now
+
+    async def __sync_logged(self):
+        try:
+            async with async_session_maker() as session:
+                await self.sync(session)
+        except Exception as e:
+            self.errors_total += 1
+            log.error(f"Ошибка при загрузке отозванных токенов: {e}")
+
+    async def run(self):
+        """
+        Syncs the filter every `interval` seconds until cancelled.
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.__sync_logged()
+
+    async def start(self):
+        """
+        Loads the filter, then starts syncing as a task of the running event loop.
+
+        The first load is awaited, so requests are checked against the filter from the
+        start instead of querying the table each; if it fails, the table decides until
+        the next sync succeeds.
+        """
+        if self.__task is None or self.__task.done():
+            await self.__sync_logged()
+            self.__task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stops syncing.
+        """
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        """
+        Returns the filter size and the lookup counters of this process.
+        """
+        return {
+            "filter_items": self.__filter.count,
+            "filter_bytes": self.__filter.size_bytes,
+            "filter_hashes": self.__filter.hashes,
+            "lookups_total": self.lookups_total,
+            "filter_hits_total": self.filter_hits_total,
+            "revoked_hits_total": self.revoked_hits_total,
+            "errors_total": self.errors_total,
+        }
+
+
+token_revocation = TokenRevocationStore(
+    interval=Config.TOKEN_REVOCATION_SYNC_INTERVAL,
+    rebuild_interval=Config.TOKEN_REVOCATION_REBUILD_INTERVAL,
+    capacity=Config.TOKEN_REVOCATION_FILTER_CAPACITY,
+    error_rate=Config.TOKEN_REVOCATION_FILTER_ERROR_RATE,
+)
@@ -24,4 +24,81 @@ class Config:
     JWT_PUBLIC_KEY = os.getenv('JWT_PUBLIC_KEY')
     ACCESS_TOKEN_EXPIRES_IN = os.getenv('ACCESS_TOKEN_EXPIRES_IN')
     REFRESH_TOKEN_EXPIRES_IN = os.getenv('REFRESH_TOKEN_EXPIRES_IN')
-    JWT_ALGORITHM = os.getenv('JWT_ALGORITHM')
\ No newline at end of file
+    JWT_ALGORITHM = os.getenv('JWT_ALGORITHM')
+    # Открытые ключи прежних пар через запятую (base64 PEM): токены, подписанные ими, принимаются до истечения
+    JWT_PREVIOUS_PUBLIC_KEYS = os.getenv('JWT_PREVIOUS_PUBLIC_KEYS', '')
+    # Алгоритмы, с которыми принимаются токены, через запятую; по умолчанию только JWT_ALGORITHM.
+    # При ротации на ключ другого типа сюда добавляется алгоритм прежнего ключа
+    JWT_DECODE_ALGORITHMS = os.getenv('JWT_DECODE_ALGORITHMS', '')
+    JWT_VERIFY_CACHE_SIZE = int(os.getenv('JWT_VERIFY_CACHE_SIZE', 10000))
+
+    # Стоимость bcrypt; подбирается командой app.commands.calibrate_password_hash
+    PASSWORD_HASH_ROUNDS = int(os.getenv('PASSWORD_HASH_ROUNDS', 12))
+    # 0 — по числу ядер; 0 для очереди — четыре вызова на поток
+    PASSWORD_HASH_EXECUTOR = os.getenv('PASSWORD_HASH_EXECUTOR', 'thread').lower()
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 0))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 0))
+
+    # Список отозванных токенов для режима проверки без запроса к базе, секунды
+    AUTH_DENYLIST_ENABLED = os.getenv('AUTH_DENYLIST_ENABLED', 'true').lower() == 'true'
+    AUTH_DENYLIST_SYNC_INTERVAL = float(os.getenv('AUTH_DENYLIST_SYNC_INTERVAL', 5))
+    AUTH_DENYLIST_MAX_STALENESS = float(os.getenv('AUTH_DENYLIST_MAX_STALENESS', 30))
+
+    # Кэш прав ролей: период проверки версии и предельный возраст, секунды
+    PERMISSION_CACHE_ENABLED = os.getenv('PERMISSION_CACHE_ENABLED', 'true').lower() == 'true'
+    PERMISSION_CACHE_INTERVAL = float(os.getenv('PERMISSION_CACHE_INTERVAL', 5))
+    PERMISSION_CACHE_MAX_STALENESS = float(os.getenv('PERMISSION_CACHE_MAX_STALENESS', 30))
+
+    # Отозванные токены: фильтр Блума в памяти перед таблицей revoked_token, интервалы в секундах
+    TOKEN_REVOCATION_ENABLED = os.getenv('TOKEN_REVOCATION_ENABLED', 'true').lower() == 'true'
+    TOKEN_REVOCATION_SYNC_INTERVAL = float(os.getenv('TOKEN_REVOCATION_SYNC_INTERVAL', 5))
+    TOKEN_REVOCATION_REBUILD_INTERVAL = float(os.getenv('TOKEN_REVOCATION_REBUILD_INTERVAL', 3600))
+    TOKEN_REVOCATION_FILTER_CAPACITY = int(os.getenv('TOKEN_REVOCATION_FILTER_CAPACITY', 100000))
+    TOKEN_REVOCATION_FILTER_ERROR_RATE = float(os.getenv('TOKEN_REVOCATION_FILTER_ERROR_RATE', 0.001))
+
+    # Ограничение попыток входа до проверки пароля: скользящее окно в секундах, неудачные попытки на email и на адрес
+    LOGIN_RATE_LIMIT_ENABLED = os.getenv('LOGIN_RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    LOGIN_RATE_LIMIT_WINDOW = float(os.getenv('LOGIN_RATE_LIMIT_WINDOW', 60))
+    LOGIN_RATE_LIMIT_PER_EMAIL = int(os.getenv('LOGIN_RATE_LIMIT_PER_EMAIL', 5))
+    LOGIN_RATE_LIMIT_PER_IP = int(os.getenv('LOGIN_RATE_LIMIT_PER_IP', 50))
+    LOGIN_RATE_LIMIT_SHARDS = int(os.getenv('LOGIN_RATE_LIMIT_SHARDS', 16))
+    LOGIN_RATE_LIMIT_MAX_KEYS = int(os.getenv('LOGIN_RATE_LIMIT_MAX_KEYS', 100000))
+    LOGIN_RATE_LIMIT_REDIS = os.getenv('LOGIN_RATE_LIMIT_REDIS', 'false').lower() == 'true'
+    LOGIN_RATE_LIMIT_TRUST_FORWARDED = os.getenv('LOGIN_RATE_LIMIT_TRUST_FORWARDED', 'false').lower() == 'true'
+
+    BULK_IMPORT_BATCH_SIZE = int(os.getenv('BULK_IMPORT_BATCH_SIZE', 5000))
+
+    GROUP_COMMIT_ENABLED = os.getenv('GROUP_COMMIT_ENABLED', 'false').lower() == 'true'
+    GROUP_COMMIT_MAX_BATCH = int(os.getenv('GROUP_COMMIT_MAX_BATCH', 500))
+    GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv('GROUP_COMMIT_MAX_DELAY_MS', 5))
+    GROUP_COMMIT_QUEUE_SIZE = int(os.getenv('GROUP_COMMIT_QUEUE_SIZE', 10000))
+
+    SETTLEMENT_WORKER_ENABLED = os.getenv('SETTLEMENT_WORKER_ENABLED', 'false').lower() == 'true'
+    SETTLEMENT_BATCH_SIZE = int(os.getenv('SETTLEMENT_BATCH_SIZE', 500))
+    SETTLEMENT_CONCURRENCY = int(os.getenv('SETTLEMENT_CONCURRENCY', 1))
+    SETTLEMENT_POLL_INTERVAL = float(os.getenv('SETTLEMENT_POLL_INTERVAL', 1.0))
+    BULK_SETTLEMENT_MAX_FUNDS = int(os.getenv('BULK_SETTLEMENT_MAX_FUNDS', 10000))
+
+    STATEMENT_EXPORT_CHUNK_SIZE = int(os.getenv('STATEMENT_EXPORT_CHUNK_SIZE', 1000))
+
+    BALANCE_CACHE_SIZE = int(os.getenv('BALANCE_CACHE_SIZE', 10000))
+    BALANCE_CACHE_TTL = float(os.getenv('BALANCE_CACHE_TTL', 5))
+    BALANCE_CACHE_REDIS_TTL = int(os.getenv('BALANCE_CACHE_REDIS_TTL', 60))
+    BATCH_BALANCE_MAX_ACCOUNTS = int(os.getenv('BATCH_BALANCE_MAX_ACCOUNTS', 1000))
+
+    # Лента балансов выключена по умолчанию: NOTIFY при фиксации берет общую для базы блокировку и выстраивает пишущие транзакции в очередь
+    BALANCE_FEED_ENABLED = os.getenv('BALANCE_FEED_ENABLED', 'false').lower() == 'true'
+    BALANCE_FEED_QUEUE_SIZE = int(os.getenv('BALANCE_FEED_QUEUE_SIZE', 100))
+    BALANCE_FEED_MAX_SUBSCRIBERS = int(os.getenv('BALANCE_FEED_MAX_SUBSCRIBERS', 20000))
+    BALANCE_FEED_HEARTBEAT = float(os.getenv('BALANCE_FEED_HEARTBEAT', 15))
+    BALANCE_FEED_REPLAY_LIMIT = int(os.getenv('BALANCE_FEED_REPLAY_LIMIT', 1000))
+    BALANCE_FEED_RETENTION_HOURS = float(os.getenv('BALANCE_FEED_RETENTION_HOURS', 24))
+
+    PARTITION_MAINTENANCE_ENABLED = os.getenv('PARTITION_MAINTENANCE_ENABLED', 'true').lower() == 'true'
+    PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', 3))
+    PARTITION_MAINTENANCE_INTERVAL = float(os.getenv('PARTITION_MAINTENANCE_INTERVAL', 3600))
+
+    BALANCE_SHARDS_MAX = int(os.getenv('BALANCE_SHARDS_MAX', 64))
+    BALANCE_SHARD_COMPACTION_ENABLED = os.getenv('BALANCE_SHARD_COMPACTION_ENABLED', 'true').lower() == 'true'
+    BALANCE_SHARD_COMPACTION_INTERVAL = float(os.getenv('BALANCE_SHARD_COMPACTION_INTERVAL', 1.0))
+    BALANCE_SHARD_COMPACTION_BATCH_SIZE = int(os.getenv('BALANCE_SHARD_COMPACTION_BATCH_SIZE', 500))
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""'token-revocation-generation'
+
+Revision ID: 1b9e4f7c2a65
+Revises: 6c1e9d4b2f80
+Create Date: 2026-10-18 21:05:37.284119
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b9e4f7c2a65'
+down_revision: Union[str, None] = '6c1e9d4b2f80'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Каждая существующая запись — один отзыв. Токены без поколения считаются поколением 0,
+    # поэтому ранее выданные токены отозванных пользователей придется получить заново
+    op.add_column('user_token_revocation', sa.Column('generation', sa.Integer(), server_default='1', nullable=False))
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION revoke_deleted_user_tokens() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO user_token_revocation (user_id, revoked_before, generation)
+            VALUES (OLD.id, now() AT TIME ZONE 'utc', 1)
+            ON CONFLICT (user_id) DO UPDATE
+            SET revoked_before = EXCLUDED.revoked_before, generation = user_token_revocation.generation + 1;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        CREATE OR REPLACE FUNCTION revoke_deleted_user_tokens() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO user_token_revocation (user_id, revoked_before)
+            VALUES (OLD.id, now() AT TIME ZONE 'utc')
+            ON CONFLICT (user_id) DO UPDATE SET revoked_before = EXCLUDED.revoked_before;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    op.drop_column('user_token_revocation', 'generation')
@@ -0,0 +1,46 @@
+"""'balance-snapshots'
+
+Revision ID: 4b7d2e9a1c30
+Revises: 1fda6b01b4d4
+Create Date: 2026-10-18 10:12:41.302114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b7d2e9a1c30'
+down_revision: Union[str, None] = '1fda6b01b4d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('account_balance_snapshot',
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('period_start', sa.DateTime(), nullable=False),
+    sa.Column('balance', sa.DECIMAL(precision=18, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['account.account_id'], ),
+    sa.PrimaryKeyConstraint('account_id', 'period_start')
+    )
+    op.create_index('ix_incoming_fund_account_id_settlement_date', 'incoming_fund', ['account_id', 'settlement_date'], unique=False, postgresql_include=['amount'])
+
+    # Заполняем снимки по уже существующей истории: нарастающий итог по месяцам
+    op.execute("""
+        INSERT INTO account_balance_snapshot (account_id, period_start, balance)
+        SELECT account_id, period_start, sum(total) OVER (PARTITION BY account_id ORDER BY period_start)
+        FROM (
+            SELECT account_id, date_trunc('month', settlement_date) AS period_start, sum(amount) AS total
+            FROM incoming_fund
+            WHERE account_id IS NOT NULL
+            GROUP BY account_id, date_trunc('month', settlement_date)
+        ) AS monthly
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_incoming_fund_account_id_settlement_date', table_name='incoming_fund')
+    op.drop_table('account_balance_snapshot')
@@ -0,0 +1,39 @@
+"""'inflow-rollups'
+
+Revision ID: 5d3b9a7e4f02
+Revises: c2a85f0e7b19
+Create Date: 2026-10-18 12:31:06.584921
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d3b9a7e4f02'
+down_revision: Union[str, None] = 'c2a85f0e7b19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('account_inflow_rollup',
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('granularity', sa.String(length=8), nullable=False),
+    sa.Column('inflow_amount', sa.DECIMAL(precision=18, scale=2), nullable=False),
+    sa.Column('inflow_count', sa.BigInteger(), nullable=False),
+    sa.Column('settled_amount', sa.DECIMAL(precision=18, scale=2), nullable=False),
+    sa.Column('settled_count', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['account.account_id'], ),
+    sa.PrimaryKeyConstraint('account_id', 'bucket_start', 'granularity')
+    )
+    op.create_index('ix_account_inflow_rollup_granularity_bucket_start', 'account_inflow_rollup', ['granularity', 'bucket_start'], unique=False)
+    # Таблица заполняется по истории командой python -m app.commands.backfill_rollups
+
+
+def downgrade() -> None:
+    op.drop_index('ix_account_inflow_rollup_granularity_bucket_start', table_name='account_inflow_rollup')
+    op.drop_table('account_inflow_rollup')
@@ -0,0 +1,37 @@
+"""'reconcile-account-balance'
+
+Revision ID: 6c1e9d4b2f80
+Revises: d2f6b8a1c574
+Create Date: 2026-10-18 19:12:44.317586
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c1e9d4b2f80'
+down_revision: Union[str, None] = 'd2f6b8a1c574'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Урегулирование больше не зачисляет средства повторно: баланс — сумма всех поступлений
+    # без еще не свернутых ячеек горячих счетов, которые добавляются к нему при чтении
+    op.execute("""
+        UPDATE account
+        SET balance = coalesce((
+            SELECT sum(amount) FROM incoming_fund WHERE incoming_fund.account_id = account.account_id
+        ), 0) - coalesce((
+            SELECT sum(amount) FROM account_balance_shard
+            WHERE account_balance_shard.account_id = account.account_id AND account_balance_shard.granularity = 'month'
+        ), 0)
+    """)
+
+
+def downgrade() -> None:
+    # Прежние значения с двойными зачислениями не восстанавливаются
+    pass
@@ -0,0 +1,47 @@
+"""'money-minor-units'
+
+Revision ID: 7a4c2e8d1b53
+Revises: 5d3b9a7e4f02
+Create Date: 2026-10-18 13:02:47.310284
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4c2e8d1b53'
+down_revision: Union[str, None] = '5d3b9a7e4f02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Денежные колонки, которые переводятся в целые минорные единицы (копейки)
+MONEY_COLUMNS = [
+    ('account', 'balance'),
+    ('incoming_fund', 'amount'),
+    ('account_balance_snapshot', 'balance'),
+    ('account_inflow_rollup', 'inflow_amount'),
+    ('account_inflow_rollup', 'settled_amount'),
+]
+
+
+def upgrade() -> None:
+    for table, column in MONEY_COLUMNS:
+        op.alter_column(
+            table, column,
+            existing_type=sa.DECIMAL(precision=18, scale=2),
+            type_=sa.BigInteger(),
+            postgresql_using=f'round({column} * 100)::bigint',
+        )
+
+
+def downgrade() -> None:
+    for table, column in MONEY_COLUMNS:
+        op.alter_column(
+            table, column,
+            existing_type=sa.BigInteger(),
+            type_=sa.DECIMAL(precision=18, scale=2),
+            postgresql_using=f'({column} / 100.0)::numeric(18, 2)',
+        )
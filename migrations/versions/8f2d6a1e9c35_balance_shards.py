@@ -0,0 +1,91 @@
+"""'balance-shards'
+
+Revision ID: 8f2d6a1e9c35
+Revises: e3b8f51c6d24
+Create Date: 2026-10-18 14:21:38.517490
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2d6a1e9c35'
+down_revision: Union[str, None] = 'e3b8f51c6d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('account', sa.Column('balance_shards', sa.Integer(), server_default='1', nullable=False))
+
+    op.create_table('account_balance_shard',
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('slot', sa.Integer(), nullable=False),
+    sa.Column('granularity', sa.String(length=8), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('amount', sa.BigInteger(), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['account.account_id'], ),
+    sa.PrimaryKeyConstraint('account_id', 'slot', 'granularity', 'bucket_start')
+    )
+
+
+def downgrade() -> None:
+    # Несвернутые поступления сворачиваются в балансы, снимки и агрегаты, как при сжатии ячеек,
+    # иначе они пропали бы из балансов вместе с таблицей
+    op.execute("LOCK TABLE account_balance_shard")
+    op.execute("""
+        CREATE TEMPORARY TABLE folded_shard ON COMMIT DROP AS
+        SELECT account_id, bucket_start AS period_start, sum(amount) AS amount
+        FROM account_balance_shard
+        WHERE granularity = 'month'
+        GROUP BY account_id, bucket_start
+    """)
+
+    op.execute("""
+        UPDATE account
+        SET balance = account.balance + delta.amount
+        FROM (SELECT account_id, sum(amount) AS amount FROM folded_shard GROUP BY account_id) AS delta
+        WHERE account.account_id = delta.account_id
+    """)
+
+    # Недостающие снимки создаются от предыдущего закрывающего баланса, затем все снимки
+    # начиная с периода поступления сдвигаются на сумму поступлений до них
+    op.execute("""
+        INSERT INTO account_balance_snapshot (account_id, period_start, balance)
+        SELECT folded_shard.account_id, folded_shard.period_start, coalesce((
+            SELECT balance FROM account_balance_snapshot AS previous
+            WHERE previous.account_id = folded_shard.account_id AND previous.period_start < folded_shard.period_start
+            ORDER BY previous.period_start DESC
+            LIMIT 1
+        ), 0)
+        FROM folded_shard
+        ON CONFLICT (account_id, period_start) DO NOTHING
+    """)
+    op.execute("""
+        UPDATE account_balance_snapshot
+        SET balance = account_balance_snapshot.balance + shift.amount
+        FROM (
+            SELECT snapshot.account_id, snapshot.period_start, sum(folded_shard.amount) AS amount
+            FROM account_balance_snapshot AS snapshot
+            JOIN folded_shard ON folded_shard.account_id = snapshot.account_id AND folded_shard.period_start <= snapshot.period_start
+            GROUP BY snapshot.account_id, snapshot.period_start
+        ) AS shift
+        WHERE account_balance_snapshot.account_id = shift.account_id AND account_balance_snapshot.period_start = shift.period_start
+    """)
+
+    op.execute("""
+        INSERT INTO account_inflow_rollup (account_id, bucket_start, granularity, inflow_amount, inflow_count, settled_amount, settled_count)
+        SELECT account_id, bucket_start, granularity, sum(amount), sum(count), 0, 0
+        FROM account_balance_shard
+        GROUP BY account_id, bucket_start, granularity
+        ON CONFLICT (account_id, bucket_start, granularity) DO UPDATE
+        SET inflow_amount = account_inflow_rollup.inflow_amount + excluded.inflow_amount,
+            inflow_count = account_inflow_rollup.inflow_count + excluded.inflow_count
+    """)
+
+    op.drop_table('account_balance_shard')
+    op.drop_column('account', 'balance_shards')
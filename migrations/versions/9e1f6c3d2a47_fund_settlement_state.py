@@ -0,0 +1,32 @@
+"""'fund-settlement-state'
+
+Revision ID: 9e1f6c3d2a47
+Revises: 4b7d2e9a1c30
+Create Date: 2026-10-18 11:03:17.845209
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e1f6c3d2a47'
+down_revision: Union[str, None] = '4b7d2e9a1c30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('incoming_fund', sa.Column('settled_at', sa.DateTime(), nullable=True))
+
+    # Уже наступившие средства считаем урегулированными, чтобы воркер не зачислил историю повторно
+    op.execute("UPDATE incoming_fund SET settled_at = settlement_date WHERE settlement_date <= now() AT TIME ZONE 'utc'")
+
+    op.create_index('ix_incoming_fund_unsettled_settlement_date', 'incoming_fund', ['settlement_date'], unique=False, postgresql_where=sa.text('settled_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_incoming_fund_unsettled_settlement_date', table_name='incoming_fund')
+    op.drop_column('incoming_fund', 'settled_at')
@@ -0,0 +1,51 @@
+"""'user-token-revocation'
+
+Revision ID: a3d7f19c4e62
+Revises: b5c9e2f47a18
+Create Date: 2026-10-18 16:12:40.519337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d7f19c4e62'
+down_revision: Union[str, None] = 'b5c9e2f47a18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_token_revocation',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('revoked_before', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index('ix_user_token_revocation_revoked_before', 'user_token_revocation', ['revoked_before'], unique=False)
+
+    # Удаление пользователя отзывает все его токены, чем бы оно ни было сделано
+    op.execute("""
+        CREATE FUNCTION revoke_deleted_user_tokens() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO user_token_revocation (user_id, revoked_before)
+            VALUES (OLD.id, now() AT TIME ZONE 'utc')
+            ON CONFLICT (user_id) DO UPDATE SET revoked_before = EXCLUDED.revoked_before;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER user_revoke_tokens_on_delete
+        AFTER DELETE ON "user"
+        FOR EACH ROW EXECUTE FUNCTION revoke_deleted_user_tokens()
+    """)
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER user_revoke_tokens_on_delete ON "user"')
+    op.execute("DROP FUNCTION revoke_deleted_user_tokens()")
+    op.drop_index('ix_user_token_revocation_revoked_before', table_name='user_token_revocation')
+    op.drop_table('user_token_revocation')
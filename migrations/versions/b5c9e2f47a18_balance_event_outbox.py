@@ -0,0 +1,39 @@
+"""'balance-event-outbox'
+
+Revision ID: b5c9e2f47a18
+Revises: 8f2d6a1e9c35
+Create Date: 2026-10-18 15:07:54.228613
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5c9e2f47a18'
+down_revision: Union[str, None] = '8f2d6a1e9c35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('balance_event',
+    sa.Column('event_id', sa.BigInteger(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('fund_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['account.account_id'], ),
+    sa.PrimaryKeyConstraint('event_id')
+    )
+    op.create_index('ix_balance_event_account_id_event_id', 'balance_event', ['account_id', 'event_id'], unique=False)
+    op.create_index('ix_balance_event_created_at', 'balance_event', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_balance_event_created_at', table_name='balance_event')
+    op.drop_index('ix_balance_event_account_id_event_id', table_name='balance_event')
+    op.drop_table('balance_event')
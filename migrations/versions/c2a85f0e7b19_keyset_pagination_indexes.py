@@ -0,0 +1,33 @@
+"""'keyset-pagination-indexes'
+
+Revision ID: c2a85f0e7b19
+Revises: 9e1f6c3d2a47
+Create Date: 2026-10-18 11:48:52.117630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2a85f0e7b19'
+down_revision: Union[str, None] = '9e1f6c3d2a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_account_user_id_account_id', 'account', ['user_id', 'account_id'], unique=False)
+
+    # fund_id добавлен в ключ индекса, чтобы им можно было продолжать выборку после курсора;
+    # старый индекс по (account_id, settlement_date) становится лишним
+    op.create_index('ix_incoming_fund_account_id_settlement_date_fund_id', 'incoming_fund', ['account_id', 'settlement_date', 'fund_id'], unique=False, postgresql_include=['amount'])
+    op.drop_index('ix_incoming_fund_account_id_settlement_date', table_name='incoming_fund')
+
+
+def downgrade() -> None:
+    op.create_index('ix_incoming_fund_account_id_settlement_date', 'incoming_fund', ['account_id', 'settlement_date'], unique=False, postgresql_include=['amount'])
+    op.drop_index('ix_incoming_fund_account_id_settlement_date_fund_id', table_name='incoming_fund')
+    op.drop_index('ix_account_user_id_account_id', table_name='account')
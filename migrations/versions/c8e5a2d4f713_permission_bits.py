@@ -0,0 +1,33 @@
+"""'permission-bits'
+
+Revision ID: c8e5a2d4f713
+Revises: f4a8c3b61d97
+Create Date: 2026-10-18 17:21:36.804152
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e5a2d4f713'
+down_revision: Union[str, None] = 'f4a8c3b61d97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('permission', sa.Column('bit', sa.SmallInteger(), nullable=True))
+    # Биты существующих прав идут по порядку id, новые права получают следующий номер из последовательности
+    op.execute("UPDATE permission SET bit = numbered.bit FROM (SELECT id, row_number() OVER (ORDER BY id) - 1 AS bit FROM permission) AS numbered WHERE permission.id = numbered.id")
+    op.execute("CREATE SEQUENCE permission_bit_seq MINVALUE 0 OWNED BY permission.bit")
+    op.execute("SELECT setval('permission_bit_seq', coalesce(max(bit) + 1, 0), false) FROM permission")
+    op.alter_column('permission', 'bit', nullable=False, server_default=sa.text("nextval('permission_bit_seq')"))
+    op.create_unique_constraint('permission_bit_key', 'permission', ['bit'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('permission_bit_key', 'permission', type_='unique')
+    op.drop_column('permission', 'bit')
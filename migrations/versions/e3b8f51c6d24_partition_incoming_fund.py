@@ -0,0 +1,103 @@
+"""'partition-incoming-fund'
+
+Revision ID: e3b8f51c6d24
+Revises: 7a4c2e8d1b53
+Create Date: 2026-10-18 13:40:12.906318
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b8f51c6d24'
+down_revision: Union[str, None] = '7a4c2e8d1b53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Сколько месяцев вперед создаются секции сразу; дальше их создает обслуживание секций
+MONTHS_AHEAD = 3
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def create_incoming_fund(*constraints, **kwargs) -> None:
+    op.create_table('incoming_fund',
+    sa.Column('fund_id', sa.Integer(), server_default=sa.text("nextval('incoming_fund_fund_id_seq')"), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=True),
+    sa.Column('amount', sa.BigInteger(), nullable=False),
+    sa.Column('settlement_date', sa.DateTime(), nullable=False),
+    sa.Column('settled_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['account_id'], ['account.account_id'], ),
+    *constraints,
+    **kwargs
+    )
+
+
+def rename_to_legacy() -> None:
+    op.drop_index('ix_incoming_fund_unsettled_settlement_date', table_name='incoming_fund')
+    op.drop_index('ix_incoming_fund_account_id_settlement_date_fund_id', table_name='incoming_fund')
+    op.execute("ALTER TABLE incoming_fund DROP CONSTRAINT incoming_fund_account_id_fkey")
+    op.execute("ALTER TABLE incoming_fund RENAME CONSTRAINT incoming_fund_pkey TO incoming_fund_legacy_pkey")
+    op.rename_table('incoming_fund', 'incoming_fund_legacy')
+    op.execute("ALTER SEQUENCE incoming_fund_fund_id_seq OWNED BY NONE")
+
+
+def create_indexes() -> None:
+    op.create_index('ix_incoming_fund_account_id_settlement_date_fund_id', 'incoming_fund', ['account_id', 'settlement_date', 'fund_id'], unique=False, postgresql_include=['amount'])
+    op.create_index('ix_incoming_fund_unsettled_settlement_date', 'incoming_fund', ['settlement_date'], unique=False, postgresql_where=sa.text('settled_at IS NULL'))
+
+
+def copy_from_legacy() -> None:
+    op.execute(
+        "INSERT INTO incoming_fund (fund_id, account_id, amount, settlement_date, settled_at) "
+        "SELECT fund_id, account_id, amount, settlement_date, settled_at FROM incoming_fund_legacy"
+    )
+    op.drop_table('incoming_fund_legacy')
+    op.execute("ALTER SEQUENCE incoming_fund_fund_id_seq OWNED BY incoming_fund.fund_id")
+
+
+def upgrade() -> None:
+    # Таблица пересоздается секционированной и заполняется копированием: на больших объемах
+    # миграцию нужно выполнять в окно обслуживания
+    rename_to_legacy()
+
+    create_incoming_fund(
+        sa.PrimaryKeyConstraint('fund_id', 'settlement_date'),
+        postgresql_partition_by='RANGE (settlement_date)',
+    )
+
+    # Помесячные секции от самой ранней даты урегулирования до MONTHS_AHEAD месяцев вперед
+    first = op.get_bind().execute(sa.text("SELECT date_trunc('month', min(settlement_date)) FROM incoming_fund_legacy")).scalar()
+    current = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month = min(first, current) if first is not None else current
+    last = add_months(current, MONTHS_AHEAD)
+
+    while month <= last:
+        upper = add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE incoming_fund_p{month:%Y%m} PARTITION OF incoming_fund "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        )
+        month = upper
+    op.execute("CREATE TABLE incoming_fund_default PARTITION OF incoming_fund DEFAULT")
+
+    create_indexes()
+    copy_from_legacy()
+
+
+def downgrade() -> None:
+    rename_to_legacy()
+
+    create_incoming_fund(sa.PrimaryKeyConstraint('fund_id'))
+    op.create_index(op.f('ix_incoming_fund_fund_id'), 'incoming_fund', ['fund_id'], unique=False)
+    create_indexes()
+
+    # Секции удаляются вместе с секционированной таблицей
+    copy_from_legacy()
@@ -0,0 +1,52 @@
+"""'permission-version'
+
+Revision ID: f4a8c3b61d97
+Revises: a3d7f19c4e62
+Create Date: 2026-10-18 16:48:05.137264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4a8c3b61d97'
+down_revision: Union[str, None] = 'a3d7f19c4e62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+tables = ['role', 'permission', 'role_permission']
+
+
+def upgrade() -> None:
+    op.create_table('permission_version',
+    sa.Column('id', sa.SmallInteger(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO permission_version (id, version) VALUES (1, 1)")
+
+    # Любое изменение ролей и прав увеличивает версию, по ней воркеры сбрасывают кэш прав
+    op.execute("""
+        CREATE FUNCTION bump_permission_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE permission_version SET version = version + 1 WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in tables:
+        op.execute(f"""
+            CREATE TRIGGER {table}_bump_permission_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_permission_version()
+        """)
+
+
+def downgrade() -> None:
+    for table in tables:
+        op.execute(f"DROP TRIGGER {table}_bump_permission_version ON {table}")
+    op.execute("DROP FUNCTION bump_permission_version()")
+    op.drop_table('permission_version')
@@ -0,0 +1,97 @@
+import base64
+import os
+import uuid
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from dotenv import load_dotenv
+from sqlalchemy import delete, select, text
+
+# Настройки читаются при импорте модулей приложения, поэтому заполняются до него
+load_dotenv()
+
+# Тесты с базой выполняются только против настроенной и промигрированной базы (alembic upgrade head)
+DATABASE_CONFIGURED = bool(os.getenv("DB_HOST"))
+
+
+def default_env():
+    for name, value in {"DB_USER": "test", "DB_PASS": "test", "DB_HOST": "localhost", "DB_PORT": "5432", "DB_NAME": "test"}.items():
+        os.environ.setdefault(name, value)
+
+    os.environ.setdefault("ACCESS_TOKEN_EXPIRES_IN", "30")
+    os.environ.setdefault("REFRESH_TOKEN_EXPIRES_IN", "43200")
+
+    if not os.getenv("JWT_PRIVATE_KEY"):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        public_pem = key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+        os.environ["JWT_ALGORITHM"] = "RS256"
+        os.environ["JWT_PRIVATE_KEY"] = base64.b64encode(private_pem).decode()
+        os.environ["JWT_PUBLIC_KEY"] = base64.b64encode(public_pem).decode()
+
+
+default_env()
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "database: the test needs the PostgreSQL database from DB_* settings")
+
+
+def pytest_collection_modifyitems(config, items):
+    if DATABASE_CONFIGURED:
+        return
+
+    skip = pytest.mark.skip(reason="No database configured (DB_HOST)")
+    for item in items:
+        if "database" in item.keywords:
+            item.add_marker(skip)
+
+
+# Один цикл событий на все тесты: пул соединений движка привязан к циклу, в котором они открыты
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def database(anyio_backend):
+    """
+    Prepares the migrated database for tests that create rows and closes the pool after them.
+    """
+    from app.common.database import engine
+
+    async with engine.begin() as connection:
+        # Сиды миграций вставляют пользователей с явными id, не сдвигая последовательность
+        await connection.execute(text("SELECT setval(pg_get_serial_sequence('\"user\"', 'id'), (SELECT max(id) FROM \"user\"))"))
+
+    yield
+
+    await engine.dispose()
+
+
+@pytest.fixture
+async def user(database):
+    """
+    A user with the `user_role` role and the password `helpers.PASSWORD`, deleted with its revocations afterwards.
+    """
+    from app.common.database import async_session_maker
+    from app.common.hashing import hash_password
+    from app.models.role import Role
+    from app.models.user import RevokedToken, User, UserTokenRevocation
+    from tests.helpers import PASSWORD
+
+    async with async_session_maker() as session:
+        async with session.begin():
+            role_id = await session.scalar(select(Role.id).where(Role.slug == "user_role"))
+            user = User(name="Auth Test", email=f"auth-{uuid.uuid4().hex}@example.com", password=hash_password(PASSWORD), role_id=role_id)
+            session.add(user)
+
+    yield user
+
+    async with async_session_maker() as session:
+        async with session.begin():
+            await session.execute(delete(User).where(User.id == user.id))
+            # Триггер удаления пользователя записывает отзыв его токенов
+            await session.execute(delete(UserTokenRevocation).where(UserTokenRevocation.user_id == user.id))
+            await session.execute(delete(RevokedToken).where(RevokedToken.user_id == user.id))
@@ -0,0 +1,25 @@
+from http.cookies import SimpleCookie
+
+from fastapi import Request, Response
+
+from app.common.oauth2 import AuthJWT
+
+PASSWORD = "correct horse battery staple"
+
+
+def tokens(response: Response) -> dict:
+    """
+    Returns the access and refresh tokens set as cookies on a response.
+    """
+    cookies = SimpleCookie()
+    for header in response.headers.getlist("set-cookie"):
+        cookies.load(header)
+    return {name: cookies[name].value for name in ("access_token", "refresh_token")}
+
+
+def authorize(**cookies) -> AuthJWT:
+    """
+    Returns an AuthJWT reading the given token cookies, as a request carrying them would.
+    """
+    header = "; ".join(f"{name}={value}" for name, value in cookies.items())
+    return AuthJWT(req=Request({"type": "http", "method": "POST", "path": "/", "headers": [(b"cookie", header.encode())]}))
@@ -0,0 +1,247 @@
+import pytest
+
+import app.common.cache as cache_module
+from app.common.cache import BalanceCache
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClock:
+    """
+    Replaces the `time` module of the cache, so TTLs and read markers advance only when told.
+    """
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class FakePipeline:
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def set(self, key, value, px=None):
+        self.commands.append((key, value, px))
+
+    async def execute(self):
+        for key, value, px in self.commands:
+            await self.redis.set(key, value, px=px)
+
+
+class FakeRedis:
+    """
+    The subset of `redis.asyncio.Redis` used by `BalanceCache`, kept in a dict; keys expire by the cache clock.
+    """
+
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.data = {}
+        self.expires_at = {}
+        self.failing = False
+
+    def __check(self):
+        if self.failing:
+            raise ConnectionError("redis is down")
+
+    def __read(self, key):
+        if key in self.data and self.expires_at[key] <= self.clock.now:
+            del self.data[key]
+        return self.data.get(key)
+
+    async def get(self, key):
+        self.__check()
+        return self.__read(key)
+
+    async def mget(self, keys):
+        self.__check()
+        return [self.__read(key) for key in keys]
+
+    async def set(self, key, value, px=None):
+        self.__check()
+        assert px is None or px > 0
+        self.data[key] = value
+        self.expires_at[key] = self.clock.now + px / 1000 if px else float("inf")
+
+    async def delete(self, *keys):
+        self.__check()
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakeAioredis:
+
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+
+    def from_url(self, url, **kwargs):
+        return self.redis
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def redis(clock, monkeypatch):
+    redis = FakeRedis(clock)
+    monkeypatch.setattr(cache_module, "aioredis", FakeAioredis(redis))
+    return redis
+
+
+def worker(max_size: int = 100, ttl: float = 5) -> BalanceCache:
+    return BalanceCache(max_size=max_size, ttl=ttl, redis_url="redis://fake", redis_ttl=60)
+
+
+async def test_miss_then_local_hit(clock, redis):
+    cache = worker()
+
+    assert await cache.get(1) is None
+    await cache.set(1, 1500, cache.begin_read())
+    assert await cache.get(1) == 1500
+
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits_local"], stats["hits_redis"]) == (1, 1, 0)
+
+
+async def test_local_entry_expires_after_ttl(clock):
+    cache = BalanceCache(max_size=100, ttl=5)
+    await cache.set(1, 1500, cache.begin_read())
+
+    clock.advance(4.9)
+    assert await cache.get(1) == 1500
+    clock.advance(0.2)
+    assert await cache.get(1) is None
+
+
+async def test_expired_local_entry_is_served_from_redis(clock, redis):
+    cache = worker()
+    await cache.set(1, 1500, cache.begin_read())
+
+    clock.advance(10)
+    assert await cache.get(1) == 1500
+    assert cache.stats()["hits_redis"] == 1
+
+
+async def test_least_recently_used_entry_is_evicted(clock):
+    cache = BalanceCache(max_size=2, ttl=5)
+    read_at = cache.begin_read()
+    await cache.set(1, 100, read_at)
+    await cache.set(2, 200, read_at)
+    assert await cache.get(1) == 100
+
+    await cache.set(3, 300, read_at)
+
+    assert await cache.get(2) is None
+    assert await cache.get(1) == 100
+    assert await cache.get(3) == 300
+    assert cache.stats()["evictions"] == 1
+
+
+async def test_other_workers_read_through_redis(clock, redis):
+    writer, reader = worker(), worker()
+    await writer.set(1, 1500, writer.begin_read())
+
+    assert await reader.get_many([1, 2]) == {1: 1500}
+    assert reader.stats()["hits_redis"] == 1
+
+
+async def test_invalidation_clears_both_tiers(clock, redis):
+    cache, other = worker(), worker()
+    await cache.set(1, 1500, cache.begin_read())
+
+    await cache.invalidate(1)
+
+    assert await cache.get(1) is None
+    assert await other.get(1) is None
+
+
+async def test_stale_read_started_before_invalidation_is_not_cached(clock, redis):
+    cache = worker()
+
+    # Читатель начал чтение из базы до того, как писатель зафиксировал поступление
+    read_at = cache.begin_read()
+    clock.advance(0.001)
+    await cache.invalidate(1)
+
+    await cache.set(1, 1500, read_at)
+
+    assert await cache.get(1) is None
+    assert redis.data == {}
+
+
+async def test_stale_value_from_another_worker_is_ignored_after_invalidation(clock, redis):
+    cache, other = worker(), worker()
+
+    # Другой воркер прочитал баланс до фиксации и положил его в Redis уже после инвалидации
+    read_at = other.begin_read()
+    clock.advance(0.001)
+    await cache.invalidate(1)
+    await other.set(1, 1500, read_at)
+
+    assert await cache.get(1) is None
+    assert await cache.get_many([1]) == {}
+
+    clock.advance(0.001)
+    await cache.set(1, 2500, cache.begin_read())
+    assert await cache.get(1) == 2500
+
+
+async def test_slow_stale_read_expires_before_its_invalidation_is_forgotten(clock, redis):
+    cache, other = worker(), worker()
+
+    # Другой воркер читал баланс до фиксации почти redis_ttl и записал его в Redis после инвалидации
+    read_at = other.begin_read()
+    clock.advance(1)
+    await cache.invalidate(1)
+    clock.advance(50)
+    await other.set(1, 1500, read_at)
+    assert redis.expires_at["balance:1"] == read_at + 60
+
+    # Отметка инвалидации удаляется через redis_ttl после нее, а значение в Redis к этому времени уже истекло
+    clock.advance(10.5)
+    await cache.invalidate(2)
+    assert await cache.get(1) is None
+
+
+async def test_read_older_than_redis_ttl_is_not_written_to_redis(clock, redis):
+    cache = worker()
+
+    read_at = cache.begin_read()
+    clock.advance(61)
+    await cache.set_many({1: 1500}, read_at)
+
+    assert redis.data == {}
+
+
+async def test_redis_errors_fall_back_to_a_miss(clock, redis):
+    cache = worker()
+    redis.failing = True
+
+    await cache.set(1, 1500, cache.begin_read())
+    assert await cache.get(1) == 1500
+
+    clock.advance(10)
+    assert await cache.get(1) is None
+    assert cache.stats()["redis_errors"] == 2
@@ -0,0 +1,80 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.common.database import DATA_BASE_URL, async_session_maker
+from app.models.account import Account, AccountBalanceSnapshot, AccountInflowRollup, BalanceEvent, IncomingFunds
+from app.schemas.account import IncomingFundCreate
+from app.services.account import AccountService
+
+pytestmark = [pytest.mark.anyio, pytest.mark.database]
+
+# Одновременных поступлений на один счет; все они ждут соединений одного пула движка
+DEPOSITS = int(os.getenv("TEST_CONCURRENT_DEPOSITS", "3000"))
+# Соединений, одновременно ждущих блокировки строки счета
+CONNECTIONS = int(os.getenv("TEST_DEPOSIT_CONNECTIONS", "50"))
+
+
+@pytest.fixture
+async def account_id(database):
+    async with async_session_maker() as session:
+        account = await AccountService.create_account(session, None)
+
+    yield account.account_id
+
+    async with async_session_maker() as session:
+        async with session.begin():
+            for model in (IncomingFunds, AccountBalanceSnapshot, AccountInflowRollup, BalanceEvent):
+                await session.execute(delete(model).where(model.account_id == account.account_id))
+            await session.execute(delete(Account).where(Account.account_id == account.account_id))
+
+
+@pytest.fixture
+async def deposit_session_maker(database):
+    # Свой пул без ограничения ожидания: очередь из тысяч поступлений дольше pool_timeout пула приложения
+    engine = create_async_engine(DATA_BASE_URL, pool_size=CONNECTIONS, max_overflow=0, pool_timeout=None)
+    yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def deposit(session_maker, account_id: int, amount: str):
+    async with session_maker() as session:
+        return await AccountService.add_incoming_fund(
+            session, IncomingFundCreate(account_id=account_id, amount=amount, settlement_date=datetime.utcnow())
+        )
+
+
+async def test_concurrent_deposits_lose_no_update(account_id, deposit_session_maker):
+    amounts = [f"{i}.01" for i in range(1, DEPOSITS + 1)]
+
+    # Все поступления на один счет одновременно, каждое в своем соединении
+    await asyncio.gather(*(deposit(deposit_session_maker, account_id, amount) for amount in amounts))
+
+    expected = sum(i * 100 + 1 for i in range(1, DEPOSITS + 1))
+    async with async_session_maker() as session:
+        async with session.begin():
+            balance = await session.scalar(select(Account.balance).where(Account.account_id == account_id))
+            funds = await session.scalar(select(func.count()).select_from(IncomingFunds).where(IncomingFunds.account_id == account_id))
+            funds_total = await session.scalar(select(func.sum(IncomingFunds.amount)).where(IncomingFunds.account_id == account_id))
+
+    assert funds == DEPOSITS
+    assert funds_total == expected
+    assert balance == expected
+
+    async with async_session_maker() as session:
+        assert await AccountService.get_account_balance(session, account_id) == expected
+        assert await AccountService.get_account_balance_at(session, account_id, datetime.utcnow()) == expected
+
+
+async def test_negative_fund_is_a_debit(account_id, deposit_session_maker):
+    await deposit(deposit_session_maker, account_id, "100.00")
+    await deposit(deposit_session_maker, account_id, "-30.25")
+
+    async with async_session_maker() as session:
+        assert await AccountService.get_account_balance(session, account_id) == 6975
+        assert await AccountService.get_account_balance_at(session, account_id, datetime.utcnow()) == 6975
@@ -0,0 +1,82 @@
+import uuid
+
+import pytest
+from fastapi import Response
+from sqlalchemy import delete, event
+
+from app.common.database import async_session_maker, engine
+from app.common.oauth2 import AuthJWT
+from app.models.user import User
+from app.schemas.user import CreateUserSchema, UserLoginSchema
+from app.services.auth import AuthService
+from app.services.permission import permission_resolver
+from app.services.token_revocation import token_revocation
+from tests.helpers import PASSWORD, authorize, tokens
+
+pytestmark = [pytest.mark.anyio, pytest.mark.database]
+
+
+@pytest.fixture
+def statements():
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    yield recorded
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+def verbs(statements: list) -> list:
+    return [statement.lstrip().split(None, 1)[0].upper() for statement in statements]
+
+
+async def test_login_issues_one_select(user, statements):
+    # Карта прав загружается заранее, как ее держит фоновое обновление
+    await permission_resolver.ensure_fresh()
+    statements.clear()
+
+    async with async_session_maker() as session:
+        result = await AuthService.login(session, UserLoginSchema(email=user.email, password=PASSWORD), Response(), AuthJWT())
+
+    selects = [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+    assert result["status_code"] == 200
+    assert len(selects) == 1, selects
+
+
+async def test_register_issues_one_select_and_one_insert(database, statements):
+    await permission_resolver.ensure_fresh()
+    statements.clear()
+
+    email = f"register-{uuid.uuid4().hex}@example.com"
+    payload = CreateUserSchema(name="Register Test", email=email, password=PASSWORD, passwordConfirm=PASSWORD, avatar="avatar", role_id=0, creator_id=0)
+
+    try:
+        async with async_session_maker() as session:
+            result = await AuthService.register_user(session, payload)
+
+        # Проверка email и вставка пользователя; роль берется из кэша прав
+        assert result["status_code"] == 201
+        assert verbs(statements) == ["SELECT", "INSERT"], statements
+    finally:
+        async with async_session_maker() as session:
+            async with session.begin():
+                await session.execute(delete(User).where(User.email == email))
+
+
+async def test_refresh_issues_one_insert_and_one_select(user, statements):
+    response = Response()
+    async with async_session_maker() as session:
+        await AuthService.login(session, UserLoginSchema(email=user.email, password=PASSWORD), response, AuthJWT())
+    # Фильтр отозванных токенов загружен, как после старта приложения
+    async with async_session_maker() as session:
+        await token_revocation.sync(session)
+    statements.clear()
+
+    async with async_session_maker() as session:
+        result = await AuthService.refresh(session, Response(), authorize(refresh_token=tokens(response)["refresh_token"]))
+
+    # Погашение refresh-токена и чтение пользователя с правами и поколением отзыва
+    assert result["status_code"] == 200
+    assert verbs(statements) == ["INSERT", "SELECT"], statements
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+
+from app.common.money import MAX_MINOR_UNITS, format_minor_units, to_minor_units
+from app.schemas.account import IncomingFundCreate
+
+
+def fund(amount) -> IncomingFundCreate:
+    return IncomingFundCreate(account_id=1, amount=amount, settlement_date=datetime(2026, 1, 1))
+
+
+@pytest.mark.parametrize("value, expected", [("12.34", 1234), (12, 1200), (0.1, 10), ("-5.5", -550)])
+def test_amounts_convert_to_minor_units(value, expected):
+    assert to_minor_units(value) == expected
+
+
+@pytest.mark.parametrize("value", ["1.234", "abc", "NaN", True, "1e17", str(-2 ** 63 - 1)])
+def test_invalid_amounts_are_rejected(value):
+    with pytest.raises(ValueError):
+        to_minor_units(value)
+
+
+def test_bigint_bounds_are_accepted():
+    assert to_minor_units(format_minor_units(MAX_MINOR_UNITS)) == MAX_MINOR_UNITS
+
+
+def test_negative_fund_is_accepted_as_a_debit():
+    assert fund("-10.50").amount == -1050
+
+
+def test_zero_fund_is_rejected():
+    with pytest.raises(ValidationError):
+        fund("0.00")
@@ -0,0 +1,81 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete
+
+from app.common.database import async_session_maker
+from app.helpers.pagination import decode_cursor, encode_cursor
+from app.models.account import Account, AccountBalanceSnapshot, AccountInflowRollup, BalanceEvent, IncomingFunds
+from app.schemas.account import IncomingFundCreate
+from app.services.account import AccountService
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    settlement_date = datetime(2026, 10, 18, 12, 30, 15, 250)
+
+    assert decode_cursor(encode_cursor(settlement_date, 42), datetime, int) == [settlement_date, 42]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    "ключ",
+    raw_cursor({"fund_id": 1}),
+    raw_cursor([1]),
+    raw_cursor(["2026-10-18T12:00:00", 1, 2]),
+    # Время с часовым поясом сравнивалось бы с наивным столбцом и падало в базе
+    raw_cursor(["2026-10-18T12:00:00+03:00", 1]),
+    raw_cursor(["2026-10-18T12:00:00Z", 1]),
+    raw_cursor(["yesterday", 1]),
+    raw_cursor([1700000000, 1]),
+    raw_cursor(["2026-10-18T12:00:00", "1"]),
+    raw_cursor(["2026-10-18T12:00:00", True]),
+    raw_cursor(["2026-10-18T12:00:00", 1.5]),
+    raw_cursor(["2026-10-18T12:00:00", 2 ** 31]),
+    raw_cursor(["2026-10-18T12:00:00", None]),
+    pytest.param("W" * 100000, id="long"),
+    pytest.param(base64.urlsafe_b64encode(b"[" * 100000).decode(), id="deeply-nested"),
+])
+def test_malformed_cursor_is_a_bad_request(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, datetime, int)
+
+    assert error.value.status_code == 400
+
+
+@pytest.mark.anyio
+@pytest.mark.database
+async def test_funds_are_listed_page_by_page(database):
+    async with async_session_maker() as session:
+        account = await AccountService.create_account(session, None)
+
+    try:
+        start = datetime(2026, 10, 18, 12, 0)
+        for minutes in (0, 0, 1, 2, 3):
+            async with async_session_maker() as session:
+                await AccountService.add_incoming_fund(
+                    session, IncomingFundCreate(account_id=account.account_id, amount="1.00", settlement_date=start + timedelta(minutes=minutes))
+                )
+
+        listed, cursor = [], None
+        while True:
+            async with async_session_maker() as session:
+                page = await AccountService.list_incoming_funds(session, account.account_id, 2, cursor)
+            listed.extend(fund.fund_id for fund in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert len(listed) == len(set(listed)) == 5
+    finally:
+        async with async_session_maker() as session:
+            async with session.begin():
+                for model in (IncomingFunds, AccountBalanceSnapshot, AccountInflowRollup, BalanceEvent):
+                    await session.execute(delete(model).where(model.account_id == account.account_id))
+                await session.execute(delete(Account).where(Account.account_id == account.account_id))
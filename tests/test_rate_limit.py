@@ -0,0 +1,178 @@
+import time
+
+import anyio
+import pytest
+from fastapi import HTTPException, Request, Response
+
+import app.common.rate_limit as rate_limit_module
+import app.controller.auth as auth_controller
+import app.services.auth as auth_service
+from app.common.database import async_session_maker
+from app.common.hashing import hashing_executor
+from app.common.oauth2 import AuthJWT
+from app.common.rate_limit import LoginRateLimiter, SlidingWindowLimiter
+from app.schemas.user import UserLoginSchema
+
+pytestmark = pytest.mark.anyio
+
+LIMIT = 5
+ATTEMPTS = 50
+
+
+class FakePipeline:
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    async def execute(self):
+        return [getattr(self.redis, name)(*args) for name, args in self.commands]
+
+
+class FakeRedis:
+    """
+    The subset of `redis.asyncio.Redis` used by `SlidingWindowLimiter`, kept in a dict; each command is atomic.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def incr(self, key):
+        self.data[key] = self.data.get(key, 0) + 1
+        return self.data[key]
+
+    def decr(self, key):
+        self.data[key] = self.data.get(key, 0) - 1
+        return self.data[key]
+
+    def expire(self, key, seconds):
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakeAioredis:
+
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+
+    def from_url(self, url, **kwargs):
+        return self.redis
+
+
+def limiter(redis_url=None) -> LoginRateLimiter:
+    return LoginRateLimiter(
+        by_email=SlidingWindowLimiter("email", LIMIT, 3600, 4, 1000, redis_url),
+        by_ip=SlidingWindowLimiter("ip", LIMIT * 100, 3600, 4, 1000, redis_url),
+        trust_forwarded=False,
+    )
+
+
+def request(host: str = "10.0.0.1") -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/auth/auth/login", "headers": [], "client": (host, 1234)})
+
+
+async def failed_attempts(login_rate_limiter: LoginRateLimiter, count: int) -> tuple:
+    # Все попытки одновременно: каждая проверяет пароль дольше, чем приходят остальные
+    checked, rejected = [], []
+
+    async def attempt():
+        try:
+            async with login_rate_limiter.attempt(request(), "victim@example.com") as login:
+                checked.append(1)
+                await anyio.sleep(0.05)
+                await login.fail()
+        except HTTPException as e:
+            assert e.status_code == 429
+            rejected.append(int(e.headers["Retry-After"]))
+
+    async with anyio.create_task_group() as tasks:
+        for _ in range(count):
+            tasks.start_soon(attempt)
+    return len(checked), rejected
+
+
+@pytest.fixture(params=["local", "redis"])
+def login_rate_limiter(request, monkeypatch):
+    if request.param == "local":
+        return limiter()
+    monkeypatch.setattr(rate_limit_module, "aioredis", FakeAioredis(FakeRedis()))
+    return limiter("redis://fake")
+
+
+async def test_concurrent_failures_are_limited(login_rate_limiter):
+    checked, rejected = await failed_attempts(login_rate_limiter, ATTEMPTS)
+
+    assert checked == LIMIT
+    assert len(rejected) == ATTEMPTS - LIMIT
+    assert all(retry_after > 0 for retry_after in rejected)
+
+
+async def test_successful_attempts_are_taken_back(login_rate_limiter):
+    for _ in range(LIMIT * 3):
+        async with login_rate_limiter.attempt(request(), "user@example.com"):
+            pass
+
+    checked, _ = await failed_attempts(login_rate_limiter, ATTEMPTS)
+    assert checked == LIMIT
+
+
+async def test_errors_are_not_failures(login_rate_limiter):
+    for _ in range(LIMIT * 3):
+        with pytest.raises(RuntimeError):
+            async with login_rate_limiter.attempt(request(), "victim@example.com"):
+                raise RuntimeError("hashing pool is busy")
+
+    checked, _ = await failed_attempts(login_rate_limiter, ATTEMPTS)
+    assert checked == LIMIT
+
+
+async def test_rejected_email_does_not_count_against_address():
+    login_rate_limiter = limiter()
+    await failed_attempts(login_rate_limiter, ATTEMPTS)
+
+    assert login_rate_limiter.by_ip.stats()["allowed_total"] - login_rate_limiter.by_ip.stats()["released_total"] == LIMIT
+
+
+@pytest.mark.database
+async def test_concurrent_wrong_passwords_reach_the_hasher_limit_times(user, monkeypatch):
+    hashed = []
+
+    def slow_verify(password, hashed_password):
+        hashed.append(1)
+        time.sleep(0.05)
+        return False
+
+    monkeypatch.setattr(auth_service, "verify_password", slow_verify)
+    # Очередь пула хешей не должна отказывать раньше ограничителя
+    monkeypatch.setattr(hashing_executor, "max_pending", ATTEMPTS)
+    monkeypatch.setattr(auth_controller, "login_rate_limiter", limiter())
+    payload = UserLoginSchema(email=user.email, password="wrong password")
+    statuses = []
+
+    async def login():
+        async with async_session_maker() as session:
+            try:
+                await auth_controller.login(payload, request(), Response(), session, AuthJWT())
+            except HTTPException as e:
+                statuses.append(e.status_code)
+
+    async with anyio.create_task_group() as tasks:
+        for _ in range(ATTEMPTS):
+            tasks.start_soon(login)
+
+    assert len(hashed) == LIMIT
+    assert statuses.count(429) == ATTEMPTS - LIMIT
@@ -0,0 +1,80 @@
+import time
+
+import anyio
+import pytest
+from fastapi import HTTPException, Response
+
+from app.common.database import async_session_maker
+from app.common.oauth2 import AuthJWT, require_claims, require_user
+from app.models.user import User
+from app.schemas.user import UserLoginSchema
+from app.services.auth import AuthService
+from app.services.token_denylist import token_denylist
+from tests.helpers import PASSWORD, authorize, tokens
+
+pytestmark = [pytest.mark.anyio, pytest.mark.database]
+
+
+async def login(user: User) -> dict:
+    response = Response()
+    async with async_session_maker() as session:
+        await AuthService.login(session, UserLoginSchema(email=user.email, password=PASSWORD), response, AuthJWT())
+    return tokens(response)
+
+
+async def refresh(refresh_token: str) -> dict:
+    response = Response()
+    async with async_session_maker() as session:
+        await AuthService.refresh(session, response, authorize(refresh_token=refresh_token))
+    return tokens(response)
+
+
+async def check(dependency, access_token: str):
+    async with async_session_maker() as session:
+        return await dependency(session, authorize(access_token=access_token))
+
+
+async def issued_at(token: str) -> int:
+    return (await AuthJWT().get_raw_jwt(token))["iat"]
+
+
+async def start_of_second():
+    # Дальше все укладывается в одну секунду, как повторное использование сразу после кражи
+    await anyio.sleep(1 - time.time() % 1 + 0.01)
+
+
+async def test_reuse_revokes_tokens_issued_in_the_same_second(user):
+    stolen = await login(user)
+    await start_of_second()
+
+    # Злоумышленник первым обменивает украденный refresh-токен, владелец предъявляет его следом
+    attacker = await refresh(stolen["refresh_token"])
+    with pytest.raises(HTTPException) as reuse:
+        await refresh(stolen["refresh_token"])
+    revoked_at = int(time.time())
+
+    assert reuse.value.status_code == 401
+    assert await issued_at(attacker["access_token"]) == revoked_at
+
+    for dependency in (require_user, require_claims):
+        with pytest.raises(HTTPException) as rejected:
+            await check(dependency, attacker["access_token"])
+        assert rejected.value.status_code == 401, dependency.__name__
+
+    with pytest.raises(HTTPException) as rejected:
+        await refresh(attacker["refresh_token"])
+    assert rejected.value.status_code == 401
+
+
+async def test_login_in_the_same_second_after_revocation_is_accepted(user):
+    await start_of_second()
+
+    async with async_session_maker() as session:
+        await token_denylist.revoke(session, user.id)
+    fresh = await login(user)
+    revoked_at = int(time.time())
+
+    assert await issued_at(fresh["access_token"]) == revoked_at
+    assert await check(require_user, fresh["access_token"]) == str(user.id)
+    assert (await check(require_claims, fresh["access_token"]))["sub"] == str(user.id)
+    assert (await refresh(fresh["refresh_token"]))["access_token"]